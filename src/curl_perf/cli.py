@@ -1,24 +1,405 @@
 """CLI entry point for curl-perf."""
 
 import argparse
+import dataclasses
+import ipaddress
+import json
+import os
+import signal
 import sys
+import time
+import urllib.parse
 
-from curl_perf.output import format_table, format_throughput_table, write_json
-from curl_perf.runner import BenchmarkConfig, BenchmarkRunner
-from curl_perf.server import LocalServer
+from curl_perf.comparison import compare_rows, diff_results, verdict_between
+from curl_perf import history
+from curl_perf.journal import (
+    Journal, host_info, incompatible_settings, load_journal, rebuild_results,
+)
+from curl_perf.metrics import MetricsCollector, MetricsServer
+from curl_perf.monitor import ServerMonitor
+from curl_perf.output import (
+    best_row, format_compare_table, format_history_table, format_keepalive_table,
+    format_multiplex_table, format_rate_table, format_table, format_throughput_table,
+    format_tls_table, format_ttfb_breakdown_table, write_json,
+)
+from curl_perf.results import (
+    TIMING_FIELDS, HandshakeResult, KeepaliveResult, MultiplexResult, RateResult,
+    subtract_startup,
+)
+from curl_perf.progress import LiveProgress
+from curl_perf.runner import HTTP_VERSION_LABELS, BenchmarkConfig, BenchmarkRunner
+from curl_perf.server import (
+    DEFAULT_CHUNK_SIZE, KEY_TYPES, TLS_VERSIONS, LocalServer, ServerOptions,
+)
+from curl_perf.shaping import NetworkProfile, ShapingProxy, parse_rate
 from curl_perf.tools import ALL_ADAPTERS, get_available_tools, get_tool
 
 
+def _fraction(value: str) -> float:
+    """A fraction given as a percentage ('2%') or as is ('0.02')."""
+    if value.endswith("%"):
+        return float(value[:-1]) / 100.0
+    return float(value)
+
+
+def _parse_ci(value: str) -> float:
+    """Parse a relative CI target given as '2%' or '0.02'."""
+    try:
+        return _fraction(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid CI target: {value!r}")
+
+
+def _parse_loss(value: str) -> float:
+    """Parse a packet loss probability given as '0.1%' or '0.001'."""
+    try:
+        loss = _fraction(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid loss rate: {value!r} (expected a probability, e.g. 0.1% or 0.001)"
+        )
+    if not 0 <= loss < 1:
+        raise argparse.ArgumentTypeError(f"loss rate must be in [0, 100%): {value!r}")
+    return loss
+
+
+def _is_loopback(host: str | None) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host or "").is_loopback
+    except ValueError:
+        return False
+
+
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value!r}")
+    return number
+
+
+def _positive_float(value: str) -> float:
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {value!r}")
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0: {value!r}")
+    return number
+
+
+def _parse_rate(value: str) -> float:
+    try:
+        return parse_rate(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _parse_metrics(value: str) -> list[str]:
+    """Parse a comma-separated list of timing fields."""
+    metrics = [m.strip() for m in value.split(",") if m.strip()]
+    unknown = [m for m in metrics if m not in TIMING_FIELDS]
+    if not metrics:
+        raise argparse.ArgumentTypeError("no metrics given")
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown metric(s) {', '.join(unknown)}; choose from {', '.join(TIMING_FIELDS)}"
+        )
+    return metrics
+
+
+def _parse_threshold(value: str) -> tuple[str, float]:
+    """Parse a regression threshold given as '5%' or 'ttfb_ms=10%'."""
+    metric, _, limit = value.rpartition("=")
+    if metric and metric not in TIMING_FIELDS:
+        raise argparse.ArgumentTypeError(
+            f"unknown threshold metric {metric!r}; choose from {', '.join(TIMING_FIELDS)}"
+        )
+    try:
+        threshold = _fraction(limit)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid threshold: {value!r} (expected a percentage or fraction, "
+            "e.g. 5%, 0.05 or ttfb_ms=10%)"
+        )
+    if threshold < 0:
+        raise argparse.ArgumentTypeError(f"threshold must not be negative: {value!r}")
+    return metric or "*", threshold
+
+
+def parse_compare_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="curl-perf compare",
+        description="Compare two curl-perf JSON result files and fail on regressions",
+    )
+    parser.add_argument("baseline", help="Baseline results JSON")
+    parser.add_argument("candidate", help="Candidate results JSON")
+    parser.add_argument(
+        "--metrics", type=_parse_metrics, default="total_ms,ttfb_ms",
+        help="Comma-separated timing fields to compare (default: total_ms,ttfb_ms)",
+    )
+    parser.add_argument(
+        "--threshold", type=_parse_threshold, action="append", default=[],
+        metavar="[METRIC=]PCT",
+        help="Relative slowdown tolerated before a significant difference counts as "
+             "a regression, e.g. 5%% or ttfb_ms=10%%; repeatable (default: 5%%)",
+    )
+    parser.add_argument(
+        "--statistic", choices=["median", "p95"], default="median",
+        help="Statistic to compare (default: median)",
+    )
+    parser.add_argument(
+        "--bootstrap-rounds", type=_positive_int, default=2000,
+        help="Bootstrap resamples for the significance test (default: 2000)",
+    )
+    return parser.parse_args(argv)
+
+
+def compare_main(argv: list[str]) -> int:
+    """Entry point for `curl-perf compare`; exits 1 on regression or missing rows."""
+    args = parse_compare_args(argv)
+    results = []
+    for path in (args.baseline, args.candidate):
+        try:
+            with open(path) as f:
+                results.append(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error: cannot read {path}: {e}", file=sys.stderr)
+            return 2
+    thresholds = {"*": 0.05} | dict(args.threshold)
+    diffs, missing, added = diff_results(
+        results[0], results[1],
+        metrics=args.metrics,
+        thresholds=thresholds,
+        statistic=args.statistic,
+        rounds=args.bootstrap_rounds,
+    )
+    print(format_compare_table(diffs, missing, added, args.statistic))
+    # A gate that compared nothing, or lost rows of the baseline, passes nothing
+    if missing:
+        print(
+            f"Error: {len(missing)} baseline row(s) missing from {args.candidate}",
+            file=sys.stderr,
+        )
+        return 1
+    if not diffs:
+        print(
+            f"Error: no rows with {', '.join(args.metrics)} to compare", file=sys.stderr,
+        )
+        return 1
+    return 1 if any(d.status == "regression" for d in diffs) else 0
+
+
+def parse_history_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="curl-perf history",
+        description="Query the run history recorded with --history-db",
+    )
+    parser.add_argument("db", help="SQLite history database")
+    parser.add_argument(
+        "query", choices=["trend", "best", "worst", "versions"],
+        help="trend: latest runs over time; best/worst: extreme runs; "
+             "versions: average per tool version",
+    )
+    parser.add_argument("--scenario", "-s", default="latency", help="(default: latency)")
+    parser.add_argument("--tool", "-t", default="curl", help="(default: curl)")
+    parser.add_argument("--protocol", "-p", default="HTTP/2", help="(default: HTTP/2)")
+    parser.add_argument(
+        "--metric", choices=sorted(history.METRICS), default="median",
+        help="Statistic of total time, or ttfb for median TTFB (default: median)",
+    )
+    parser.add_argument("--tool-version", help="Only runs of this exact tool version")
+    parser.add_argument("--since", help="Only runs at or after this ISO timestamp")
+    parser.add_argument(
+        "--limit", type=int, default=20, help="Rows to show (default: 20)",
+    )
+    return parser.parse_args(argv)
+
+
+def history_main(argv: list[str]) -> int:
+    """Entry point for `curl-perf history`."""
+    args = parse_history_args(argv)
+    if not os.path.exists(args.db):
+        print(f"Error: {args.db} does not exist", file=sys.stderr)
+        return 1
+    conn = history.connect(args.db)
+    try:
+        cell = (conn, args.scenario, args.tool, args.protocol, args.metric)
+        if args.query == "trend":
+            rows = history.trend(*cell, args.tool_version, args.since, args.limit)
+        elif args.query == "versions":
+            rows = history.by_version(*cell, args.since)
+        else:
+            rows = history.extremes(
+                *cell, args.query == "best", args.tool_version, args.since, args.limit,
+            )
+    finally:
+        conn.close()
+    title = f"{args.query}: {args.scenario} {args.tool} {args.protocol} ({args.metric})"
+    print(format_history_table(title, rows, runs_column=args.query == "versions"))
+    return 0
+
+
+def _add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--server-chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, metavar="BYTES",
+        help=f"Bytes per body message the local server streams (default: {DEFAULT_CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--server-key", choices=sorted(KEY_TYPES), default="rsa",
+        help="Local server certificate key type (default: rsa)",
+    )
+    parser.add_argument(
+        "--server-tls", choices=TLS_VERSIONS, default=TLS_VERSIONS[-1], metavar="VERSION",
+        help="Highest TLS version the local server negotiates: 1.2 or 1.3 (default: 1.3)",
+    )
+    parser.add_argument(
+        "--plaintext", action="store_true",
+        help="Local server speaks cleartext HTTP/1.1 and h2c (prior knowledge) instead of TLS",
+    )
+    parser.add_argument(
+        "--random-content", action="store_true",
+        help="Local server sends incompressible random bytes instead of a fill byte",
+    )
+    parser.add_argument(
+        "--server-workers", type=int, default=1, metavar="N",
+        help="Local server worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--uvloop", action="store_true",
+        help="Run the local server on uvloop (needs the uvloop package)",
+    )
+    parser.add_argument(
+        "--h2-max-streams", type=int, default=100, metavar="N",
+        help="Local server HTTP/2 max concurrent streams per connection (default: 100)",
+    )
+    parser.add_argument(
+        "--h2-max-frame-size", type=int, default=2**14, metavar="BYTES",
+        help="Largest HTTP/2 frame the local server accepts (default: 16384)",
+    )
+    parser.add_argument(
+        "--server-keepalive-timeout", type=float, default=5.0, metavar="SECONDS",
+        help="Local server idle connection timeout (default: 5)",
+    )
+    parser.add_argument(
+        "--server-keepalive-requests", type=int, default=1000, metavar="N",
+        help="Requests the local server serves per connection (default: 1000)",
+    )
+
+
+def _server_options(args: argparse.Namespace, http3: bool = False) -> ServerOptions | None:
+    """ServerOptions from the command line, or None after printing why not."""
+    if args.uvloop:
+        try:
+            import uvloop  # noqa: F401
+        except ImportError:
+            print(
+                "Error: --uvloop requires the uvloop package (uv sync --extra uvloop)",
+                file=sys.stderr,
+            )
+            return None
+    if http3:
+        try:
+            import aioquic  # noqa: F401
+        except ImportError:
+            print(
+                "Error: serving HTTP/3 requires the aioquic package (uv sync --extra http3)",
+                file=sys.stderr,
+            )
+            return None
+    try:
+        return ServerOptions(
+            workers=args.server_workers,
+            worker_class="uvloop" if args.uvloop else "asyncio",
+            chunk_size=args.server_chunk_size,
+            content="random" if args.random_content else "fill",
+            key_type=args.server_key,
+            h2_max_concurrent_streams=args.h2_max_streams,
+            h2_max_inbound_frame_size=args.h2_max_frame_size,
+            keep_alive_timeout=args.server_keepalive_timeout,
+            keep_alive_max_requests=args.server_keepalive_requests,
+            http3=http3,
+            tls_version=args.server_tls,
+            plaintext=args.plaintext,
+        )
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return None
+
+
+def parse_serve_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="curl-perf serve",
+        description="Run the local test server until interrupted, so repeated "
+                    "benchmarks can share it with --url",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="(default: 127.0.0.1)")
+    parser.add_argument(
+        "--port", type=int, default=0, help="(default: any free port)",
+    )
+    parser.add_argument(
+        "--http3", action="store_true",
+        help="Also serve HTTP/3 over QUIC on the same port (needs aioquic)",
+    )
+    _add_server_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def serve_main(argv: list[str]) -> int:
+    """Entry point for `curl-perf serve`."""
+    args = parse_serve_args(argv)
+    options = _server_options(args, args.http3)
+    if options is None:
+        return 1
+    server = LocalServer(args.host, args.port, options)
+    # Stop the server on `kill` as well as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        print(f"Serving {server.start()} (Ctrl-C to stop)", flush=True)
+        while server.running:
+            time.sleep(0.5)
+        print("Error: server exited", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        server.stop()
+
+
 def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         prog="curl-perf",
         description="HTTP/2 performance benchmark tool for curl and other HTTP clients",
+        epilog="Use 'curl-perf compare BASELINE CANDIDATE' to diff two result files "
+               "and 'curl-perf history DB QUERY' to query a --history-db. "
+               "'curl-perf serve' runs the local server on its own.",
     )
     parser.add_argument("--url", help="Target URL to benchmark")
     parser.add_argument(
         "--iterations", "-n", type=int, default=10,
         help="Number of iterations per scenario (default: 10)",
     )
+    parser.add_argument(
+        "--target-ci", type=_parse_ci,
+        help="Adaptive mode: sample each cell until the CI is within this "
+             "relative width, e.g. 2%% (default: off, use --iterations)",
+    )
+    parser.add_argument(
+        "--min-iterations", type=_positive_int, default=5,
+        help="Minimum iterations per cell in adaptive mode (default: 5)",
+    )
+    parser.add_argument(
+        "--max-iterations", type=_positive_int, default=1000,
+        help="Maximum iterations per cell in adaptive mode (default: 1000)",
+    )
+    parser.add_argument(
+        "--ci-statistic", choices=["median", "p95"], default="median",
+        help="Statistic whose CI must converge in adaptive mode (default: median)",
+    )
     parser.add_argument(
         "--tools", "-t",
         help="Comma-separated list of tools to test (default: all available)",
@@ -26,12 +407,13 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     parser.add_argument(
         "--scenarios", "-s",
         default="latency,multiplex,throughput",
-        help="Comma-separated scenarios: latency,multiplex,throughput (default: all)",
+        help="Comma-separated scenarios: latency,multiplex,throughput,upload,rate,keepalive,tls "
+             "(default: latency,multiplex,throughput)",
     )
     parser.add_argument(
         "--http-versions",
         default="1.1,2",
-        help="Comma-separated HTTP versions to test (default: 1.1,2)",
+        help="Comma-separated HTTP versions to test: 1.1, 2, 3 (default: 1.1,2)",
     )
     parser.add_argument(
         "--output-json", "-o",
@@ -41,22 +423,364 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
         "--local-server", action="store_true",
         help="Start built-in HTTP/2 test server",
     )
+    _add_server_arguments(parser)
+    parser.add_argument(
+        "--no-server-timing", action="store_true",
+        help="Do not tag requests to split TTFB with the local server's own timings",
+    )
+    parser.add_argument(
+        "--delay", type=float, default=0.0, metavar="MS",
+        help="Shape traffic with this one-way delay in each direction (default: 0)",
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, metavar="MS",
+        help="Random +/- variation of --delay (default: 0)",
+    )
+    parser.add_argument(
+        "--bandwidth", type=_parse_rate, metavar="RATE",
+        help="Cap each direction, shared by all connections, e.g. 100mbit or 5MB (default: none)",
+    )
+    parser.add_argument(
+        "--loss", type=_parse_loss, default=0.0, metavar="RATE",
+        help="Packet loss probability, e.g. 0.1%% (default: 0)",
+    )
+    parser.add_argument(
+        "--loss-burst", type=float, default=1.0, metavar="N",
+        help="Mean packets lost per loss event (default: 1)",
+    )
     parser.add_argument(
         "--concurrency", "-c", type=int, default=10,
         help="Concurrent requests for multiplex scenario (default: 10)",
     )
+    parser.add_argument(
+        "--max-workers", type=int, default=64,
+        help="Worker threads for tools that fan out one request per thread "
+             "(httpie, xh, py-requests; default: 64)",
+    )
+    parser.add_argument(
+        "--max-connections", type=_positive_int, default=50, metavar="N",
+        help="Connections a parallel batch may open at a time, like curl's "
+             "--parallel-max (curl, libcurl, httpx; default: 50)",
+    )
     parser.add_argument(
         "--download-size", type=int, default=10 * 1024 * 1024,
         help="Response size in bytes for throughput scenario (default: 10MB)",
     )
+    parser.add_argument(
+        "--upload-size", type=int, default=10 * 1024 * 1024,
+        help="Request body size in bytes for upload scenario (default: 10MB)",
+    )
+    parser.add_argument(
+        "--keepalive-requests", type=int, default=10,
+        help="Sequential requests per connection for keepalive scenario (default: 10)",
+    )
+    parser.add_argument(
+        "--rate", type=_positive_float, default=100.0,
+        help="Target requests per second for rate scenario (default: 100)",
+    )
+    parser.add_argument(
+        "--duration", type=_positive_float, default=10.0,
+        help="Seconds to sustain the target rate for rate scenario (default: 10)",
+    )
+    parser.add_argument(
+        "--calibrate-startup", action="store_true",
+        help="Measure each wall-clock tool's process startup cost and report it",
+    )
+    parser.add_argument(
+        "--subtract-startup", action="store_true",
+        help="Also report a network-only estimate with startup cost subtracted "
+             "(implies --calibrate-startup)",
+    )
+    parser.add_argument(
+        "--startup-samples", type=int, default=20,
+        help="Startup calibration runs per tool (default: 20)",
+    )
+    parser.add_argument(
+        "--histogram-precision", type=int, default=3, choices=range(1, 6),
+        metavar="{1-5}",
+        help="Significant digits kept by the latency histograms (default: 3)",
+    )
+    parser.add_argument(
+        "--bootstrap-rounds", type=int, default=2000,
+        help="Bootstrap resamples when comparing rows; 0 disables (default: 2000)",
+    )
+    parser.add_argument(
+        "--journal", metavar="FILE",
+        help="Stream raw samples to an append-only NDJSON journal, fsync'd per cell",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Continue the --journal file, skipping cells it already completed",
+    )
+    parser.add_argument(
+        "--history-db", metavar="FILE",
+        help="Also record the run in this SQLite history database "
+             "(query it with 'curl-perf history')",
+    )
+    parser.add_argument(
+        "--max-failures", type=int, default=0,
+        help="Failed requests tolerated per cell before it is aborted (default: 0)",
+    )
+    parser.add_argument(
+        "--no-progress", action="store_true",
+        help="Do not show live progress on stderr",
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, metavar="PORT",
+        help="Serve OpenMetrics at http://HOST:PORT/metrics while running (0: any free port)",
+    )
+    parser.add_argument(
+        "--metrics-host", default="127.0.0.1",
+        help="Address the metrics endpoint binds to (default: 127.0.0.1)",
+    )
+    parser.add_argument(
+        "--loop", action="store_true",
+        help="Repeat the whole benchmark until interrupted (probe mode)",
+    )
+    parser.add_argument(
+        "--loop-interval", type=float, default=0.0, metavar="SECONDS",
+        help="Pause between --loop rounds (default: 0)",
+    )
     parser.add_argument(
         "--list-tools", action="store_true",
         help="List all known tools and their availability, then exit",
     )
-    return parser.parse_args(argv)
+    args = parser.parse_args(argv)
+    if args.max_iterations < args.min_iterations:
+        parser.error(
+            f"--max-iterations ({args.max_iterations}) is below "
+            f"--min-iterations ({args.min_iterations})"
+        )
+    return args
+
+
+def _report(
+    args: argparse.Namespace, config: BenchmarkConfig, runner: BenchmarkRunner,
+    all_results: dict, tool_versions: dict[str, str | None],
+    server: LocalServer | None = None, monitor: ServerMonitor | None = None,
+) -> None:
+    """Print the result tables and write the JSON file and history record."""
+    url = config.url
+    startup = runner.startup if config.calibrate_startup else None
+    if runner.startup:
+        print("\nProcess startup overhead (no network):")
+        for name, cost in runner.startup.items():
+            print(
+                f"  {name:10s} {cost.median_ms:>8.1f}ms "
+                f"(95% CI {cost.ci_low_ms:.1f}-{cost.ci_high_ms:.1f}ms, n={cost.count})"
+            )
+
+    # Format and print results
+    json_output = {
+        "config": {
+            "url": url,
+            "iterations": args.iterations,
+            "histogram_precision": args.histogram_precision,
+            "tools": tool_versions,
+            "host": host_info(),
+        },
+        "scenarios": {},
+        "comparisons": {},
+    }
+    if startup is not None:
+        json_output["config"]["startup"] = {
+            name: {
+                "median_ms": cost.median_ms,
+                "ci_low_ms": cost.ci_low_ms,
+                "ci_high_ms": cost.ci_high_ms,
+                "count": cost.count,
+            }
+            for name, cost in startup.items()
+        }
+    if server is not None:
+        json_output["config"]["server"] = dataclasses.asdict(server.options)
+    if config.network is not None:
+        json_output["config"]["network"] = dataclasses.asdict(config.network)
+    if args.target_ci is not None:
+        json_output["config"].update({
+            "target_ci": args.target_ci,
+            "ci_statistic": args.ci_statistic,
+            "min_iterations": args.min_iterations,
+            "max_iterations": args.max_iterations,
+        })
+
+    # Shown next to the download rates of the throughput table
+    upload_rows = [
+        (tool_name, protocol, agg)
+        for tool_name, version_results in all_results.get("upload", {}).items()
+        for protocol, agg in version_results
+    ]
+    for scenario, tool_results in all_results.items():
+        rows = []
+        json_scenario = []
+        server_cpu_ms = {}
+        for tool_name, version_results in tool_results.items():
+            for protocol, agg in version_results:
+                rows.append((tool_name, protocol, agg))
+                row = {
+                    "tool": tool_name,
+                    "protocol": protocol,
+                    "mean_total_ms": agg.mean.total_ms,
+                    "median_total_ms": agg.median.total_ms,
+                    "median_ttfb_ms": agg.median.ttfb_ms,
+                    "median_pretransfer_ms": agg.median.pretransfer_ms,
+                    "median_server_ms": agg.median.server_ms,
+                    "median_wire_ms": agg.median.wire_ms,
+                    "p95_total_ms": agg.p95.total_ms,
+                    "p99_total_ms": agg.p99.total_ms if agg.p99 else None,
+                    "p999_total_ms": agg.p999.total_ms if agg.p999 else None,
+                    "stddev_total_ms": agg.stddev.total_ms,
+                    "count": agg.count,
+                    "histograms": {
+                        name: hist.to_dict() for name, hist in agg.histograms.items()
+                    },
+                }
+                cost = runner.startup.get(tool_name)
+                if cost is not None:
+                    row["startup_ms"] = cost.median_ms
+                    if args.subtract_startup:
+                        net, err = subtract_startup(agg, cost)
+                        row["net_total_ms"] = net
+                        row["net_uncertainty_ms"] = err
+                if isinstance(agg, MultiplexResult) and agg.streams is not None:
+                    row["streams"] = {
+                        "median_ttfb_ms": agg.streams.median.ttfb_ms,
+                        "p95_ttfb_ms": agg.streams.p95.ttfb_ms,
+                        "median_server_ms": agg.streams.median.server_ms,
+                        "median_wire_ms": agg.streams.median.wire_ms,
+                        "median_total_ms": agg.streams.median.total_ms,
+                        "p95_total_ms": agg.streams.p95.total_ms,
+                        "spread_median_ms": agg.spread_median_ms,
+                        "spread_p95_ms": agg.spread_p95_ms,
+                        "samples": [
+                            [
+                                {
+                                    "ttfb_ms": s.ttfb_ms,
+                                    "total_ms": s.total_ms,
+                                    "bytes_transferred": s.bytes_transferred,
+                                }
+                                for s in batch
+                            ]
+                            for batch in agg.stream_samples
+                        ],
+                    }
+                if isinstance(agg, KeepaliveResult) and agg.first is not None:
+                    row["first_median_total_ms"] = agg.first.median.total_ms
+                    row["first_median_ttfb_ms"] = agg.first.median.ttfb_ms
+                    row["first_count"] = agg.first.count
+                if scenario in ("throughput", "upload"):
+                    row["median_rate_bps"] = agg.median.transfer_rate_bps
+                if isinstance(agg, RateResult):
+                    row["target_rps"] = agg.target_rps
+                    row["achieved_rps"] = agg.achieved_rps
+                if isinstance(agg, HandshakeResult):
+                    row["connections"] = agg.connections
+                load = monitor.cells.get((scenario, tool_name, protocol)) if monitor else None
+                if load is not None:
+                    row["server_cpu"] = {
+                        "cores": load.cores, "peak": load.peak, "saturated": load.saturated,
+                    }
+                    if isinstance(agg, HandshakeResult) and agg.connections:
+                        per_connection = load.cpu_s * 1000 / agg.connections
+                        row["server_cpu"]["per_connection_ms"] = per_connection
+                        server_cpu_ms[(tool_name, protocol)] = per_connection
+                json_scenario.append(row)
+
+        comparisons = []
+        if args.bootstrap_rounds > 0 and len(rows) > 1:
+            comparisons = compare_rows(rows, rounds=args.bootstrap_rounds)
+            best = best_row(rows)
+            for row in json_scenario:
+                name = f"{row['tool']} {row['protocol']}"
+                row["verdict_vs_best"] = (
+                    "best" if name == best else verdict_between(comparisons, name, best)
+                )
+            json_output["comparisons"][scenario] = [
+                dataclasses.asdict(c) for c in comparisons
+            ]
+
+        if scenario == "throughput":
+            print(format_throughput_table(
+                rows, args.iterations, args.target_ci, startup, args.subtract_startup,
+                upload_rows, comparisons,
+            ))
+        elif scenario == "upload":
+            if "throughput" not in all_results:
+                print(format_throughput_table(
+                    [], args.iterations, args.target_ci, startup, args.subtract_startup,
+                    upload_rows,
+                ))
+        elif scenario == "multiplex":
+            print(format_multiplex_table(
+                rows, args.iterations, args.concurrency, args.target_ci,
+                startup, args.subtract_startup, comparisons,
+            ))
+        elif scenario == "keepalive":
+            print(format_keepalive_table(
+                rows, args.iterations, args.keepalive_requests, args.target_ci,
+                comparisons,
+            ))
+        elif scenario == "rate":
+            print(format_rate_table(rows, args.rate, args.duration))
+        elif scenario == "tls":
+            print(format_tls_table(rows, args.iterations, args.target_ci, server_cpu_ms))
+        else:
+            label = {
+                "latency": "Single Request Latency",
+            }.get(scenario, scenario)
+            print(format_table(
+                label, rows, args.iterations, args.target_ci, startup, args.subtract_startup,
+                comparisons,
+            ))
+
+        # An upload's TTFB includes sending the body, so its split says little
+        breakdown = format_ttfb_breakdown_table(rows) if scenario != "upload" else ""
+        if breakdown:
+            print(breakdown)
+
+        json_output["scenarios"][scenario] = json_scenario
+
+    total = monitor.total() if monitor is not None else None
+    if total is not None:
+        json_output["config"]["server"]["cpu_s"] = total.cpu_s
+        print(
+            f"\nLocal server CPU: {total.cores:.2f} cores on average, "
+            f"busiest process {total.peak:.0%} of a core"
+        )
+        for (scenario, tool_name, protocol), load in monitor.saturated():
+            print(
+                f"Warning: local server saturated during {scenario} {tool_name} {protocol} "
+                f"({load.peak:.0%} of a core); the result may be server-bound, "
+                "try --server-workers or --uvloop",
+                file=sys.stderr,
+            )
+
+    # Write JSON if requested
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            write_json(json_output, f)
+        print(f"Results saved to {args.output_json}")
+
+    if args.history_db:
+        conn = history.connect(args.history_db)
+        try:
+            run_id = history.record_run(
+                conn, dataclasses.asdict(config), host_info(), all_results, tool_versions,
+            )
+        finally:
+            conn.close()
+        print(f"Run {run_id} recorded in {args.history_db}")
 
 
 def main(argv: list[str] | None = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == "compare":
+        return compare_main(argv[1:])
+    if argv and argv[0] == "history":
+        return history_main(argv[1:])
+    if argv and argv[0] == "serve":
+        return serve_main(argv[1:])
     args = parse_args(argv)
 
     # List tools mode
@@ -64,8 +788,12 @@ def main(argv: list[str] | None = None) -> int:
         for cls in ALL_ADAPTERS:
             adapter = cls()
             avail = "available" if adapter.is_available() else "not found"
-            h2 = "HTTP/2" if adapter.supports_http2() else "HTTP/1.1 only"
-            print(f"  {adapter.name:15s} {avail:12s}  {h2}")
+            versions = ["HTTP/1.1"]
+            if adapter.supports_http2():
+                versions.append("HTTP/2")
+            if adapter.supports_http3():
+                versions.append("HTTP/3")
+            print(f"  {adapter.name:15s} {avail:12s}  {', '.join(versions)}")
         return 0
 
     # Resolve tools
@@ -87,11 +815,50 @@ def main(argv: list[str] | None = None) -> int:
 
     print(f"Tools: {', '.join(t.name for t in tools)}")
 
+    if args.resume and not args.journal:
+        print("Error: --resume requires --journal", file=sys.stderr)
+        return 1
+    if args.loop and args.journal:
+        print("Error: --journal cannot be combined with --loop", file=sys.stderr)
+        return 1
+
     # Resolve URL
+    try:
+        network = NetworkProfile(
+            delay_ms=args.delay, jitter_ms=args.jitter, bandwidth=args.bandwidth,
+            loss=args.loss, loss_burst=args.loss_burst,
+        )
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    http_versions = [v.strip() for v in args.http_versions.split(",")]
+    unknown = [v for v in http_versions if v not in HTTP_VERSION_LABELS]
+    if unknown:
+        print(f"Error: unknown HTTP version {unknown[0]!r} (use 1.1, 2, 3)", file=sys.stderr)
+        return 1
+    if network.shapes and "3" in http_versions:
+        print("Error: traffic shaping is TCP only and cannot carry HTTP/3", file=sys.stderr)
+        return 1
+    # Tools talk to the proxy's loopback address, so a remote server would
+    # get the wrong Host header and TLS server name
+    if network.shapes and not args.local_server and not _is_loopback(
+        urllib.parse.urlsplit(args.url or "").hostname
+    ):
+        print(
+            "Error: traffic shaping needs --local-server or a loopback --url",
+            file=sys.stderr,
+        )
+        return 1
+
     server = None
+    proxy = None
     url = args.url
     if args.local_server:
-        server = LocalServer()
+        options = _server_options(args, http3="3" in http_versions)
+        if options is None:
+            return 1
+        server = LocalServer(options=options)
         url = server.start()
         print(f"Local server started at {url}")
     elif not url:
@@ -99,57 +866,113 @@ def main(argv: list[str] | None = None) -> int:
         return 1
 
     try:
+        if network.shapes:
+            target = urllib.parse.urlsplit(url)
+            default_port = 443 if target.scheme == "https" else 80
+            proxy = ShapingProxy(target.hostname, target.port or default_port, network)
+            host, port = proxy.start()
+            url = urllib.parse.urlunsplit(target._replace(netloc=f"{host}:{port}"))
+            print(f"Shaping proxy at {url}: {network.describe()}")
+
         config = BenchmarkConfig(
             url=url,
             iterations=args.iterations,
             concurrency=args.concurrency,
+            max_workers=args.max_workers,
+            max_connections=args.max_connections,
             download_size=args.download_size,
-            http_versions=[v.strip() for v in args.http_versions.split(",")],
+            upload_size=args.upload_size,
+            http_versions=http_versions,
             scenarios=[s.strip() for s in args.scenarios.split(",")],
             local_server=args.local_server,
+            keepalive_requests=args.keepalive_requests,
+            rate=args.rate,
+            duration=args.duration,
+            target_ci=args.target_ci,
+            min_iterations=args.min_iterations,
+            max_iterations=args.max_iterations,
+            ci_statistic=args.ci_statistic,
+            calibrate_startup=args.calibrate_startup or args.subtract_startup,
+            startup_samples=args.startup_samples,
+            histogram_precision=args.histogram_precision,
+            max_failures=args.max_failures,
+            network=network if network.shapes else None,
         )
 
-        runner = BenchmarkRunner(config, tools)
-        all_results = runner.run_all()
-
-        # Format and print results
-        json_output = {"config": {"url": url, "iterations": args.iterations}, "scenarios": {}}
-
-        for scenario, tool_results in all_results.items():
-            rows = []
-            json_scenario = []
-            for tool_name, version_results in tool_results.items():
-                for protocol, agg in version_results:
-                    rows.append((tool_name, protocol, agg))
-                    json_scenario.append({
-                        "tool": tool_name,
-                        "protocol": protocol,
-                        "mean_total_ms": agg.mean.total_ms,
-                        "median_total_ms": agg.median.total_ms,
-                        "median_ttfb_ms": agg.median.ttfb_ms,
-                        "p95_total_ms": agg.p95.total_ms,
-                        "stddev_total_ms": agg.stddev.total_ms,
-                        "count": agg.count,
-                    })
-
-            if scenario == "throughput":
-                print(format_throughput_table(rows, args.iterations))
-            else:
-                label = {
-                    "latency": "Single Request Latency",
-                    "multiplex": f"Concurrent Multiplexing ({args.concurrency} requests)",
-                }.get(scenario, scenario)
-                print(format_table(label, rows, args.iterations))
-
-            json_output["scenarios"][scenario] = json_scenario
-
-        # Write JSON if requested
-        if args.output_json:
-            with open(args.output_json, "w") as f:
-                write_json(json_output, f)
-            print(f"Results saved to {args.output_json}")
+        tool_versions = {tool.name: tool.version() for tool in tools}
+        journal = None
+        completed = {}
+        recovered = None
+        if args.journal and args.resume and os.path.exists(args.journal):
+            try:
+                recovered = load_journal(args.journal)
+            except (OSError, ValueError) as e:
+                print(f"Error: cannot resume from {args.journal}: {e}", file=sys.stderr)
+                return 1
+            changed = incompatible_settings(recovered.header, config)
+            if changed:
+                print(
+                    f"Error: {args.journal} was written with different settings: "
+                    f"{', '.join(changed)}",
+                    file=sys.stderr,
+                )
+                return 1
+            completed = rebuild_results(recovered, config.histogram_precision)
+            journal = Journal.append(args.journal, recovered.valid_bytes)
+            print(f"Resuming {args.journal}: {len(completed)} completed cell(s)")
+        elif args.journal:
+            journal = Journal.create(args.journal, config, tool_versions)
+
+        progress = None
+        if not args.no_progress:
+            progress = LiveProgress(
+                expected_samples=None if args.target_ci is not None else args.iterations,
+            )
+        metrics = None
+        if args.metrics_port is not None:
+            metrics = MetricsServer(
+                MetricsCollector(tool_versions), args.metrics_host, args.metrics_port,
+            )
+            print(f"Serving OpenMetrics at {metrics.start()}")
+        startup = recovered.startup if recovered is not None else {}
+        try:
+            while True:
+                runner = BenchmarkRunner(
+                    config, tools, journal=journal, completed=completed,
+                    server_timings=(
+                        server.request_timings
+                        if server is not None and not args.no_server_timing else None
+                    ),
+                )
+                runner.startup.update(startup)
+                monitor = ServerMonitor(server) if server is not None else None
+                for listener in (progress, metrics and metrics.collector, monitor):
+                    if listener is not None:
+                        runner.add_listener(listener)
+                try:
+                    all_results = runner.run_all()
+                finally:
+                    if progress is not None:
+                        progress.close()
+                _report(args, config, runner, all_results, tool_versions, server, monitor)
+                if not args.loop:
+                    break
+                # Later rounds keep the startup calibration but nothing else
+                startup, completed = runner.startup, {}
+                time.sleep(args.loop_interval)
+        except KeyboardInterrupt:
+            if not args.loop:
+                raise
+            print("\nStopped")
+        finally:
+            if journal is not None:
+                journal.close()
+            if metrics is not None:
+                metrics.stop()
 
     finally:
+        if proxy:
+            proxy.stop()
         if server:
             server.stop()
             print("Local server stopped")
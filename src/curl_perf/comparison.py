@@ -0,0 +1,278 @@
+"""Statistical comparison of result rows: bootstrap CIs and rank tests.
+
+Comparisons work on the total_ms histograms of two rows, so they need
+no raw samples and can also be run on histograms loaded from JSON.
+"""
+
+from dataclasses import dataclass
+import math
+import random
+import statistics
+
+from curl_perf.results import AggregatedResult, Histogram, np, percentile, percentile_ranks
+
+STATISTIC_PERCENTILES = {"median": 50, "p95": 95}
+
+
+@dataclass
+class Comparison:
+    """Candidate row vs baseline row for one statistic of total time.
+
+    difference_ms is candidate minus baseline, so a negative difference
+    means the candidate is faster.
+    """
+    baseline: str
+    candidate: str
+    statistic: str
+    difference_ms: float
+    ci_low_ms: float
+    ci_high_ms: float
+    p_value: float
+    verdict: str
+
+
+def bootstrap(hist: Histogram, pct: float, rounds: int, rng) -> list[float]:
+    """Bootstrap distribution of a percentile, resampling from the histogram.
+
+    With NumPy each round is one multinomial draw over the buckets, so the
+    cost depends on the number of buckets rather than the sample count.
+    rng is a numpy Generator when NumPy is available, else random.Random.
+    """
+    buckets = hist.buckets()
+    values = [value for _, value, _ in buckets]
+    counts = [count for _, _, count in buckets]
+    lower, upper, weight = percentile_ranks(hist.count, pct)
+    if np is None:
+        stats = []
+        for _ in range(rounds):
+            draw = sorted(rng.choices(values, weights=counts, k=hist.count))
+            stats.append(draw[lower] + (draw[upper] - draw[lower]) * weight)
+        return stats
+    values = np.asarray(values)
+    probs = np.asarray(counts, dtype=np.float64) / hist.count
+    stats = np.empty(rounds)
+    # Keep each draw matrix to a few million cells
+    chunk = max(1, 4_000_000 // len(values))
+    for start in range(0, rounds, chunk):
+        size = min(chunk, rounds - start)
+        cumulative = np.cumsum(rng.multinomial(hist.count, probs, size=size), axis=1)
+        low = values[(cumulative > lower).argmax(axis=1)]
+        high = values[(cumulative > upper).argmax(axis=1)]
+        stats[start:start + size] = low + (high - low) * weight
+    return stats.tolist()
+
+
+def rank_test(a: Histogram, b: Histogram) -> float:
+    """Two-sided Mann-Whitney U test p-value for two histograms.
+
+    Samples in the same bucket count as ties; the normal approximation
+    uses the tie-corrected variance.
+    """
+    if (a.significant_figures, a.unit) != (b.significant_figures, b.unit):
+        raise ValueError("cannot compare histograms with different precision or unit")
+    na, nb = a.count, b.count
+    n = na + nb
+    below = 0
+    u = 0.0
+    ties = 0.0
+    for index in sorted(a.counts.keys() | b.counts.keys()):
+        ca, cb = a.counts.get(index, 0), b.counts.get(index, 0)
+        tied = ca + cb
+        u += ca * (below + (tied + 1) / 2)
+        ties += tied ** 3 - tied
+        below += tied
+    u -= na * (na + 1) / 2
+    variance = na * nb / 12 * ((n + 1) - ties / (n * (n - 1))) if n > 1 else 0.0
+    if variance <= 0:
+        return 1.0
+    z = (u - na * nb / 2) / math.sqrt(variance)
+    return 2 * (1 - statistics.NormalDist().cdf(abs(z)))
+
+
+def _point(hist: Histogram, statistic: str) -> float:
+    return hist.percentile(STATISTIC_PERCENTILES[statistic])
+
+
+def _verdict(difference: float, lo: float, hi: float, p_value: float, alpha: float) -> str:
+    if p_value >= alpha or lo <= 0 <= hi:
+        return "indistinguishable"
+    return "faster" if difference < 0 else "slower"
+
+
+def _make_rng(seed: int | None):
+    return random.Random(seed) if np is None else np.random.default_rng(seed)
+
+
+def compare_histograms(
+    baseline: Histogram,
+    candidate: Histogram,
+    statistic: str = "median",
+    rounds: int = 2000,
+    confidence: float = 0.95,
+    seed: int | None = 0,
+    names: tuple[str, str] = ("baseline", "candidate"),
+) -> Comparison:
+    rng = _make_rng(seed)
+    pct = STATISTIC_PERCENTILES[statistic]
+    base = bootstrap(baseline, pct, rounds, rng)
+    cand = bootstrap(candidate, pct, rounds, rng)
+    return _comparison(names, statistic, baseline, candidate, base, cand, confidence)
+
+
+def _comparison(
+    names: tuple[str, str], statistic: str,
+    baseline: Histogram, candidate: Histogram,
+    base_boot: list[float], cand_boot: list[float], confidence: float,
+) -> Comparison:
+    difference = _point(candidate, statistic) - _point(baseline, statistic)
+    diffs = sorted(c - b for b, c in zip(base_boot, cand_boot))
+    tail = (1 - confidence) / 2
+    lo = percentile(diffs, tail * 100)
+    hi = percentile(diffs, (1 - tail) * 100)
+    p_value = rank_test(baseline, candidate)
+    return Comparison(
+        baseline=names[0],
+        candidate=names[1],
+        statistic=statistic,
+        difference_ms=difference,
+        ci_low_ms=lo,
+        ci_high_ms=hi,
+        p_value=p_value,
+        verdict=_verdict(difference, lo, hi, p_value, 1 - confidence),
+    )
+
+
+def compare_rows(
+    rows: list[tuple[str, str, AggregatedResult]],
+    stats: tuple[str, ...] = ("median", "p95"),
+    rounds: int = 2000,
+    confidence: float = 0.95,
+    seed: int | None = 0,
+) -> list[Comparison]:
+    """Compare every pair of rows (earlier row as baseline) on total time."""
+    named = [
+        (f"{tool_name} {protocol}", agg.histograms["total_ms"])
+        for tool_name, protocol, agg in rows
+        if "total_ms" in agg.histograms
+    ]
+    rng = _make_rng(seed)
+    comparisons = []
+    for statistic in stats:
+        pct = STATISTIC_PERCENTILES[statistic]
+        # One bootstrap distribution per row, reused across its pairs
+        boots = [bootstrap(hist, pct, rounds, rng) for _, hist in named]
+        for i, (base_name, base_hist) in enumerate(named):
+            for j in range(i + 1, len(named)):
+                cand_name, cand_hist = named[j]
+                comparisons.append(_comparison(
+                    (base_name, cand_name), statistic, base_hist, cand_hist,
+                    boots[i], boots[j], confidence,
+                ))
+    return comparisons
+
+
+def verdict_between(
+    comparisons: list[Comparison], subject: str, reference: str, statistic: str = "median",
+) -> str | None:
+    """Verdict for subject relative to reference, whichever way round they were compared."""
+    flipped = {"faster": "slower", "slower": "faster"}
+    for c in comparisons:
+        if c.statistic != statistic:
+            continue
+        if (c.candidate, c.baseline) == (subject, reference):
+            return c.verdict
+        if (c.baseline, c.candidate) == (subject, reference):
+            return flipped.get(c.verdict, c.verdict)
+    return None
+
+
+@dataclass
+class MetricDiff:
+    """One metric of one scenario/tool/protocol row, baseline vs candidate run."""
+    scenario: str
+    tool: str
+    protocol: str
+    metric: str
+    baseline_ms: float
+    candidate_ms: float
+    threshold: float
+    comparison: Comparison | None
+    status: str
+
+    @property
+    def change(self) -> float:
+        """Relative change of the candidate against the baseline."""
+        if not self.baseline_ms:
+            return 0.0
+        return (self.candidate_ms - self.baseline_ms) / self.baseline_ms
+
+
+def _row_value(row: dict, metric: str, statistic: str) -> float | None:
+    hist = row.get("histograms", {}).get(metric)
+    if hist is not None:
+        return _point(Histogram.from_dict(hist), statistic)
+    # Result files written before histograms existed only carry a few aggregates
+    return row.get(f"{statistic}_{metric}")
+
+
+def diff_results(
+    baseline: dict,
+    candidate: dict,
+    metrics: list[str],
+    thresholds: dict[str, float],
+    statistic: str = "median",
+    rounds: int = 2000,
+    confidence: float = 0.95,
+) -> tuple[list[MetricDiff], list[str], list[str]]:
+    """Match rows of two result files by scenario/tool/protocol and diff them.
+
+    A metric regresses when the candidate is slower by more than its
+    threshold (relative) and, where both rows carry histograms of the same
+    precision, the difference is statistically significant. Returns the diffs, the
+    "scenario tool protocol" keys missing from the candidate and those
+    only in the candidate.
+    """
+    def _index(results: dict) -> dict[tuple[str, str, str], dict]:
+        return {
+            (scenario, row["tool"], row["protocol"]): row
+            for scenario, rows in results.get("scenarios", {}).items()
+            for row in rows
+        }
+
+    base_rows, cand_rows = _index(baseline), _index(candidate)
+    missing = [" ".join(key) for key in base_rows.keys() - cand_rows.keys()]
+    added = [" ".join(key) for key in cand_rows.keys() - base_rows.keys()]
+    diffs = []
+    for key in (k for k in base_rows if k in cand_rows):
+        base_row, cand_row = base_rows[key], cand_rows[key]
+        for metric in metrics:
+            base_value = _row_value(base_row, metric, statistic)
+            cand_value = _row_value(cand_row, metric, statistic)
+            if base_value is None or cand_value is None:
+                continue
+            comparison = None
+            base_hist = base_row.get("histograms", {}).get(metric)
+            cand_hist = cand_row.get("histograms", {}).get(metric)
+            if base_hist is not None and cand_hist is not None:
+                try:
+                    comparison = compare_histograms(
+                        Histogram.from_dict(base_hist), Histogram.from_dict(cand_hist),
+                        statistic, rounds, confidence, names=("baseline", "candidate"),
+                    )
+                except ValueError:
+                    # Histograms of another --histogram-precision have other
+                    # buckets; compare the point values alone, like old files
+                    pass
+            threshold = thresholds.get(metric, thresholds.get("*", 0.0))
+            diff = MetricDiff(
+                scenario=key[0], tool=key[1], protocol=key[2], metric=metric,
+                baseline_ms=base_value, candidate_ms=cand_value, threshold=threshold,
+                comparison=comparison, status="unchanged",
+            )
+            significant = comparison is None or comparison.verdict != "indistinguishable"
+            if significant and diff.change > threshold:
+                diff.status = "regression"
+            elif significant and diff.change < -threshold:
+                diff.status = "improvement"
+            diffs.append(diff)
+    return diffs, sorted(missing), sorted(added)
@@ -0,0 +1,175 @@
+"""SQLite history of benchmark runs, for trends across runs and tool versions.
+
+Each run is one row in `runs`; each scenario/tool/protocol result of the
+run is one row in `cells` with its summary statistics of total time and
+its serialized histograms, so any percentile can be recomputed later.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import json
+import sqlite3
+
+from curl_perf.results import AggregatedResult
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    url TEXT NOT NULL,
+    host TEXT NOT NULL,
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cells (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    timestamp TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    tool TEXT NOT NULL,
+    protocol TEXT NOT NULL,
+    tool_version TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    mean_ms REAL,
+    median_ms REAL,
+    p95_ms REAL,
+    p99_ms REAL,
+    stddev_ms REAL,
+    median_ttfb_ms REAL,
+    histograms TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cells_by_version
+    ON cells (scenario, tool, protocol, tool_version, timestamp);
+CREATE INDEX IF NOT EXISTS cells_by_time
+    ON cells (scenario, tool, protocol, timestamp);
+CREATE INDEX IF NOT EXISTS cells_by_median
+    ON cells (scenario, tool, protocol, median_ms);
+CREATE INDEX IF NOT EXISTS cells_by_run ON cells (run_id);
+"""
+
+# Statistic names accepted by queries -> cells columns
+METRICS = {
+    "mean": "mean_ms",
+    "median": "median_ms",
+    "p95": "p95_ms",
+    "p99": "p99_ms",
+    "ttfb": "median_ttfb_ms",
+}
+
+
+@dataclass
+class HistoryRow:
+    run_id: int
+    timestamp: str
+    tool_version: str
+    count: int
+    value_ms: float | None
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record_run(
+    conn: sqlite3.Connection,
+    config: dict,
+    host: dict,
+    results: dict[str, dict[str, list[tuple[str, AggregatedResult]]]],
+    tool_versions: dict[str, str | None],
+    timestamp: str | None = None,
+) -> int:
+    """Store one run's results; returns the new run id."""
+    timestamp = timestamp or datetime.now(timezone.utc).isoformat(timespec="seconds")
+    with conn:
+        run_id = conn.execute(
+            "INSERT INTO runs (timestamp, url, host, config) VALUES (?, ?, ?, ?)",
+            (timestamp, config.get("url", ""), host.get("hostname", ""), json.dumps(config)),
+        ).lastrowid
+        conn.executemany(
+            """INSERT INTO cells (
+                run_id, timestamp, scenario, tool, protocol, tool_version, count,
+                mean_ms, median_ms, p95_ms, p99_ms, stddev_ms, median_ttfb_ms, histograms
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (
+                    run_id, timestamp, scenario, tool_name, protocol,
+                    tool_versions.get(tool_name) or "", agg.count,
+                    agg.mean.total_ms, agg.median.total_ms, agg.p95.total_ms,
+                    agg.p99.total_ms if agg.p99 else None, agg.stddev.total_ms,
+                    agg.median.ttfb_ms,
+                    json.dumps({name: h.to_dict() for name, h in agg.histograms.items()}),
+                )
+                for scenario, tool_results in results.items()
+                for tool_name, rows in tool_results.items()
+                for protocol, agg in rows
+            ],
+        )
+    return run_id
+
+
+def _cell_filter(
+    scenario: str, tool: str, protocol: str,
+    tool_version: str | None, since: str | None,
+) -> tuple[str, list]:
+    clauses = ["scenario = ?", "tool = ?", "protocol = ?"]
+    params: list = [scenario, tool, protocol]
+    if tool_version is not None:
+        clauses.append("tool_version = ?")
+        params.append(tool_version)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    return " AND ".join(clauses), params
+
+
+def trend(
+    conn: sqlite3.Connection, scenario: str, tool: str, protocol: str,
+    metric: str = "median", tool_version: str | None = None,
+    since: str | None = None, limit: int = 50,
+) -> list[HistoryRow]:
+    """The most recent limit results of one cell, oldest first."""
+    where, params = _cell_filter(scenario, tool, protocol, tool_version, since)
+    rows = conn.execute(
+        f"""SELECT run_id, timestamp, tool_version, count, {METRICS[metric]} FROM cells
+            WHERE {where} ORDER BY timestamp DESC, id DESC LIMIT ?""",
+        params + [limit],
+    ).fetchall()
+    return [HistoryRow(*row) for row in reversed(rows)]
+
+
+def extremes(
+    conn: sqlite3.Connection, scenario: str, tool: str, protocol: str,
+    metric: str = "median", best: bool = True, tool_version: str | None = None,
+    since: str | None = None, limit: int = 10,
+) -> list[HistoryRow]:
+    """Best (lowest) or worst (highest) results of one cell."""
+    where, params = _cell_filter(scenario, tool, protocol, tool_version, since)
+    order = "ASC" if best else "DESC"
+    rows = conn.execute(
+        f"""SELECT run_id, timestamp, tool_version, count, {METRICS[metric]} FROM cells
+            WHERE {where} AND {METRICS[metric]} IS NOT NULL
+            ORDER BY {METRICS[metric]} {order} LIMIT ?""",
+        params + [limit],
+    ).fetchall()
+    return [HistoryRow(*row) for row in rows]
+
+
+def by_version(
+    conn: sqlite3.Connection, scenario: str, tool: str, protocol: str,
+    metric: str = "median", since: str | None = None,
+) -> list[HistoryRow]:
+    """One row per tool version, in release order (first seen).
+
+    value_ms is the average of the metric over that version's runs, count
+    the number of runs, and run_id/timestamp those of its latest run.
+    """
+    where, params = _cell_filter(scenario, tool, protocol, None, since)
+    rows = conn.execute(
+        f"""SELECT MAX(run_id), MAX(timestamp), tool_version, COUNT(*), AVG({METRICS[metric]})
+            FROM cells WHERE {where}
+            GROUP BY tool_version ORDER BY MIN(timestamp)""",
+        params,
+    ).fetchall()
+    return [HistoryRow(*row) for row in rows]
@@ -0,0 +1,248 @@
+"""Append-only journal of raw samples, for crash safety and --resume.
+
+The journal is NDJSON, one JSON value per line:
+
+    {"type": "header", "format": 1, "config": {...}, "tools": {...}, "host": {...}}
+    ["latency", "curl", "HTTP/2", total_ms, bytes, "2", dns_ms, connect_ms, tls_ms, ttfb_ms]
+    {"type": "startup", "tool": "xh", "median_ms": ..., ...}
+    {"type": "cell", "scenario": "latency", "tool": "curl", "protocol": "HTTP/2", ...}
+
+Sample lines are tagged with the (sub-)scenario they belong to, e.g.
+"multiplex/streams". Writes are buffered; a cell record marks its
+scenario/tool/protocol cell complete and is flushed and fsync'd, so after
+a crash at most the cell in progress is lost. Samples not followed by
+their cell record are ignored when loading.
+"""
+
+import dataclasses
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import json
+import mmap
+import os
+import platform
+from typing import IO
+
+from curl_perf.results import (
+    OPTIONAL_TIMING_FIELDS, AggregatedResult, HandshakeResult, KeepaliveResult,
+    MultiplexResult, RateResult, SampleStore, StartupCost, TimingResult, aggregate,
+    multiplex_result,
+)
+
+FORMAT_VERSION = 1
+
+
+def host_info() -> dict:
+    return {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _cell_extra(result: AggregatedResult) -> dict:
+    """What a cell needs beyond its samples to be rebuilt."""
+    if isinstance(result, RateResult):
+        return {"target_rps": result.target_rps, "achieved_rps": result.achieved_rps}
+    if isinstance(result, MultiplexResult):
+        return {"batch_sizes": [len(batch) for batch in result.stream_samples]}
+    if isinstance(result, HandshakeResult):
+        return {"connections": result.connections}
+    return {}
+
+
+class Journal:
+    """Writer side of a journal file."""
+
+    def __init__(self, f: IO[str]):
+        self._file = f
+
+    @classmethod
+    def create(cls, path: str, config, tools: dict[str, str | None]) -> "Journal":
+        """Start a new journal at path, replacing any existing file."""
+        journal = cls(open(path, "w"))
+        journal._write({
+            "type": "header",
+            "format": FORMAT_VERSION,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "config": dataclasses.asdict(config),
+            "tools": tools,
+            "host": host_info(),
+        })
+        journal._sync()
+        return journal
+
+    @classmethod
+    def append(cls, path: str, valid_bytes: int) -> "Journal":
+        """Continue a journal, dropping anything after its last complete cell."""
+        f = open(path, "r+")
+        f.truncate(valid_bytes)
+        f.seek(valid_bytes)
+        return cls(f)
+
+    def _write(self, record) -> None:
+        self._file.write(json.dumps(record, separators=(",", ":")))
+        self._file.write("\n")
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def write_samples(
+        self, scenario: str, tool: str, protocol: str, timings: list[TimingResult],
+    ) -> None:
+        for t in timings:
+            self._write([
+                scenario, tool, protocol, t.total_ms, t.bytes_transferred,
+                t.http_version_used, *(getattr(t, name) for name in OPTIONAL_TIMING_FIELDS),
+            ])
+
+    def write_startup(self, tool: str, cost: StartupCost) -> None:
+        self._write({"type": "startup", "tool": tool, **dataclasses.asdict(cost)})
+        self._sync()
+
+    def end_cell(self, scenario: str, tool: str, protocol: str, result: AggregatedResult) -> None:
+        self._write({
+            "type": "cell", "scenario": scenario, "tool": tool, "protocol": protocol,
+            **_cell_extra(result),
+        })
+        self._sync()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+@dataclass
+class JournalData:
+    """Everything recovered from a journal file."""
+    header: dict
+    samples: SampleStore
+    cells: dict[tuple[str, str, str], dict]
+    startup: dict[str, StartupCost]
+    # Length of the journal up to the end of its last committed record
+    valid_bytes: int
+
+
+def _belongs_to(line: list, cell: dict) -> bool:
+    scenario, tool, protocol = line[:3]
+    return (
+        (tool, protocol) == (cell["tool"], cell["protocol"])
+        and (scenario == cell["scenario"] or scenario.startswith(cell["scenario"] + "/"))
+    )
+
+
+def load_journal(path: str) -> JournalData:
+    """Read a journal through a memory map, keeping only committed cells."""
+    header = None
+    samples = SampleStore()
+    cells: dict[tuple[str, str, str], dict] = {}
+    startup: dict[str, StartupCost] = {}
+    pending: list[list] = []
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            while pos < len(mm):
+                end = mm.find(b"\n", pos)
+                if end < 0:
+                    break  # torn final write
+                try:
+                    record = json.loads(mm[pos:end])
+                except ValueError:
+                    break
+                pos = end + 1
+                if isinstance(record, list):
+                    pending.append(record)
+                    continue
+                kind = record.get("type")
+                if kind == "header":
+                    if record.get("format") != FORMAT_VERSION:
+                        raise ValueError(f"unsupported journal format {record.get('format')}")
+                    header = record
+                elif kind == "startup":
+                    fields = {f.name for f in dataclasses.fields(StartupCost)}
+                    startup[record["tool"]] = StartupCost(
+                        **{k: v for k, v in record.items() if k in fields}
+                    )
+                elif kind == "cell":
+                    for line in pending:
+                        if _belongs_to(line, record):
+                            samples.append(
+                                TimingResult(
+                                    total_ms=line[3], bytes_transferred=line[4],
+                                    http_version_used=line[5],
+                                    # Older journals end after ttfb_ms
+                                    **dict(zip(OPTIONAL_TIMING_FIELDS, line[6:])),
+                                ),
+                                tool=line[1], protocol=line[2], scenario=line[0],
+                            )
+                    pending = []
+                    cells[(record["scenario"], record["tool"], record["protocol"])] = record
+                valid_bytes = pos
+    if header is None:
+        raise ValueError(f"{path} has no journal header")
+    return JournalData(header, samples, cells, startup, valid_bytes)
+
+
+def _fields(agg: AggregatedResult) -> dict:
+    return {f.name: getattr(agg, f.name) for f in dataclasses.fields(agg)}
+
+
+# Settings a resumed run may change: the cell matrix and how results are reported
+RESUMABLE_SETTINGS = {"scenarios", "http_versions", "histogram_precision"}
+
+
+def incompatible_settings(header: dict, config) -> list[str]:
+    """Names of config settings that differ from the journal's."""
+    ignored = set(RESUMABLE_SETTINGS)
+    if config.local_server or config.network is not None:
+        ignored.add("url")  # the local server or proxy may come up on another port
+    current = dataclasses.asdict(config)
+    return sorted(
+        name for name, value in header["config"].items()
+        if name not in ignored and current.get(name) != value
+    )
+
+
+def rebuild_results(
+    data: JournalData, significant_figures: int = 3,
+) -> dict[tuple[str, str, str], AggregatedResult]:
+    """Recompute each committed cell's result from its journaled samples."""
+    results: dict[tuple[str, str, str], AggregatedResult] = {}
+    for (scenario, tool, protocol), cell in data.cells.items():
+        def _agg(sub: str) -> AggregatedResult | None:
+            cell_samples = data.samples.select(tool=tool, protocol=protocol, scenario=sub)
+            return aggregate(cell_samples, significant_figures) if len(cell_samples) else None
+
+        agg = _agg(scenario)
+        if scenario == "keepalive":
+            first = _agg("keepalive/first")
+            agg = agg or first
+            if agg is None:
+                continue
+            agg = KeepaliveResult(**_fields(agg), first=first)
+        elif agg is None:
+            continue
+        elif scenario == "multiplex":
+            streams = list(
+                data.samples.select(tool=tool, protocol=protocol, scenario="multiplex/streams")
+            )
+            batches, start = [], 0
+            for size in cell.get("batch_sizes", []):
+                batches.append(streams[start:start + size])
+                start += size
+            if batches:
+                agg = multiplex_result(agg, batches, _agg("multiplex/streams"))
+            else:
+                agg = MultiplexResult(**_fields(agg))
+        elif scenario == "tls":
+            agg = HandshakeResult(**_fields(agg), connections=cell.get("connections", agg.count))
+        elif scenario == "rate":
+            agg = RateResult(
+                **_fields(agg), target_rps=cell["target_rps"], achieved_rps=cell["achieved_rps"],
+            )
+        results[(scenario, tool, protocol)] = agg
+    return results
@@ -0,0 +1,168 @@
+"""OpenMetrics exporter for results of running and completed cells."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+from curl_perf.runner import CellFinished, RunnerEvent, SampleFailed, SamplesRecorded
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Upper bounds (seconds) of the exported histogram buckets
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# TimingResult field -> exported histogram
+HISTOGRAMS = {
+    "total_ms": ("curl_perf_total_seconds", "Total request time"),
+    "ttfb_ms": ("curl_perf_ttfb_seconds", "Time to first byte"),
+    "tls_ms": ("curl_perf_tls_seconds", "Time until the TLS handshake completed"),
+}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+class _Buckets:
+    """Cumulative-at-render bucket counts, sum and count of one labelled series."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+
+
+class MetricsCollector:
+    """Runner listener accumulating OpenMetrics series, safe to read from another thread.
+
+    Samples are counted as the runner reports them (whole batches for the
+    multiplex scenario), so in-flight cells show up before they finish.
+    """
+
+    def __init__(self, tool_versions: dict[str, str | None] | None = None):
+        self.tool_versions = tool_versions or {}
+        self._lock = threading.Lock()
+        self._histograms: dict[str, dict[tuple[str, str, str], _Buckets]] = {
+            field: {} for field in HISTOGRAMS
+        }
+        self._samples: dict[tuple[str, str, str], int] = {}
+        self._failures: dict[tuple[str, str, str], int] = {}
+        self._bytes: dict[tuple[str, str, str], int] = {}
+        self._cells = 0
+
+    def __call__(self, event: RunnerEvent) -> None:
+        if isinstance(event, SamplesRecorded):
+            key = (event.scenario, event.tool, event.protocol)
+            with self._lock:
+                for t in event.timings:
+                    for field, series in self._histograms.items():
+                        value = getattr(t, field)
+                        if value is not None:
+                            series.setdefault(key, _Buckets()).observe(value / 1000)
+                    self._bytes[key] = self._bytes.get(key, 0) + t.bytes_transferred
+                self._samples[key] = self._samples.get(key, 0) + len(event.timings)
+        elif isinstance(event, SampleFailed):
+            key = (event.scenario, event.tool, event.protocol)
+            with self._lock:
+                self._failures[key] = self._failures.get(key, 0) + 1
+        elif isinstance(event, CellFinished) and not event.resumed:
+            with self._lock:
+                self._cells += 1
+
+    def _counter(self, lines: list[str], name: str, help_text: str, values: dict) -> None:
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"# HELP {name} {help_text}")
+        for (scenario, tool, protocol), value in sorted(values.items()):
+            labels = _labels(scenario=scenario, tool=tool, protocol=protocol)
+            lines.append(f"{name}_total{{{labels}}} {value}")
+
+    def render(self) -> str:
+        """The current state in the OpenMetrics text format."""
+        lines = []
+        with self._lock:
+            for field, (name, help_text) in HISTOGRAMS.items():
+                lines.append(f"# TYPE {name} histogram")
+                lines.append(f"# UNIT {name} seconds")
+                lines.append(f"# HELP {name} {help_text}")
+                for (scenario, tool, protocol), series in sorted(self._histograms[field].items()):
+                    labels = _labels(scenario=scenario, tool=tool, protocol=protocol)
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, series.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {series.count}')
+                    lines.append(f"{name}_count{{{labels}}} {series.count}")
+                    lines.append(f"{name}_sum{{{labels}}} {series.sum}")
+            self._counter(lines, "curl_perf_samples", "Samples recorded", self._samples)
+            self._counter(
+                lines, "curl_perf_failures", "Failed requests (tool errors)", self._failures,
+            )
+            self._counter(
+                lines, "curl_perf_transferred_bytes", "Response bytes transferred", self._bytes,
+            )
+            lines.append("# TYPE curl_perf_cells counter")
+            lines.append("# HELP curl_perf_cells Completed scenario/tool/protocol cells")
+            lines.append(f"curl_perf_cells_total {self._cells}")
+        lines.append("# TYPE curl_perf_tool info")
+        lines.append("# HELP curl_perf_tool Version of each benchmarked tool")
+        for tool, version in sorted(self.tool_versions.items()):
+            lines.append(f"curl_perf_tool_info{{{_labels(tool=tool, version=version or '')}}} 1")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves a collector's metrics on http://host:port/metrics from a background thread."""
+
+    def __init__(self, collector: MetricsCollector, host: str = "127.0.0.1", port: int = 0):
+        self.collector = collector
+        self.host = host
+        self.port = port
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def start(self) -> str:
+        collector = self.collector
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = collector.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep scrapes out of the benchmark output
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
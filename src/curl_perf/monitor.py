@@ -0,0 +1,71 @@
+"""CPU use of the local server during each benchmark cell."""
+
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from curl_perf.runner import CellFailed, CellFinished, CellStarted, RunnerEvent
+
+if TYPE_CHECKING:
+    from curl_perf.server import LocalServer
+
+# CPU use of one server process, as a fraction of a core, from which a cell
+# is reported as server-bound: a hypercorn worker is one event loop thread.
+SATURATION_THRESHOLD = 0.9
+
+
+@dataclass
+class ServerLoad:
+    """CPU the local server used during one cell."""
+    wall_s: float
+    cpu_s: float
+    # Highest CPU use of a single server process, as a fraction of a core
+    peak: float
+
+    @property
+    def cores(self) -> float:
+        return self.cpu_s / self.wall_s if self.wall_s > 0 else 0.0
+
+    @property
+    def saturated(self) -> bool:
+        return self.peak >= SATURATION_THRESHOLD
+
+
+def server_load(
+    before: dict[int, float], after: dict[int, float], wall_s: float,
+) -> ServerLoad:
+    deltas = [cpu - before.get(pid, 0.0) for pid, cpu in after.items()]
+    peak = max(deltas, default=0.0) / wall_s if wall_s > 0 else 0.0
+    return ServerLoad(wall_s, sum(deltas), peak)
+
+
+class ServerMonitor:
+    """Runner listener measuring the local server's CPU use during each cell."""
+
+    def __init__(self, server: "LocalServer"):
+        self.server = server
+        self.cells: dict[tuple[str, str, str], ServerLoad] = {}
+        self._start: tuple[float, dict[int, float]] | None = None
+
+    def __call__(self, event: RunnerEvent) -> None:
+        if isinstance(event, CellStarted):
+            self._start = (time.monotonic(), self.server.cpu_times())
+        elif isinstance(event, (CellFinished, CellFailed)) and self._start is not None:
+            started, before = self._start
+            self._start = None
+            load = server_load(before, self.server.cpu_times(), time.monotonic() - started)
+            self.cells[(event.scenario, event.tool, event.protocol)] = load
+
+    def total(self) -> ServerLoad | None:
+        """Load over all measured cells, with the peak of the busiest one."""
+        if not self.cells:
+            return None
+        loads = self.cells.values()
+        return ServerLoad(
+            sum(load.wall_s for load in loads),
+            sum(load.cpu_s for load in loads),
+            max(load.peak for load in loads),
+        )
+
+    def saturated(self) -> list[tuple[tuple[str, str, str], ServerLoad]]:
+        return [(cell, load) for cell, load in self.cells.items() if load.saturated]
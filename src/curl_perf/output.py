@@ -3,29 +3,105 @@
 import json
 from typing import IO
 
-from curl_perf.results import AggregatedResult
+from curl_perf.comparison import Comparison, MetricDiff, verdict_between
+from curl_perf.history import HistoryRow
+from curl_perf.results import (
+    AggregatedResult, HandshakeResult, KeepaliveResult, MultiplexResult, RateResult,
+    StartupCost, subtract_startup,
+)
 
 
-def _fmt_ms(value: float | None) -> str:
+def _fmt_ms(value: float | None, digits: int = 1) -> str:
     if value is None:
         return f"{'-':>10}"
-    return f"{value:>9.1f}ms"
+    return f"{value:>9.{digits}f}ms"
+
+
+def _fmt_title(scenario: str, iterations: int, target_ci: float | None) -> str:
+    if target_ci is None:
+        return f"\nScenario: {scenario} ({iterations} iterations)"
+    return f"\nScenario: {scenario} (adaptive, CI within +/-{target_ci:.1%})"
+
+
+def _extra_header(
+    target_ci: float | None, startup: dict[str, StartupCost] | None, subtract: bool,
+) -> str:
+    extra = ""
+    if target_ci is not None:
+        extra += f" {'n':>6}"
+    if startup is not None:
+        extra += f" {'Overhead':>10}"
+        if subtract:
+            extra += f" {'Net med':>16}"
+    return extra
+
+
+def _extra_cells(
+    tool_name: str, agg: AggregatedResult, target_ci: float | None,
+    startup: dict[str, StartupCost] | None, subtract: bool,
+) -> str:
+    extra = ""
+    if target_ci is not None:
+        extra += f" {agg.count:>6}"
+    if startup is not None:
+        cost = startup.get(tool_name)
+        extra += " " + _fmt_ms(cost.median_ms if cost else None)
+        if subtract:
+            if cost is None:
+                extra += f" {'-':>16}"
+            else:
+                net, err = subtract_startup(agg, cost)
+                extra += f" {f'{net:.1f}+/-{err:.1f}ms':>16}"
+    return extra
+
+
+def best_row(rows: list[tuple[str, str, AggregatedResult]]) -> str | None:
+    """Name ("tool protocol") of the row with the lowest median total time."""
+    if not rows:
+        return None
+    tool_name, protocol, _ = min(rows, key=lambda row: row[2].median.total_ms)
+    return f"{tool_name} {protocol}"
+
+
+def _verdict_cell(
+    comparisons: list[Comparison], best: str, tool_name: str, protocol: str,
+) -> str:
+    """The "vs best" column: how the row compares with the fastest row."""
+    name = f"{tool_name} {protocol}"
+    verdict = "best" if name == best else verdict_between(comparisons, name, best)
+    return f"  {verdict or '-'}"
+
+
+def _fmt_comparison(c: Comparison) -> str:
+    return (
+        f"  {c.candidate} vs {c.baseline}: {c.difference_ms:+.2f}ms "
+        f"(CI {c.ci_low_ms:+.2f} to {c.ci_high_ms:+.2f}ms, p={c.p_value:.3g}) {c.verdict}"
+    )
 
 
 def format_table(
     scenario: str,
     rows: list[tuple[str, str, AggregatedResult]],
     iterations: int,
+    target_ci: float | None = None,
+    startup: dict[str, StartupCost] | None = None,
+    subtract_startup: bool = False,
+    comparisons: list[Comparison] | None = None,
 ) -> str:
     lines = []
-    lines.append(f"\nScenario: {scenario} ({iterations} iterations)")
-    lines.append("-" * 78)
+    lines.append(_fmt_title(scenario, iterations, target_ci))
     header = (
         f"{'Tool':<10} {'Protocol':<10} {'TTFB med':>10} "
         f"{'Total med':>10} {'p95':>10} {'stddev':>10}"
     )
+    header += _extra_header(target_ci, startup, subtract_startup)
+    best = best_row(rows) if comparisons else None
+    if best is not None:
+        header += "  vs best"
+    width = max(78, len(header))
+    lines.append("-" * width)
     lines.append(header)
-    lines.append("-" * 78)
+    lines.append("-" * width)
     for tool_name, protocol, agg in rows:
         line = (
             f"{tool_name:<10} {protocol:<10} "
@@ -34,36 +110,115 @@ def format_table(
             f"{_fmt_ms(agg.p95.total_ms)} "
             f"{_fmt_ms(agg.stddev.total_ms)}"
         )
+        line += _extra_cells(tool_name, agg, target_ci, startup, subtract_startup)
+        if best is not None:
+            line += _verdict_cell(comparisons, best, tool_name, protocol)
         lines.append(line)
+    if comparisons:
+        # Protocol differences within each tool, on the median
+        same_tool = [
+            c for c in comparisons
+            if c.statistic == "median" and c.baseline.split()[0] == c.candidate.split()[0]
+        ]
+        if same_tool:
+            lines.append("")
+            lines.extend(_fmt_comparison(c) for c in same_tool)
     lines.append("")
     return "\n".join(lines)
 
 
+def _fmt_rate(rate: float | None) -> str:
+    if rate is None:
+        return f"{'-':>12}"
+    if rate > 1_000_000:
+        rate_str = f"{rate / 1_000_000:.1f} MB/s"
+    elif rate > 1_000:
+        rate_str = f"{rate / 1_000:.1f} KB/s"
+    else:
+        rate_str = f"{rate:.0f} B/s"
+    return f"{rate_str:>12}"
+
+
 def format_throughput_table(
     rows: list[tuple[str, str, AggregatedResult]],
     iterations: int,
+    target_ci: float | None = None,
+    startup: dict[str, StartupCost] | None = None,
+    subtract_startup: bool = False,
+    uploads: list[tuple[str, str, AggregatedResult]] | None = None,
+    comparisons: list[Comparison] | None = None,
 ) -> str:
+    """Download rows, with the matching upload scenario rows alongside.
+
+    Upload rows are matched by tool and protocol; those without a download
+    row get a line of their own. The verdict column compares downloads.
+    """
+    uploads = uploads or []
     lines = []
-    lines.append(f"\nScenario: Throughput ({iterations} iterations)")
-    lines.append("-" * 78)
+    lines.append(_fmt_title("Throughput", iterations, target_ci))
     header = (
         f"{'Tool':<10} {'Protocol':<10} {'Total med':>10} "
         f"{'Rate med':>12} {'p95':>10} {'stddev':>10}"
     )
+    if uploads:
+        header += f" {'Upload med':>10} {'Upload rate':>12}"
+    header += _extra_header(target_ci, startup, subtract_startup)
+    best = best_row(rows) if comparisons else None
+    if best is not None:
+        header += "  vs best"
+    width = max(78, len(header))
+    lines.append("-" * width)
+    lines.append(header)
+    lines.append("-" * width)
+    upload_by_row = {(tool_name, protocol): agg for tool_name, protocol, agg in uploads}
+    merged = [
+        (tool_name, protocol, agg, upload_by_row.pop((tool_name, protocol), None))
+        for tool_name, protocol, agg in rows
+    ]
+    merged += [
+        (tool_name, protocol, None, upload)
+        for (tool_name, protocol), upload in upload_by_row.items()
+    ]
+    for tool_name, protocol, agg, upload in merged:
+        line = (
+            f"{tool_name:<10} {protocol:<10} "
+            f"{_fmt_ms(agg.median.total_ms if agg else None)} "
+            f"{_fmt_rate(agg.median.transfer_rate_bps if agg else None)} "
+            f"{_fmt_ms(agg.p95.total_ms if agg else None)} "
+            f"{_fmt_ms(agg.stddev.total_ms if agg else None)}"
+        )
+        if uploads:
+            line += (
+                f" {_fmt_ms(upload.median.total_ms if upload else None)} "
+                f"{_fmt_rate(upload.median.transfer_rate_bps if upload else None)}"
+            )
+        line += _extra_cells(tool_name, agg or upload, target_ci, startup, subtract_startup)
+        if best is not None:
+            line += _verdict_cell(comparisons, best, tool_name, protocol) if agg else "  -"
+        lines.append(line)
+    lines.append("")
+    return "\n".join(lines)
+
+
+def format_rate_table(
+    rows: list[tuple[str, str, RateResult]],
+    rate: float,
+    duration: float,
+) -> str:
+    lines = []
+    lines.append(f"\nScenario: Constant Arrival Rate ({rate:g} req/s for {duration:g}s)")
+    lines.append("-" * 78)
+    header = (
+        f"{'Tool':<10} {'Protocol':<10} {'Target':>8} {'Achieved':>9} "
+        f"{'Total med':>10} {'p95':>10} {'stddev':>10}"
+    )
     lines.append(header)
     lines.append("-" * 78)
     for tool_name, protocol, agg in rows:
-        rate = agg.median.transfer_rate_bps
-        if rate > 1_000_000:
-            rate_str = f"{rate / 1_000_000:.1f} MB/s"
-        elif rate > 1_000:
-            rate_str = f"{rate / 1_000:.1f} KB/s"
-        else:
-            rate_str = f"{rate:.0f} B/s"
         line = (
             f"{tool_name:<10} {protocol:<10} "
+            f"{agg.target_rps:>8.1f} {agg.achieved_rps:>9.1f} "
             f"{_fmt_ms(agg.median.total_ms)} "
-            f"{rate_str:>12} "
             f"{_fmt_ms(agg.p95.total_ms)} "
             f"{_fmt_ms(agg.stddev.total_ms)}"
         )
@@ -72,6 +227,236 @@ def format_throughput_table(
     return "\n".join(lines)
 
 
+def format_multiplex_table(
+    rows: list[tuple[str, str, MultiplexResult]],
+    iterations: int,
+    concurrency: int,
+    target_ci: float | None = None,
+    startup: dict[str, StartupCost] | None = None,
+    subtract_startup: bool = False,
+    comparisons: list[Comparison] | None = None,
+) -> str:
+    lines = []
+    lines.append(_fmt_title(
+        f"Concurrent Multiplexing ({concurrency} requests)", iterations, target_ci,
+    ))
+    header = (
+        f"{'Tool':<10} {'Protocol':<10} {'Total med':>10} "
+        f"{'TTFB med':>10} {'TTFB p95':>10} {'Stream med':>10} "
+        f"{'Stream p95':>10} {'Spread med':>10}"
+    )
+    header += _extra_header(target_ci, startup, subtract_startup)
+    best = best_row(rows) if comparisons else None
+    if best is not None:
+        header += "  vs best"
+    width = max(78, len(header))
+    lines.append("-" * width)
+    lines.append(header)
+    lines.append("-" * width)
+    for tool_name, protocol, agg in rows:
+        streams = getattr(agg, "streams", None)
+        line = (
+            f"{tool_name:<10} {protocol:<10} "
+            f"{_fmt_ms(agg.median.total_ms)} "
+            f"{_fmt_ms(streams.median.ttfb_ms if streams else None)} "
+            f"{_fmt_ms(streams.p95.ttfb_ms if streams else None)} "
+            f"{_fmt_ms(streams.median.total_ms if streams else None)} "
+            f"{_fmt_ms(streams.p95.total_ms if streams else None)} "
+            f"{_fmt_ms(getattr(agg, 'spread_median_ms', None))}"
+        )
+        line += _extra_cells(tool_name, agg, target_ci, startup, subtract_startup)
+        if best is not None:
+            line += _verdict_cell(comparisons, best, tool_name, protocol)
+        lines.append(line)
+    lines.append("")
+    return "\n".join(lines)
+
+
+def format_keepalive_table(
+    rows: list[tuple[str, str, KeepaliveResult]],
+    iterations: int,
+    requests: int,
+    target_ci: float | None = None,
+    comparisons: list[Comparison] | None = None,
+) -> str:
+    """Reused-connection rows; the verdict column compares reused requests."""
+    lines = []
+    lines.append(_fmt_title(f"Connection Reuse ({requests} requests)", iterations, target_ci))
+    header = (
+        f"{'Tool':<10} {'Protocol':<10} {'First med':>10} "
+        f"{'Reused med':>10} {'Reused p95':>10} {'Setup':>10} {'stddev':>10}"
+    )
+    header += _extra_header(target_ci, None, False)
+    best = best_row(rows) if comparisons else None
+    if best is not None:
+        header += "  vs best"
+    width = max(78, len(header))
+    lines.append("-" * width)
+    lines.append(header)
+    lines.append("-" * width)
+    for tool_name, protocol, agg in rows:
+        first = agg.first if agg.first is not None else agg
+        # What the first request pays on top of a request on a warm connection
+        setup = first.median.total_ms - agg.median.total_ms
+        line = (
+            f"{tool_name:<10} {protocol:<10} "
+            f"{_fmt_ms(first.median.total_ms)} "
+            f"{_fmt_ms(agg.median.total_ms)} "
+            f"{_fmt_ms(agg.p95.total_ms)} "
+            f"{_fmt_ms(setup)} "
+            f"{_fmt_ms(agg.stddev.total_ms)}"
+        )
+        line += _extra_cells(tool_name, first, target_ci, None, False)
+        if best is not None:
+            line += _verdict_cell(comparisons, best, tool_name, protocol)
+        lines.append(line)
+    lines.append("")
+    return "\n".join(lines)
+
+
+def format_tls_table(
+    rows: list[tuple[str, str, HandshakeResult]],
+    iterations: int,
+    target_ci: float | None = None,
+    server_cpu_ms: dict[tuple[str, str], float] | None = None,
+) -> str:
+    """Connection setup per tool and protocol/mode.
+
+    ``server_cpu_ms`` is the local server's CPU time per connection, by
+    (tool, protocol).
+    """
+    lines = []
+    lines.append(_fmt_title("TLS Handshakes (new connection per request)", iterations, target_ci))
+    header = (
+        f"{'Tool':<10} {'Protocol':<18} {'Connect med':>11} {'Handshake':>10} "
+        f"{'TTFB med':>10} {'Total med':>10} {'p95':>10} {'Srv CPU':>10}"
+    )
+    header += _extra_header(target_ci, None, False)
+    width = max(78, len(header))
+    lines.append("-" * width)
+    lines.append(header)
+    lines.append("-" * width)
+    for tool_name, protocol, agg in rows:
+        median = agg.median
+        # tls_ms and connect_ms are both measured from the start of the request
+        handshake = None
+        if median.tls_ms and median.connect_ms is not None:
+            handshake = median.tls_ms - median.connect_ms
+        cpu = (server_cpu_ms or {}).get((tool_name, protocol))
+        line = (
+            f"{tool_name:<10} {protocol:<18} "
+            f"{_fmt_ms(median.connect_ms):>11} "
+            f"{_fmt_ms(handshake)} "
+            f"{_fmt_ms(median.ttfb_ms)} "
+            f"{_fmt_ms(median.total_ms)} "
+            f"{_fmt_ms(agg.p95.total_ms)} "
+            f"{_fmt_ms(cpu)}"
+        )
+        line += _extra_cells(tool_name, agg, target_ci, None, False)
+        lines.append(line)
+    lines.append("")
+    return "\n".join(lines)
+
+
+def format_ttfb_breakdown_table(
+    rows: list[tuple[str, str, AggregatedResult]],
+) -> str:
+    """Median TTFB split into client setup, wire and server time.
+
+    Only rows whose samples were matched with the local server's request
+    timings have a split; without any, the table is empty (""). Multiplex
+    rows use their per-stream samples.
+    """
+    medians = []
+    for tool_name, protocol, agg in rows:
+        streams = getattr(agg, "streams", None)
+        median = (streams if streams is not None else agg).median
+        if median.server_ms is not None:
+            medians.append((tool_name, protocol, median))
+    if not medians:
+        return ""
+    lines = []
+    lines.append("\nTTFB breakdown (medians; server time measured by the local server)")
+    header = (
+        f"{'Tool':<10} {'Protocol':<18} {'TTFB':>10} {'Setup':>10} "
+        f"{'Wire':>10} {'Server':>10}"
+    )
+    width = max(78, len(header))
+    lines.append("-" * width)
+    lines.append(header)
+    lines.append("-" * width)
+    for tool_name, protocol, median in medians:
+        lines.append(
+            f"{tool_name:<10} {protocol:<18} "
+            f"{_fmt_ms(median.ttfb_ms)} "
+            f"{_fmt_ms(median.pretransfer_ms)} "
+            f"{_fmt_ms(median.wire_ms)} "
+            # Serving the small default body takes well under a millisecond
+            f"{_fmt_ms(median.server_ms, 2)}"
+        )
+    lines.append("")
+    return "\n".join(lines)
+
+
+def format_compare_table(
+    diffs: list[MetricDiff], missing: list[str], added: list[str], statistic: str,
+) -> str:
+    lines = []
+    lines.append(f"\nComparison: candidate vs baseline ({statistic})")
+    header = (
+        f"{'Scenario':<11} {'Tool':<10} {'Protocol':<10} {'Metric':<10} "
+        f"{'Baseline':>10} {'Candidate':>10} {'Change':>8} {'p':>7}  Status"
+    )
+    width = max(78, len(header))
+    lines.append("-" * width)
+    lines.append(header)
+    lines.append("-" * width)
+    for d in diffs:
+        p_value = f"{d.comparison.p_value:>7.3f}" if d.comparison else f"{'-':>7}"
+        status = d.status.upper() if d.status == "regression" else d.status
+        lines.append(
+            f"{d.scenario:<11} {d.tool:<10} {d.protocol:<10} {d.metric:<10} "
+            f"{_fmt_ms(d.baseline_ms)} {_fmt_ms(d.candidate_ms)} "
+            f"{d.change:>+8.1%} {p_value}  {status}"
+        )
+    if missing or added:
+        lines.append("")
+    if missing:
+        lines.append("Missing from candidate: " + ", ".join(missing))
+    if added:
+        lines.append("Only in candidate: " + ", ".join(added))
+    regressions = sum(d.status == "regression" for d in diffs)
+    lines.append("")
+    lines.append(f"{regressions} regression(s) in {len(diffs)} compared metric(s)")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def format_history_table(title: str, rows: list[HistoryRow], runs_column: bool = False) -> str:
+    lines = []
+    lines.append(f"\nHistory {title}")
+    count_label = "Runs" if runs_column else "n"
+    header = (
+        f"{'Run':>6}  {'Timestamp':<25} {'Tool version':<30} {count_label:>6} {'Value':>10}"
+    )
+    width = max(78, len(header))
+    lines.append("-" * width)
+    lines.append(header)
+    lines.append("-" * width)
+    for row in rows:
+        version = row.tool_version or "-"
+        if len(version) > 30:
+            version = version[:29] + "~"
+        lines.append(
+            f"{row.run_id:>6}  {row.timestamp:<25} {version:<30} {row.count:>6} "
+            f"{_fmt_ms(row.value_ms)}"
+        )
+    if not rows:
+        lines.append("(no matching runs)")
+    lines.append("")
+    return "\n".join(lines)
+
+
 def write_json(results: dict, output: IO[str]) -> None:
     json.dump(results, output, indent=2, default=str)
     output.write("\n")
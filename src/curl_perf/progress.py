@@ -0,0 +1,119 @@
+"""Live terminal progress display driven by runner events."""
+
+import sys
+import time
+from typing import IO
+
+from curl_perf.results import Histogram
+from curl_perf.runner import (
+    CellFailed, CellFinished, CellStarted, RunStarted, RunnerEvent, SampleFailed,
+    SamplesRecorded,
+)
+
+
+def _fmt_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class LiveProgress:
+    """Shows completed/total cells, ETA and rolling statistics of the current cell.
+
+    On a terminal one status line is redrawn in place (at most every
+    interval seconds); otherwise a line is printed per finished cell. The
+    rolling median/p95 come from a histogram fed sample by sample, so each
+    update costs the same however many samples the cell has.
+    """
+
+    def __init__(
+        self, stream: IO[str] = sys.stderr, expected_samples: int | None = None,
+        interval: float = 0.1,
+    ):
+        self.stream = stream
+        self.interactive = stream.isatty()
+        self.expected_samples = expected_samples
+        self.interval = interval
+        self.total_cells = 0
+        self.done_cells = 0
+        self.failures = 0
+        self._cell = ""
+        self._hist = Histogram()
+        self._started = time.monotonic()
+        self._last_draw = 0.0
+        self._width = 0
+
+    def __call__(self, event: RunnerEvent) -> None:
+        if isinstance(event, RunStarted):
+            self.total_cells = event.total_cells
+            self.done_cells = 0
+            self._started = time.monotonic()
+        elif isinstance(event, CellStarted):
+            self._cell = f"{event.scenario} {event.tool} {event.protocol}"
+            self._hist = Histogram()
+            self.failures = 0
+            self._draw(force=True)
+        elif isinstance(event, SamplesRecorded):
+            for t in event.timings:
+                self._hist.record(t.total_ms)
+            self._draw()
+        elif isinstance(event, SampleFailed):
+            self.failures = event.failures
+            self._draw(force=True)
+        elif isinstance(event, (CellFinished, CellFailed)):
+            self.done_cells += 1
+            if isinstance(event, CellFinished) and event.resumed:
+                return
+            outcome = "failed" if isinstance(event, CellFailed) else "done"
+            if not self.interactive:
+                self._print_line(f"{self.status()} {outcome}")
+            elif isinstance(event, CellFailed):
+                self.close()  # the runner prints the failure next
+            else:
+                self._draw(force=True)
+
+    def _eta(self) -> str:
+        progress = self.done_cells
+        if self.expected_samples and self._hist.count:
+            progress += min(1.0, self._hist.count / self.expected_samples)
+        if not progress or not self.total_cells:
+            return "?"
+        elapsed = time.monotonic() - self._started
+        return _fmt_duration(elapsed / progress * (self.total_cells - progress))
+
+    def status(self) -> str:
+        line = f"[{self.done_cells}/{self.total_cells} cells, ETA {self._eta()}] {self._cell}"
+        if self._hist.count:
+            line += (
+                f" n={self._hist.count} med {self._hist.median():.1f}ms"
+                f" p95 {self._hist.percentile(95):.1f}ms"
+            )
+        if self.failures:
+            line += f" failures={self.failures}"
+        return line
+
+    def _draw(self, force: bool = False) -> None:
+        if not self.interactive:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_draw < self.interval:
+            return
+        self._last_draw = now
+        line = self.status()
+        self.stream.write("\r" + line.ljust(self._width))
+        self.stream.flush()
+        self._width = len(line)
+
+    def _print_line(self, line: str) -> None:
+        self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def close(self) -> None:
+        """Clear the status line so the result tables start on a clean line."""
+        if self.interactive and self._width:
+            self.stream.write("\r" + " " * self._width + "\r")
+            self.stream.flush()
+            self._width = 0
@@ -1,8 +1,18 @@
 """Benchmark result data classes and aggregation."""
 
-from dataclasses import dataclass
+from array import array
+import bisect
+from dataclasses import dataclass, field, fields, replace
+import itertools
 import math
+import operator
 import statistics
+from typing import Iterable, Iterator
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback; same results, just slower
+    np = None
 
 
 @dataclass
@@ -15,6 +25,13 @@ class TimingResult:
     connect_ms: float | None = None
     tls_ms: float | None = None
     ttfb_ms: float | None = None
+    # Until the request was about to be sent: connection setup and client work
+    pretransfer_ms: float | None = None
+    # From the local server's request timings (ServerTiming)
+    server_ms: float | None = None
+    wire_ms: float | None = None
+    # Sent as the x-request-id header when the tool tags its requests
+    request_id: str | None = field(default=None, repr=False)
 
     @property
     def transfer_rate_bps(self) -> float:
@@ -23,6 +40,33 @@ class TimingResult:
         return self.bytes_transferred / (self.total_ms / 1000.0)
 
 
+# Request header a tagged request carries its ID in; the local server
+# reports per-request timings for these (LocalServer.request_timings)
+REQUEST_ID_HEADER = "x-request-id"
+
+
+@dataclass
+class ServerTiming:
+    """What the local server measured for one tagged request."""
+    # From the request reaching the app to the response headers being sent
+    server_ms: float
+    # From the request reaching the app to the final body message being sent
+    server_total_ms: float
+
+
+def with_server_timing(result: TimingResult, timing: ServerTiming) -> TimingResult:
+    """Split the result's TTFB into client setup, wire and server time.
+
+    wire_ms is what remains of TTFB after the request was ready to send and
+    once the server's own processing is taken out: request and response in
+    flight plus any queueing before the app saw the request.
+    """
+    wire_ms = None
+    if result.ttfb_ms is not None and result.pretransfer_ms is not None:
+        wire_ms = max(0.0, result.ttfb_ms - result.pretransfer_ms - timing.server_ms)
+    return replace(result, server_ms=timing.server_ms, wire_ms=wire_ms)
+
+
 @dataclass
 class AggregatedResult:
     mean: TimingResult
@@ -30,58 +74,522 @@ class AggregatedResult:
     p95: TimingResult
     stddev: TimingResult
     count: int
+    median_ci: tuple[float, float] | None = None
+    p99: TimingResult | None = None
+    p999: TimingResult | None = None
+    histograms: dict[str, "Histogram"] = field(default_factory=dict, repr=False)
+
+
+@dataclass
+class RateResult(AggregatedResult):
+    """Aggregate for an open-loop run, with latency measured from intended send times."""
+    target_rps: float = 0.0
+    achieved_rps: float = 0.0
+
+
+@dataclass
+class KeepaliveResult(AggregatedResult):
+    """Aggregate of the requests that reused a connection, plus the first one."""
+    first: AggregatedResult | None = None
+
+
+@dataclass
+class HandshakeResult(AggregatedResult):
+    """Aggregate of requests that each opened a new connection."""
+    # Connections opened, including the full handshake a resuming client
+    # makes before it has a session to resume
+    connections: int = 0
+
+
+@dataclass
+class MultiplexResult(AggregatedResult):
+    """Aggregate of whole batches, plus the distribution of individual streams."""
+    streams: AggregatedResult | None = None
+    spread_median_ms: float | None = None
+    spread_p95_ms: float | None = None
+    stream_samples: list[list[TimingResult]] = field(default_factory=list, repr=False)
+
+
+@dataclass
+class StartupCost:
+    """Process startup cost of a tool, measured without network access."""
+    median_ms: float
+    ci_low_ms: float
+    ci_high_ms: float
+    count: int
+
+    @property
+    def half_width_ms(self) -> float:
+        return (self.ci_high_ms - self.ci_low_ms) / 2
 
 
-TIMING_FIELDS = ["dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "total_ms"]
-OPTIONAL_TIMING_FIELDS = ["dns_ms", "connect_ms", "tls_ms", "ttfb_ms"]
+OPTIONAL_TIMING_FIELDS = [
+    "dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "pretransfer_ms", "server_ms", "wire_ms",
+]
+TIMING_FIELDS = OPTIONAL_TIMING_FIELDS + ["total_ms"]
 INT_FIELDS = ["bytes_transferred"]
+_timing_values = operator.attrgetter(*TIMING_FIELDS, *INT_FIELDS, "http_version_used")
+
+
+def percentile_ranks(count: int, pct: float) -> tuple[int, int, float]:
+    """The two ranks (0-based) a percentile lies between, and its weight on the upper.
+
+    Percentiles interpolate linearly between the closest ranks (NumPy's
+    default definition), so the 50th percentile is the usual median.
+    """
+    position = pct / 100.0 * (count - 1)
+    lower = math.floor(position)
+    return lower, min(lower + 1, count - 1), position - lower
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """The pct-th percentile of already sorted values."""
+    lower, upper, weight = percentile_ranks(len(sorted_values), pct)
+    low = sorted_values[lower]
+    return low + (sorted_values[upper] - low) * weight
+
+
+def batch_timing(streams: list[TimingResult], elapsed_ms: float) -> TimingResult:
+    """Summarise one parallel batch of per-stream timings.
+
+    The total is the batch wall clock, bytes are summed over all streams and
+    the connection phases and TTFB are those of the earliest stream.
+    """
+    def _earliest(field_name: str) -> float | None:
+        values = [getattr(s, field_name) for s in streams if getattr(s, field_name) is not None]
+        return min(values) if values else None
+
+    return TimingResult(
+        dns_ms=_earliest("dns_ms"),
+        connect_ms=_earliest("connect_ms"),
+        tls_ms=_earliest("tls_ms"),
+        ttfb_ms=_earliest("ttfb_ms"),
+        total_ms=elapsed_ms,
+        bytes_transferred=sum(s.bytes_transferred for s in streams),
+        http_version_used=streams[0].http_version_used,
+    )
+
+
+def multiplex_result(
+    agg: AggregatedResult, batches: list[list[TimingResult]], streams: AggregatedResult,
+) -> MultiplexResult:
+    """Attach per-stream statistics of the given batches to a batch aggregate."""
+    spreads = sorted(
+        max(s.total_ms for s in batch) - min(s.total_ms for s in batch)
+        for batch in batches
+    )
+    return MultiplexResult(
+        **{f.name: getattr(agg, f.name) for f in fields(agg)},
+        streams=streams,
+        spread_median_ms=percentile(spreads, 50),
+        spread_p95_ms=percentile(spreads, 95),
+        stream_samples=batches,
+    )
+
+
+def _ci_ranks(n: int, pct: float, confidence: float) -> tuple[int, int]:
+    q = pct / 100.0
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    half = z * math.sqrt(n * q * (1 - q))
+    lo = max(0, math.floor(n * q - half) - 1)
+    hi = min(n - 1, math.ceil(n * q + half) - 1)
+    return lo, hi
+
+
+def percentile_ci(
+    sorted_values: list[float], pct: float, confidence: float = 0.95,
+) -> tuple[float, float]:
+    """Distribution-free confidence interval for a percentile.
+
+    Uses the normal approximation to the binomial distribution of the
+    order statistic ranks, so no assumption is made about the shape of the
+    latency distribution.
+    """
+    lo, hi = _ci_ranks(len(sorted_values), pct, confidence)
+    return sorted_values[lo], sorted_values[hi]
+
+
+class Histogram:
+    """HDR-style log-linear histogram of non-negative values.
+
+    Values are recorded as integer multiples of unit. Every power-of-two
+    range is split into enough linear sub-buckets to keep
+    significant_figures decimal digits, so memory depends on the range of
+    values seen rather than on the number of samples. Count, min, max,
+    mean and variance are tracked exactly; histograms with the same
+    settings can be merged.
+    """
+
+    def __init__(self, significant_figures: int = 3, unit: float = 0.001):
+        if not 1 <= significant_figures <= 5:
+            raise ValueError("significant_figures must be between 1 and 5")
+        self.significant_figures = significant_figures
+        self.unit = unit
+        self._sub_bits = math.ceil(math.log2(2 * 10 ** significant_figures))
+        self._half = 1 << (self._sub_bits - 1)
+        self.counts: dict[int, int] = {}
+        # Sorted bucket indexes and their cumulative counts, rebuilt lazily
+        # after counts change
+        self._sorted: list[int] | None = None
+        self._cumulative: list[int] = []
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _index(self, units: int) -> int:
+        shift = max(0, units.bit_length() - self._sub_bits)
+        return shift * self._half + (units >> shift)
+
+    def _lowest_value(self, index: int) -> float:
+        if index < 2 * self._half:
+            return index * self.unit
+        shift = (index - self._half) // self._half
+        return ((index - shift * self._half) << shift) * self.unit
 
+    def _add_moments(self, count: int, mean: float, m2: float, lo: float, hi: float) -> None:
+        self._sorted = None
+        # Chan et al. parallel update keeps mean/variance exact and mergeable
+        total = self.count + count
+        delta = mean - self._mean
+        self._mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
 
-def _percentile(sorted_values: list[float], pct: float) -> float:
-    if len(sorted_values) == 1:
-        return sorted_values[0]
-    idx = math.ceil(pct / 100.0 * (len(sorted_values) - 1))
-    return sorted_values[idx]
-
-
-def _aggregate_field(values: list[float]) -> dict:
-    sorted_vals = sorted(values)
-    return {
-        "mean": statistics.mean(values),
-        "median": statistics.median(values),
-        "p95": _percentile(sorted_vals, 95),
-        "stddev": statistics.pstdev(values),
-    }
-
-
-def aggregate(results: list[TimingResult]) -> AggregatedResult:
-    stats: dict[str, dict] = {}
-    none_stats = {"mean": None, "median": None, "p95": None, "stddev": None}
-    for field_name in TIMING_FIELDS:
-        values = [getattr(r, field_name) for r in results]
-        if field_name in OPTIONAL_TIMING_FIELDS and all(v is None for v in values):
-            stats[field_name] = none_stats
-        else:
-            stats[field_name] = _aggregate_field([v if v is not None else 0.0 for v in values])
-    for field_name in INT_FIELDS:
-        values = [float(getattr(r, field_name)) for r in results]
-        stats[field_name] = _aggregate_field(values)
-
-    def _build_result(stat_key: str) -> TimingResult:
+    def record(self, value: float, count: int = 1) -> None:
+        value = max(0.0, value)
+        index = self._index(round(value / self.unit))
+        self.counts[index] = self.counts.get(index, 0) + count
+        self._add_moments(count, value, 0.0, value, value)
+
+    def record_many(self, values) -> None:
+        """Record a sequence (or NumPy array) of values in one pass."""
+        if np is None:
+            for value in values:
+                self.record(value)
+            return
+        values = np.maximum(np.asarray(values, dtype=np.float64), 0.0)
+        if not values.size:
+            return
+        units = np.rint(values / self.unit).astype(np.int64)
+        # frexp's exponent is the bit length of each (integral) value
+        bits = np.frexp(units.astype(np.float64))[1]
+        shift = np.maximum(bits - self._sub_bits, 0)
+        counts = np.bincount(shift * self._half + (units >> shift))
+        indexes = np.flatnonzero(counts)
+        for index, count in zip(indexes.tolist(), counts[indexes].tolist()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        mean = float(values.mean())
+        self._add_moments(
+            values.size, mean, float(np.square(values - mean).sum()),
+            float(values.min()), float(values.max()),
+        )
+
+    def merge(self, other: "Histogram") -> None:
+        if (other.significant_figures, other.unit) != (self.significant_figures, self.unit):
+            raise ValueError("cannot merge histograms with different precision or unit")
+        if not other.count:
+            return
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self._add_moments(other.count, other._mean, other._m2, other.min, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self._mean
+
+    @property
+    def stddev(self) -> float:
+        """Population standard deviation."""
+        return math.sqrt(max(0.0, self._m2 / self.count)) if self.count else 0.0
+
+    def _sorted_index(self) -> list[int]:
+        if self._sorted is None:
+            self._sorted = sorted(self.counts)
+            self._cumulative = list(itertools.accumulate(self.counts[i] for i in self._sorted))
+        return self._sorted
+
+    def value_at_rank(self, rank: int) -> float:
+        """Value of the rank-th smallest sample (0-based), to histogram precision."""
+        if rank <= 0:
+            return self.min
+        if rank >= self.count - 1:
+            return self.max
+        index = self._sorted_index()[bisect.bisect_right(self._cumulative, rank)]
+        return min(max(self._lowest_value(index), self.min), self.max)
+
+    def buckets(self) -> list[tuple[int, float, int]]:
+        """(index, value, count) for every non-empty bucket, in value order."""
+        return [
+            (index, min(max(self._lowest_value(index), self.min), self.max), self.counts[index])
+            for index in self._sorted_index()
+        ]
+
+    def percentile(self, pct: float) -> float:
+        """Interpolated like percentile(), between samples at histogram precision."""
+        lower, upper, weight = percentile_ranks(self.count, pct)
+        low = self.value_at_rank(lower)
+        if not weight:
+            return low
+        return low + (self.value_at_rank(upper) - low) * weight
+
+    def median(self) -> float:
+        return self.percentile(50)
+
+    def percentile_ci(self, pct: float, confidence: float = 0.95) -> tuple[float, float]:
+        lo, hi = _ci_ranks(self.count, pct, confidence)
+        return self.value_at_rank(lo), self.value_at_rank(hi)
+
+    def to_dict(self) -> dict:
+        return {
+            "significant_figures": self.significant_figures,
+            "unit": self.unit,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self._mean,
+            "m2": self._m2,
+            "counts": sorted(self.counts.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        hist = cls(data["significant_figures"], data["unit"])
+        hist.counts = {int(index): int(count) for index, count in data["counts"]}
+        hist.count = data["count"]
+        hist.min = data["min"]
+        hist.max = data["max"]
+        hist._mean = data["mean"]
+        hist._m2 = data["m2"]
+        return hist
+
+
+class SampleStore:
+    """Columnar store of raw timing samples.
+
+    Each TimingResult field is one typed array column (NaN marks a missing
+    optional timing), and tool, protocol, scenario and the negotiated HTTP
+    version are categorical columns of small integer codes, so a sample
+    costs about 80 bytes instead of a dataclass instance. column() returns
+    zero-copy NumPy views when NumPy is installed.
+    """
+
+    CATEGORIES = ("tool", "protocol", "scenario", "http_version_used")
+
+    def __init__(self):
+        self._columns: dict[str, array] = {name: array("d") for name in TIMING_FIELDS}
+        self._columns["bytes_transferred"] = array("q")
+        # Columns in _timing_values order, so append() fills them in one pass
+        self._row = [self._columns[name] for name in TIMING_FIELDS + INT_FIELDS]
+        self._codes: dict[str, array] = {name: array("H") for name in self.CATEGORIES}
+        self._levels: dict[str, list[str]] = {name: [] for name in self.CATEGORIES}
+        self._level_codes: dict[str, dict[str, int]] = {name: {} for name in self.CATEGORIES}
+
+    @classmethod
+    def from_results(cls, results: Iterable[TimingResult], **tags: str) -> "SampleStore":
+        store = cls()
+        store.extend(results, **tags)
+        return store
+
+    def __len__(self) -> int:
+        return len(self._columns["total_ms"])
+
+    def _code(self, category: str, value: str) -> int:
+        codes = self._level_codes[category]
+        if value not in codes:
+            codes[value] = len(self._levels[category])
+            self._levels[category].append(value)
+        return codes[value]
+
+    def append(
+        self, result: TimingResult, tool: str = "", protocol: str = "", scenario: str = "",
+    ) -> None:
+        *values, http_version_used = _timing_values(result)
+        for column, value in zip(self._row, values):
+            column.append(math.nan if value is None else value)
+        labels = (tool, protocol, scenario, http_version_used)
+        for category, value in zip(self.CATEGORIES, labels):
+            self._codes[category].append(self._code(category, value))
+
+    def extend(self, results: Iterable[TimingResult], **tags: str) -> None:
+        for result in results:
+            self.append(result, **tags)
+
+    def extend_store(self, other: "SampleStore") -> None:
+        for name, column in other._columns.items():
+            self._columns[name].extend(column)
+        for category in self.CATEGORIES:
+            # Re-code the other store's levels into this store's codes
+            remap = [self._code(category, level) for level in other._levels[category]]
+            self._codes[category].extend(remap[code] for code in other._codes[category])
+
+    def column(self, name: str):
+        """Values of one field: a NumPy view if available, else the raw array."""
+        if np is None:
+            return self._columns[name]
+        return np.frombuffer(self._columns[name], dtype=self._columns[name].typecode)
+
+    def filled(self, name: str, fill: float = 0.0):
+        """Column with missing values replaced by fill, or None if all are missing."""
+        column = self.column(name)
+        if np is None:
+            if all(math.isnan(v) for v in column):
+                return None
+            return [fill if math.isnan(v) else v for v in column]
+        missing = np.isnan(column)
+        if missing.all():
+            return None
+        return np.where(missing, fill, column)
+
+    def labels(self, category: str) -> list[str]:
+        """Distinct values seen in a categorical column, in first-seen order."""
+        return list(self._levels[category])
+
+    def label_at(self, category: str, index: int) -> str:
+        return self._levels[category][self._codes[category][index]]
+
+    def select(self, **tags: str) -> "SampleStore":
+        """Samples whose categorical columns match every given tag."""
+        wanted = {}
+        for category, value in tags.items():
+            if value not in self._level_codes[category]:
+                return SampleStore()
+            wanted[category] = self._level_codes[category][value]
+        subset = SampleStore()
+        for category in self.CATEGORIES:
+            subset._levels[category] = list(self._levels[category])
+            subset._level_codes[category] = dict(self._level_codes[category])
+        if np is not None:
+            mask = np.ones(len(self), dtype=bool)
+            for category, code in wanted.items():
+                mask &= np.frombuffer(self._codes[category], dtype=np.uint16) == code
+            for name, column in self._columns.items():
+                subset._columns[name].frombytes(self.column(name)[mask].tobytes())
+            for category, codes in self._codes.items():
+                subset._codes[category].frombytes(
+                    np.frombuffer(codes, dtype=np.uint16)[mask].tobytes()
+                )
+            return subset
+        rows = [
+            i for i in range(len(self))
+            if all(self._codes[c][i] == code for c, code in wanted.items())
+        ]
+        for name, column in self._columns.items():
+            subset._columns[name].extend(column[i] for i in rows)
+        for category, codes in self._codes.items():
+            subset._codes[category].extend(codes[i] for i in rows)
+        return subset
+
+    def __iter__(self) -> Iterator[TimingResult]:
+        for i in range(len(self)):
+            optional = {
+                name: None if math.isnan(self._columns[name][i]) else self._columns[name][i]
+                for name in OPTIONAL_TIMING_FIELDS
+            }
+            yield TimingResult(
+                total_ms=self._columns["total_ms"][i],
+                bytes_transferred=self._columns["bytes_transferred"][i],
+                http_version_used=self.label_at("http_version_used", i),
+                **optional,
+            )
+
+    @property
+    def nbytes(self) -> int:
+        arrays = list(self._columns.values()) + list(self._codes.values())
+        return sum(len(a) * a.itemsize for a in arrays)
+
+
+# Unit each field's histogram counts in: microseconds for times, bytes for sizes
+FIELD_UNITS = {name: 0.001 for name in TIMING_FIELDS} | {"bytes_transferred": 1.0}
+
+
+def histograms_for(
+    samples: SampleStore, significant_figures: int = 3,
+) -> dict[str, Histogram]:
+    """Record samples into one histogram per field.
+
+    Optional timing fields that no sample reports get no histogram; where
+    only some samples report them the missing values count as 0.
+    """
+    hists: dict[str, Histogram] = {}
+    for field_name in TIMING_FIELDS + INT_FIELDS:
+        values = samples.filled(field_name)
+        if values is None:
+            continue
+        hist = Histogram(significant_figures, FIELD_UNITS[field_name])
+        hist.record_many(values)
+        hists[field_name] = hist
+    return hists
+
+
+def aggregate_histograms(
+    hists: dict[str, Histogram], http_version_used: str,
+) -> AggregatedResult:
+    """Build an AggregatedResult view over per-field histograms."""
+    def _build_result(stat) -> TimingResult:
+        values = {name: stat(h) for name, h in hists.items()}
         return TimingResult(
-            total_ms=stats["total_ms"][stat_key],
-            bytes_transferred=int(stats["bytes_transferred"][stat_key]),
-            http_version_used=results[0].http_version_used,
-            dns_ms=stats["dns_ms"][stat_key],
-            connect_ms=stats["connect_ms"][stat_key],
-            tls_ms=stats["tls_ms"][stat_key],
-            ttfb_ms=stats["ttfb_ms"][stat_key],
+            total_ms=values["total_ms"],
+            bytes_transferred=int(values["bytes_transferred"]),
+            http_version_used=http_version_used,
+            **{name: values.get(name) for name in OPTIONAL_TIMING_FIELDS},
         )
 
+    total = hists["total_ms"]
     return AggregatedResult(
-        mean=_build_result("mean"),
-        median=_build_result("median"),
-        p95=_build_result("p95"),
-        stddev=_build_result("stddev"),
-        count=len(results),
+        mean=_build_result(lambda h: h.mean),
+        median=_build_result(lambda h: h.median()),
+        p95=_build_result(lambda h: h.percentile(95)),
+        stddev=_build_result(lambda h: h.stddev),
+        count=total.count,
+        median_ci=total.percentile_ci(50),
+        p99=_build_result(lambda h: h.percentile(99)),
+        p999=_build_result(lambda h: h.percentile(99.9)),
+        histograms=hists,
     )
+
+
+def aggregate(
+    results: list[TimingResult] | SampleStore, significant_figures: int = 3,
+) -> AggregatedResult:
+    samples = results if isinstance(results, SampleStore) else SampleStore.from_results(results)
+    return aggregate_histograms(
+        histograms_for(samples, significant_figures),
+        samples.label_at("http_version_used", 0),
+    )
+
+
+def merge_aggregates(aggs: list[AggregatedResult]) -> AggregatedResult:
+    """Combine aggregates from several workers or runs via their histograms."""
+    merged: dict[str, Histogram] = {}
+    for agg in aggs:
+        for name, hist in agg.histograms.items():
+            if name not in merged:
+                merged[name] = Histogram(hist.significant_figures, hist.unit)
+            merged[name].merge(hist)
+    return aggregate_histograms(merged, aggs[0].median.http_version_used)
+
+
+def startup_cost(samples: list[float]) -> StartupCost:
+    sorted_vals = sorted(samples)
+    lo, hi = percentile_ci(sorted_vals, 50)
+    return StartupCost(
+        median_ms=statistics.median(sorted_vals),
+        ci_low_ms=lo, ci_high_ms=hi, count=len(samples),
+    )
+
+
+def subtract_startup(agg: AggregatedResult, startup: StartupCost) -> tuple[float, float]:
+    """Estimate the network-only median total time and its uncertainty.
+
+    Returns (estimate, half-width), combining the confidence intervals of
+    both medians in quadrature.
+    """
+    estimate = agg.median.total_ms - startup.median_ms
+    total_half = 0.0
+    if agg.median_ci is not None:
+        total_half = (agg.median_ci[1] - agg.median_ci[0]) / 2
+    return estimate, math.hypot(total_half, startup.half_width_ms)
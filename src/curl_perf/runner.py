@@ -1,11 +1,87 @@
 """Benchmark runner that orchestrates scenarios across tools."""
 
+import concurrent.futures
+import contextlib
+import copy
+import dataclasses
+import itertools
+import os
+import socket
+import subprocess
+import tempfile
+import time
+from collections.abc import Callable, Iterator
 from dataclasses import dataclass, field
 
-from curl_perf.results import TimingResult, AggregatedResult, aggregate
-from curl_perf.tools.base import ToolAdapter
+from curl_perf.results import (
+    TimingResult, AggregatedResult, HandshakeResult, KeepaliveResult, MultiplexResult,
+    RateResult, ServerTiming,
+    SampleStore, StartupCost, aggregate, batch_timing, multiplex_result,
+    percentile, percentile_ci, startup_cost, with_server_timing,
+)
+from curl_perf.journal import Journal
+from curl_perf.shaping import NetworkProfile
+from curl_perf.tools.base import (
+    BatchTool, HandshakeTool, KeepaliveTool, ParallelTool, ThreadedParallelTool, ToolAdapter,
+    UploadTool,
+)
 
-HTTP_VERSION_LABELS = {"2": "HTTP/2", "1.1": "HTTP/1.1"}
+HTTP_VERSION_LABELS = {"1.1": "HTTP/1.1", "2": "HTTP/2", "3": "HTTP/3"}
+# How long to wait for the server to log timings of requests already answered
+SERVER_TIMING_WAIT_S = 0.5
+
+
+# Runner events, passed to every listener as they happen
+@dataclass
+class RunStarted:
+    total_cells: int
+
+
+@dataclass
+class CellStarted:
+    scenario: str
+    tool: str
+    protocol: str
+
+
+@dataclass
+class SamplesRecorded:
+    """New samples of the cell in progress (whole batches for multiplex)."""
+    scenario: str
+    tool: str
+    protocol: str
+    timings: list[TimingResult]
+
+
+@dataclass
+class SampleFailed:
+    scenario: str
+    tool: str
+    protocol: str
+    error: str
+    failures: int
+
+
+@dataclass
+class CellFinished:
+    scenario: str
+    tool: str
+    protocol: str
+    result: AggregatedResult
+    resumed: bool = False
+
+
+@dataclass
+class CellFailed:
+    scenario: str
+    tool: str
+    protocol: str
+    error: str
+
+
+RunnerEvent = (
+    RunStarted | CellStarted | SamplesRecorded | SampleFailed | CellFinished | CellFailed
+)
 
 
 @dataclass
@@ -14,70 +90,534 @@ class BenchmarkConfig:
     iterations: int = 10
     concurrency: int = 10
     download_size: int = 10 * 1024 * 1024
+    upload_size: int = 10 * 1024 * 1024
     http_versions: list[str] = field(default_factory=lambda: ["1.1", "2"])
     scenarios: list[str] = field(
         default_factory=lambda: ["latency", "multiplex", "throughput"]
     )
     local_server: bool = False
+    keepalive_requests: int = 10
+    rate: float = 100.0
+    duration: float = 10.0
+    rate_batch_ms: float = 20.0
+    max_inflight: int = 256
+    # Thread pool bound of adapters that run a parallel batch one request
+    # per thread (httpie, xh, py-requests)
+    max_workers: int = 64
+    # Connections a parallel batch may open at a time (curl's --parallel-max)
+    max_connections: int = 50
+    # Adaptive sampling: when target_ci is set, each cell samples until the
+    # confidence interval of ci_statistic is within +/- target_ci (relative).
+    target_ci: float | None = None
+    min_iterations: int = 5
+    max_iterations: int = 1000
+    ci_statistic: str = "median"
+    confidence: float = 0.95
+    calibrate_startup: bool = False
+    startup_samples: int = 20
+    # Significant decimal digits kept by the per-field latency histograms
+    histogram_precision: int = 3
+    # Failed samples tolerated per cell before the cell is aborted; with 0
+    # the first failure aborts it.
+    max_failures: int = 0
+    # Traffic shaping applied by a proxy in front of the server, if any
+    network: NetworkProfile | None = None
+
+
+@contextlib.contextmanager
+def upload_body(size: int) -> Iterator[str]:
+    """Path of a temporary file of size zero bytes, deleted afterwards.
+
+    The file is sparse, so even a body of several GB takes no disk space
+    and is read back from the page cache's zero page.
+    """
+    fd, path = tempfile.mkstemp(prefix="curl-perf-upload-")
+    try:
+        os.ftruncate(fd, size)
+        os.close(fd)
+        yield path
+    finally:
+        os.unlink(path)
 
 
 class BenchmarkRunner:
-    def __init__(self, config: BenchmarkConfig, tools: list[ToolAdapter]):
+    def __init__(
+        self, config: BenchmarkConfig, tools: list[ToolAdapter],
+        journal: Journal | None = None,
+        completed: dict[tuple[str, str, str], AggregatedResult] | None = None,
+        server_timings: Callable[[], dict[str, ServerTiming]] | None = None,
+    ):
         self.config = config
-        self.tools = tools
+        self.startup: dict[str, StartupCost] = {}
+        self.journal = journal
+        # (scenario, tool, protocol) cells recovered from a journal, not re-run
+        self.completed = completed or {}
+        self.listeners: list[Callable[[RunnerEvent], None]] = []
+        self._cell: tuple[str, str, str] = ("", "", "")
+        # Returns timings the server logged since the last call, by request ID
+        # (LocalServer.request_timings); tools then tag their requests
+        self.server_timings = server_timings
+        self._server_records: dict[str, ServerTiming] = {}
+        # The runner's own copies, so the caller's adapters keep their settings
+        self.tools = [self._run_copy(tool) for tool in tools]
+
+    def _run_copy(self, tool: ToolAdapter) -> ToolAdapter:
+        """A copy of tool with this run's request tagging, worker and connection limits."""
+        tool = copy.copy(tool)
+        tool.request_ids = self.server_timings is not None
+        if isinstance(tool, ThreadedParallelTool):
+            tool.max_workers = self.config.max_workers
+        if isinstance(tool, ParallelTool):
+            tool.max_connections = self.config.max_connections
+        return tool
+
+    def add_listener(self, listener: Callable[[RunnerEvent], None]) -> None:
+        self.listeners.append(listener)
+
+    def _emit(self, event: RunnerEvent) -> None:
+        for listener in self.listeners:
+            listener(event)
+
+    def _join_server_timings(self, timings: list[TimingResult]) -> list[TimingResult]:
+        """Add the server's timing to every tagged sample it has logged.
+
+        The server logs a request after sending its last body bytes, which
+        can be just after the client has read them, so missing IDs are
+        waited for briefly. Untagged samples are returned as they are.
+        """
+        wanted = {t.request_id for t in timings if t.request_id is not None}
+        if self.server_timings is None or not wanted:
+            return timings
+        deadline = time.monotonic() + SERVER_TIMING_WAIT_S
+        while True:
+            self._server_records.update(self.server_timings())
+            if wanted <= self._server_records.keys() or time.monotonic() >= deadline:
+                break
+            time.sleep(0.005)
+        joined = []
+        for t in timings:
+            record = self._server_records.pop(t.request_id, None) if t.request_id else None
+            joined.append(t if record is None else with_server_timing(t, record))
+        return joined
+
+    def _record(
+        self, store: SampleStore, timings: list[TimingResult], scenario: str | None = None,
+    ) -> list[TimingResult]:
+        """Add new samples of the current cell to its store and journal.
+
+        scenario overrides the cell's for sub-scenarios ("keepalive/first").
+        Returns the samples joined with their server timings.
+        """
+        scenario = scenario or self._cell[0]
+        _, tool, protocol = self._cell
+        timings = self._join_server_timings(timings)
+        store.extend(timings, tool=tool, protocol=protocol, scenario=scenario)
+        if self.journal is not None:
+            self.journal.write_samples(scenario, tool, protocol, timings)
+        return timings
+
+    def _aggregate(self, samples: SampleStore) -> AggregatedResult:
+        return aggregate(samples, self.config.histogram_precision)
 
     def _versions_for_tool(self, tool: ToolAdapter) -> list[str]:
         """Return the HTTP versions this tool can actually run."""
+        supported = {"2": tool.supports_http2, "3": tool.supports_http3}
         return [
             v for v in self.config.http_versions
-            if v != "2" or tool.supports_http2()
+            if v not in supported or supported[v]()
         ]
 
-    def run_latency(self, tool: ToolAdapter) -> list[tuple[str, AggregatedResult]]:
+    @staticmethod
+    def _closed_port_url() -> str:
+        """Return a loopback URL nothing is listening on."""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        return f"http://127.0.0.1:{port}/"
+
+    def calibrate_startup(self, tool: ToolAdapter) -> StartupCost | None:
+        """Measure the tool's process startup cost with no network transfer."""
+        cmd = tool.startup_command(self._closed_port_url())
+        if cmd is None:
+            return None
+        samples = []
+        for _ in range(self.config.startup_samples):
+            start = time.perf_counter()
+            subprocess.run(cmd, capture_output=True, timeout=30)
+            samples.append((time.perf_counter() - start) * 1000)
+        return startup_cost(samples)
+
+    def _converged(self, samples: SampleStore) -> bool:
+        pct = 95 if self.config.ci_statistic == "p95" else 50
+        values = sorted(samples.column("total_ms"))
+        lo, hi = percentile_ci(values, pct, self.config.confidence)
+        center = percentile(values, pct)
+        if center <= 0:
+            return True
+        return (hi - lo) / 2 <= self.config.target_ci * center
+
+    def _collect(
+        self, sample: Callable[[int], list[TimingResult]], step: int = 1,
+        scenario: str | None = None,
+    ) -> SampleStore:
+        """Take samples for one tool/version cell into a store of its own.
+
+        sample(n) returns n timings and is called step samples at a time;
+        in adaptive mode convergence is checked after every call. A call
+        that raises RuntimeError counts as a failure; the cell is aborted
+        once there are more than max_failures of them. A call that returns
+        fewer than n timings counts as a failure too. Samples are
+        journaled under scenario, the cell's own by default.
+        """
+        timings = SampleStore()
+        failures = 0
+
+        def take(n: int) -> None:
+            nonlocal failures
+            try:
+                new = sample(n)
+                # A short batch would leave the cell waiting for samples forever
+                if len(new) < n:
+                    raise RuntimeError(f"expected {n} samples, got {len(new)}")
+            except RuntimeError as e:
+                failures += 1
+                self._sample_failed(e, failures)
+                return
+            new = self._record(timings, new, scenario)
+            self._emit(SamplesRecorded(*self._cell, new))
+
+        if self.config.target_ci is None:
+            while len(timings) < self.config.iterations:
+                take(min(step, self.config.iterations - len(timings)))
+            return timings
+        while len(timings) < min(self.config.min_iterations, self.config.max_iterations):
+            take(min(self.config.min_iterations, self.config.max_iterations) - len(timings))
+        while len(timings) < self.config.max_iterations and not self._converged(timings):
+            take(min(step, self.config.max_iterations - len(timings)))
+        return timings
+
+    def _sample_failed(self, error: RuntimeError, failures: int) -> None:
+        """Report the cell's failures-th failed call; abort past max_failures."""
+        self._emit(SampleFailed(*self._cell, str(error), failures))
+        if failures > self.config.max_failures:
+            raise error
+
+    def _batch_step(self) -> int:
+        """Samples per call for tools that take many in one process.
+
+        One process for all fixed iterations; min_iterations per step when
+        adaptive.
+        """
+        if self.config.target_ci is None:
+            return self.config.iterations
+        return max(1, self.config.min_iterations)
+
+    def _collect_runs(self, tool: ToolAdapter, url: str, version: str) -> SampleStore:
+        """Collect single-request samples, batched when the tool supports it."""
+        if isinstance(tool, BatchTool):
+            return self._collect(
+                lambda n: tool.run_batch(url, version, n), step=self._batch_step(),
+            )
+        return self._collect(lambda n: [tool.run(url, version) for _ in range(n)])
+
+    def _run_cells(
+        self, tool: ToolAdapter, scenario: str,
+        run_cell: Callable[[str, str], AggregatedResult], mode: str | None = None,
+    ) -> list[tuple[str, AggregatedResult]]:
+        """Run run_cell(version, label) for every HTTP version of the tool.
+
+        A mode is appended to the protocol label ("HTTP/2 resumed").
+        Cells already completed in a resumed journal are not run again, and
+        every newly completed cell is committed to the journal.
+        """
         results = []
         for version in self._versions_for_tool(tool):
-            timings = []
-            for _ in range(self.config.iterations):
-                timing = tool.run(self.config.url, version)
-                timings.append(timing)
             label = HTTP_VERSION_LABELS.get(version, f"HTTP/{version}")
-            results.append((label, aggregate(timings)))
+            if mode is not None:
+                label = f"{label} {mode}"
+            self._cell = (scenario, tool.name, label)
+            result = self.completed.get(self._cell)
+            if result is not None:
+                self._emit(CellFinished(*self._cell, result, resumed=True))
+                results.append((label, result))
+                continue
+            self._emit(CellStarted(*self._cell))
+            try:
+                result = run_cell(version, label)
+            except RuntimeError as e:
+                self._emit(CellFailed(*self._cell, str(e)))
+                raise
+            finally:
+                # Server records no sample of the cell claimed, such as the
+                # first connection of a resumed TLS cell, are not kept
+                self._server_records.clear()
+            if self.journal is not None:
+                self.journal.end_cell(scenario, tool.name, label, result)
+            self._emit(CellFinished(*self._cell, result))
+            results.append((label, result))
         return results
 
+    def run_latency(self, tool: ToolAdapter) -> list[tuple[str, AggregatedResult]]:
+        def cell(version: str, label: str) -> AggregatedResult:
+            return self._aggregate(self._collect_runs(tool, self.config.url, version))
+
+        return self._run_cells(tool, "latency", cell)
+
+    def _fan_out_urls(self, batch: int) -> list[str]:
+        """The URLs of one multiplex batch.
+
+        Against the local server every request gets a path of its own, so
+        neither caches nor request coalescing in a client can answer
+        several requests with one response.
+        """
+        if not self.config.local_server:
+            return [self.config.url] * self.config.concurrency
+        base = self.config.url.rstrip("/")
+        return [f"{base}/r/{batch}/{i}" for i in range(self.config.concurrency)]
+
     def run_multiplex(self, tool: ToolAdapter) -> list[tuple[str, AggregatedResult]]:
-        results = []
-        urls = [self.config.url] * self.config.concurrency
-        for version in self._versions_for_tool(tool):
-            timings = []
-            for _ in range(self.config.iterations):
-                timing = tool.run_concurrent(urls, version)
-                timings.append(timing)
-            label = HTTP_VERSION_LABELS.get(version, f"HTTP/{version}")
-            results.append((label, aggregate(timings)))
-        return results
+        batch_numbers = itertools.count()
+
+        def cell(version: str, label: str) -> AggregatedResult:
+            batches: list[list[TimingResult]] = []
+            streams_store = SampleStore()
+
+            def sample(n: int) -> list[TimingResult]:
+                timings = []
+                for _ in range(n):
+                    urls = self._fan_out_urls(next(batch_numbers))
+                    if not isinstance(tool, ParallelTool):
+                        timings.append(tool.run_concurrent(urls, version))
+                        continue
+                    start = time.perf_counter()
+                    streams = tool.run_parallel(urls, version)
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    streams = self._record(streams_store, streams, "multiplex/streams")
+                    batches.append(streams)
+                    timings.append(batch_timing(streams, elapsed_ms))
+                return timings
+
+            agg = self._aggregate(self._collect(sample))
+            if not batches:
+                return MultiplexResult(
+                    **{f.name: getattr(agg, f.name) for f in dataclasses.fields(agg)}
+                )
+            return multiplex_result(agg, batches, self._aggregate(streams_store))
+
+        return self._run_cells(tool, "multiplex", cell)
 
     def run_throughput(self, tool: ToolAdapter) -> list[tuple[str, AggregatedResult]]:
-        results = []
         url = self.config.url
         if self.config.local_server and "/large" not in url:
             sep = "&" if "?" in url else "?"
             url = f"{url.rstrip('/')}/large{sep}size={self.config.download_size}"
-        for version in self._versions_for_tool(tool):
-            timings = []
-            for _ in range(self.config.iterations):
-                timing = tool.run(url, version)
-                timings.append(timing)
-            label = HTTP_VERSION_LABELS.get(version, f"HTTP/{version}")
-            results.append((label, aggregate(timings)))
+
+        def cell(version: str, label: str) -> AggregatedResult:
+            return self._aggregate(self._collect_runs(tool, url, version))
+
+        return self._run_cells(tool, "throughput", cell)
+
+    def run_upload(self, tool: ToolAdapter) -> list[tuple[str, AggregatedResult]]:
+        if not isinstance(tool, UploadTool):
+            return []
+        url = self.config.url
+        if self.config.local_server and "/upload" not in url:
+            url = f"{url.rstrip('/')}/upload"
+
+        with upload_body(self.config.upload_size) as body_path:
+            def cell(version: str, label: str) -> AggregatedResult:
+                return self._aggregate(self._collect(
+                    lambda n: [tool.run_upload(url, body_path, version) for _ in range(n)]
+                ))
+
+            return self._run_cells(tool, "upload", cell)
+
+    def run_keepalive(self, tool: ToolAdapter) -> list[tuple[str, AggregatedResult]]:
+        if not isinstance(tool, KeepaliveTool):
+            return []
+        urls = [self.config.url] * self.config.keepalive_requests
+
+        def cell(version: str, label: str) -> AggregatedResult:
+            reused = SampleStore()
+
+            def sample(n: int) -> list[TimingResult]:
+                firsts = []
+                for _ in range(n):
+                    timings = tool.run_keepalive(urls, version)
+                    firsts.append(timings[0])
+                    recorded = self._record(reused, timings[1:])
+                    self._emit(SamplesRecorded(*self._cell, recorded))
+                return firsts
+
+            # Convergence is judged on the first request, the noisier of the two
+            first = self._aggregate(self._collect(sample, scenario="keepalive/first"))
+            agg = self._aggregate(reused) if len(reused) else first
+            return KeepaliveResult(
+                **{f.name: getattr(agg, f.name) for f in dataclasses.fields(agg)},
+                first=first,
+            )
+
+        return self._run_cells(tool, "keepalive", cell)
+
+    def _tls_modes(self) -> list[str]:
+        # A cleartext URL has no handshake; its cells are the no-TLS baseline
+        if self.config.url.startswith("http://"):
+            return ["cleartext"]
+        return ["full", "resumed"]
+
+    def run_tls(self, tool: ToolAdapter) -> list[tuple[str, AggregatedResult]]:
+        """Connection setup: every sample is a request on a new connection.
+
+        Full-handshake cells disable TLS session reuse; in resumed cells
+        each connection resumes the session of the client's previous one.
+        """
+        if not isinstance(tool, HandshakeTool):
+            return []
+        url = self.config.url
+
+        def cell(version: str, label: str, resume: bool) -> AggregatedResult:
+            connections = 0
+
+            def sample(n: int) -> list[TimingResult]:
+                nonlocal connections
+                if not resume:
+                    timings = tool.run_handshakes(url, version, n)
+                    connections += n
+                    return timings
+                # The client's first connection has no session to resume yet
+                timings = tool.run_handshakes(url, version, n + 1, resume=True)
+                connections += n + 1
+                return timings[1:]
+
+            agg = self._aggregate(self._collect(sample, step=self._batch_step()))
+            return HandshakeResult(
+                **{f.name: getattr(agg, f.name) for f in dataclasses.fields(agg)},
+                connections=connections,
+            )
+
+        results = []
+        for mode in self._tls_modes():
+            results += self._run_cells(
+                tool, "tls",
+                lambda version, label, resume=mode == "resumed": cell(version, label, resume),
+                mode=mode,
+            )
         return results
 
+    def _send_open_loop(
+        self, tool: ToolAdapter, url: str, version: str, intended: list[float],
+    ) -> list[TimingResult]:
+        if len(intended) == 1:
+            timings = [tool.run(url, version)]
+        else:
+            timings = tool.run_parallel([url] * len(intended), version)
+        end = time.perf_counter()
+        if len(timings) < len(intended):
+            raise RuntimeError(f"expected {len(intended)} samples, got {len(timings)}")
+        # Latency runs from each request's intended send time to when the
+        # harness has the response, so stalls are not hidden (coordinated
+        # omission). Both ends are on the harness clock; a tool's own
+        # total leaves out its startup and the time it was queued.
+        return [
+            dataclasses.replace(t, total_ms=(end - due) * 1000)
+            for t, due in zip(timings, intended)
+        ]
+
+    def _run_open_loop(
+        self, tool: ToolAdapter, url: str, version: str,
+    ) -> tuple[SampleStore, float]:
+        """Issue requests at the configured rate regardless of response times.
+
+        Returns the corrected samples and the achieved request rate. A
+        batch that raises RuntimeError counts as a failure, as in _collect.
+        """
+        rate = self.config.rate
+        total = max(1, int(rate * self.config.duration))
+        interval = 1.0 / rate
+        batch_size = 1
+        if isinstance(tool, ParallelTool):
+            batch_size = max(1, int(rate * self.config.rate_batch_ms / 1000.0))
+        timings = SampleStore()
+        failures = 0
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.config.max_inflight) as pool:
+            futures = []
+            for first in range(0, total, batch_size):
+                count = min(batch_size, total - first)
+                intended = [start + (first + i) * interval for i in range(count)]
+                # A batch is launched once its last request is due, never early
+                delay = intended[-1] - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(
+                    pool.submit(self._send_open_loop, tool, url, version, intended)
+                )
+            for f in futures:
+                try:
+                    batch = f.result()
+                except RuntimeError as e:
+                    failures += 1
+                    self._sample_failed(e, failures)
+                    continue
+                batch = self._record(timings, batch)
+                self._emit(SamplesRecorded(*self._cell, batch))
+        elapsed = time.perf_counter() - start
+        return timings, len(timings) / elapsed
+
+    def run_rate(self, tool: ToolAdapter) -> list[tuple[str, AggregatedResult]]:
+        def cell(version: str, label: str) -> AggregatedResult:
+            timings, achieved = self._run_open_loop(tool, self.config.url, version)
+            agg = self._aggregate(timings)
+            return RateResult(
+                **{f.name: getattr(agg, f.name) for f in dataclasses.fields(agg)},
+                target_rps=self.config.rate,
+                achieved_rps=achieved,
+            )
+
+        return self._run_cells(tool, "rate", cell)
+
+    def _cell_count(self, scenario_runners: dict) -> int:
+        cells = 0
+        for scenario in self.config.scenarios:
+            if scenario not in scenario_runners:
+                continue
+            for tool in self.tools:
+                if scenario == "keepalive" and not isinstance(tool, KeepaliveTool):
+                    continue
+                if scenario == "upload" and not isinstance(tool, UploadTool):
+                    continue
+                if scenario == "tls":
+                    if isinstance(tool, HandshakeTool):
+                        cells += len(self._versions_for_tool(tool)) * len(self._tls_modes())
+                    continue
+                cells += len(self._versions_for_tool(tool))
+        return cells
+
     def run_all(self) -> dict[str, dict[str, list[tuple[str, AggregatedResult]]]]:
         all_results: dict[str, dict[str, list[tuple[str, AggregatedResult]]]] = {}
         scenario_runners = {
             "latency": self.run_latency,
             "multiplex": self.run_multiplex,
             "throughput": self.run_throughput,
+            "upload": self.run_upload,
+            "rate": self.run_rate,
+            "keepalive": self.run_keepalive,
+            "tls": self.run_tls,
         }
+        self._emit(RunStarted(self._cell_count(scenario_runners)))
+        if self.config.calibrate_startup:
+            for tool in self.tools:
+                if tool.name in self.startup:
+                    continue  # recovered from a resumed journal
+                try:
+                    cost = self.calibrate_startup(tool)
+                except (subprocess.SubprocessError, OSError) as e:
+                    print(f"  Warning: {tool.name} startup calibration failed: {e}")
+                    continue
+                if cost is not None:
+                    self.startup[tool.name] = cost
+                    if self.journal is not None:
+                        self.journal.write_startup(tool.name, cost)
         for scenario in self.config.scenarios:
             runner_fn = scenario_runners.get(scenario)
             if runner_fn is None:
@@ -1,21 +1,46 @@
 """Local HTTP/2 test server for reproducible benchmarks."""
 
+import functools
+import json
 import os
+import shutil
+import socket
+import ssl
 import subprocess
+import sys
 import tempfile
+import time
+from dataclasses import dataclass
 from pathlib import Path
 from urllib.parse import parse_qs
 
+from curl_perf.results import REQUEST_ID_HEADER, ServerTiming
 
-def generate_self_signed_cert(directory: Path | str) -> tuple[str, str]:
+
+# openssl -newkey arguments per certificate key type
+KEY_TYPES = {
+    "rsa": ["-newkey", "rsa:2048"],
+    "ecdsa": ["-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1"],
+}
+
+# Validity of generated certificates; cached ones are replaced a day early
+CERT_DAYS = 30
+
+# Highest TLS version the local server can be limited to
+TLS_VERSIONS = ("1.2", "1.3")
+
+
+def generate_self_signed_cert(
+    directory: Path | str, key_type: str = "rsa", days: int = 1,
+) -> tuple[str, str]:
     directory = Path(directory)
     cert_path = str(directory / "cert.pem")
     key_path = str(directory / "key.pem")
     subprocess.run(
         [
-            "/usr/bin/openssl", "req", "-x509", "-newkey", "rsa:2048",
+            "/usr/bin/openssl", "req", "-x509", *KEY_TYPES[key_type],
             "-keyout", key_path, "-out", cert_path,
-            "-days", "1", "-nodes",
+            "-days", str(days), "-nodes",
             "-subj", "/CN=localhost",
         ],
         capture_output=True,
@@ -24,15 +49,174 @@ def generate_self_signed_cert(directory: Path | str) -> tuple[str, str]:
     return cert_path, key_path
 
 
-def create_app():
+def cert_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "curl-perf" / "certs"
+
+
+def cached_cert(key_type: str = "rsa", directory: Path | str | None = None) -> tuple[str, str]:
+    """A self-signed localhost certificate, generated on first use and reused after.
+
+    Certificates live in ``directory`` (default: ~/.cache/curl-perf/certs) and
+    are regenerated when less than a day of their validity is left. Each
+    pair is generated into a directory of its own that is never changed
+    afterwards, and the ``<key_type>`` symlink is switched to it in one
+    rename, so concurrent runs always get a key and certificate that match.
+    """
+    directory = Path(directory) if directory is not None else cert_cache_dir()
+    link = directory / key_type
+    try:
+        current = directory / os.readlink(link)
+        age = time.time() - (current / "cert.pem").stat().st_mtime
+        if age < (CERT_DAYS - 1) * 86400:
+            return str(current / "cert.pem"), str(current / "key.pem")
+    except OSError:
+        pass
+    directory.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f"{key_type}-", dir=directory))
+    try:
+        cert_path, key_path = generate_self_signed_cert(staging, key_type, CERT_DAYS)
+        new_link = directory / f".{staging.name}"
+        os.symlink(staging.name, new_link)
+        os.replace(new_link, link)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    # Pairs past their validity are of no use to any run any more
+    expired = time.time() - CERT_DAYS * 86400
+    for old in directory.glob(f"{key_type}-*"):
+        if old != staging and old.is_dir() and old.stat().st_mtime < expired:
+            shutil.rmtree(old, ignore_errors=True)
+    return cert_path, key_path
+
+
+def wait_for_server(
+    host: str, port: int, timeout: float = 15.0, process=None, tls: bool = True,
+) -> None:
+    """Block until the server on host:port answers.
+
+    Over TLS a completed handshake is enough. In cleartext, connecting
+    proves nothing (the listening socket is bound before the server
+    starts), so a request must get a response.
+
+    Raises RuntimeError after ``timeout`` seconds, or as soon as ``process``
+    (the server's Popen) exits.
+    """
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            what = "TLS handshake" if tls else "response"
+            raise RuntimeError(f"no {what} from {host}:{port} after {timeout:g}s")
+        try:
+            with socket.create_connection((host, port), timeout=min(remaining, 1.0)) as sock:
+                if tls:
+                    with context.wrap_socket(sock):
+                        return
+                sock.sendall(b"HEAD / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                if sock.recv(1):
+                    return
+        except OSError:
+            pass
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        time.sleep(0.01)
+
+
+# /large is streamed in chunks of this many bytes unless configured otherwise
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+# Size of the shared buffer /large chunks are sliced from. Random content gets
+# a buffer larger than any compressor window (brotli's largest is 16 MiB), so
+# repeating it cannot be compressed away.
+CONTENT_BUFFER_SIZES = {"fill": 1024 * 1024, "random": 32 * 1024 * 1024}
+
+
+@functools.cache
+def content_buffer(content: str = "fill") -> bytes:
+    """The shared, generated-once buffer /large responses are served from."""
+    size = CONTENT_BUFFER_SIZES[content]
+    return b"x" * size if content == "fill" else os.urandom(size)
+
+
+class _TimingLog:
+    """Appends a line per tagged request to a file of the current process.
+
+    Each line is ``[request_id, server_ms, server_total_ms]``. Hypercorn
+    spawns every worker as a fresh process, so each writes a file of its
+    own, named by pid and opened on first use.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._fd = None
+        self._pid = None
+
+    def write(self, request_id: str, server_s: float, total_s: float) -> None:
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._fd = os.open(
+                os.path.join(self.directory, f"{self._pid}.ndjson"),
+                os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+            )
+        line = json.dumps([request_id, server_s * 1000, total_s * 1000]) + "\n"
+        os.write(self._fd, line.encode())
+
+
+def _timed_send(send, log: _TimingLog, request_id: str, arrival: float):
+    """Wrap an ASGI send to log when the response starts and ends."""
+    started = arrival
+
+    async def timed_send(message):
+        nonlocal started
+        if message["type"] == "http.response.start":
+            started = time.perf_counter()
+        await send(message)
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            log.write(request_id, started - arrival, time.perf_counter() - arrival)
+
+    return timed_send
+
+
+def create_app(
+    chunk_size: int = DEFAULT_CHUNK_SIZE, content: str = "fill", timing_dir: str | None = None,
+):
+    """ASGI app for the local server.
+
+    /large?size=N streams N bytes as memoryview slices of one shared buffer,
+    ``chunk_size`` bytes per message, so memory use does not grow with the
+    response size or the number of concurrent downloads. ``content`` is
+    "fill" (a repeated byte) or "random" (incompressible). /upload takes a
+    request body of any size with any method, counting and discarding it
+    as it arrives, and answers with the byte count.
+
+    With ``timing_dir``, requests carrying an x-request-id header have their
+    server-side timing appended to a file there (see LocalServer.request_timings).
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    buffer = memoryview(content_buffer(content))
+    log = _TimingLog(timing_dir) if timing_dir is not None else None
+    header = REQUEST_ID_HEADER.encode()
+
     async def app(scope, receive, send):
         if scope["type"] != "http":
             return
+        if log is not None:
+            arrival = time.perf_counter()
+            for name, value in scope["headers"]:
+                if name == header:
+                    send = _timed_send(send, log, value.decode(), arrival)
+                    break
         path = scope["path"]
         query_string = scope.get("query_string", b"").decode()
         params = parse_qs(query_string)
 
-        if path == "/":
+        # /r/... paths give every request of a fan-out its own URL
+        if path == "/" or path.startswith("/r/"):
             body = b'{"status": "ok"}'
             await send({
                 "type": "http.response.start", "status": 200,
@@ -42,12 +226,38 @@ def create_app():
             await send({"type": "http.response.body", "body": body})
         elif path == "/large":
             size = int(params.get("size", [str(10 * 1024 * 1024)])[0])
-            body = b"x" * size
             await send({
                 "type": "http.response.start", "status": 200,
                 "headers": [[b"content-type", b"application/octet-stream"],
                              [b"content-length", str(size).encode()]],
             })
+            remaining, offset = size, 0
+            while remaining > 0:
+                n = min(chunk_size, remaining, len(buffer) - offset)
+                remaining -= n
+                await send({
+                    "type": "http.response.body",
+                    "body": buffer[offset:offset + n],
+                    "more_body": remaining > 0,
+                })
+                offset = (offset + n) % len(buffer)
+            if size <= 0:
+                await send({"type": "http.response.body", "body": b""})
+        elif path == "/upload":
+            received = 0
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                received += len(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            body = json.dumps({"received": received}).encode()
+            await send({
+                "type": "http.response.start", "status": 200,
+                "headers": [[b"content-type", b"application/json"],
+                             [b"content-length", str(len(body)).encode()]],
+            })
             await send({"type": "http.response.body", "body": body})
         else:
             body = b"Not Found"
@@ -61,56 +271,247 @@ def create_app():
     return app
 
 
+@dataclass
+class ServerOptions:
+    """Tunables of the local hypercorn server; defaults are hypercorn's own."""
+    workers: int = 1
+    # "asyncio" or "uvloop" (needs the uvloop package)
+    worker_class: str = "asyncio"
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    content: str = "fill"
+    # Certificate key: "rsa" (2048 bit) or "ecdsa" (P-256)
+    key_type: str = "rsa"
+    h2_max_concurrent_streams: int = 100
+    # Largest HTTP/2 frame the server accepts (SETTINGS_MAX_FRAME_SIZE)
+    h2_max_inbound_frame_size: int = 2**14
+    keep_alive_timeout: float = 5.0
+    keep_alive_max_requests: int = 1000
+    # Also serve HTTP/3 over QUIC on the same port number (needs aioquic)
+    http3: bool = False
+    # Highest TLS version negotiated; "1.2" rules out TLS 1.3
+    tls_version: str = "1.3"
+    # Serve cleartext HTTP/1.1 and h2c (prior knowledge) instead of TLS
+    plaintext: bool = False
+
+    def __post_init__(self):
+        if self.workers < 1:
+            raise ValueError("workers must be at least 1")
+        if self.worker_class not in ("asyncio", "uvloop"):
+            raise ValueError(f"unknown worker class {self.worker_class!r}")
+        if self.content not in CONTENT_BUFFER_SIZES:
+            raise ValueError(f"unknown content {self.content!r}")
+        if self.key_type not in KEY_TYPES:
+            raise ValueError(f"unknown key type {self.key_type!r}")
+        if self.chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 2**14 <= self.h2_max_inbound_frame_size <= 2**24 - 1:
+            raise ValueError("h2_max_inbound_frame_size must be between 16384 and 16777215")
+        if self.tls_version not in TLS_VERSIONS:
+            raise ValueError(f"unknown TLS version {self.tls_version!r}")
+        if self.plaintext and self.http3:
+            raise ValueError("HTTP/3 cannot be served in plaintext")
+
+    def hypercorn_toml(self) -> str:
+        """The hypercorn settings as a TOML config file."""
+        lines = [
+            # hypercorn's workers = 0 serves from the main process, which saves
+            # spawning (and importing everything again in) a single worker
+            f"workers = {self.workers if self.workers > 1 else 0}",
+            f'worker_class = "{self.worker_class}"',
+            f"h2_max_concurrent_streams = {self.h2_max_concurrent_streams}",
+            f"h2_max_inbound_frame_size = {self.h2_max_inbound_frame_size}",
+            f"keep_alive_timeout = {float(self.keep_alive_timeout)}",
+            f"keep_alive_max_requests = {self.keep_alive_max_requests}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def openssl_config(self) -> str | None:
+        """OpenSSL config capping the TLS version, if the default needs changing.
+
+        hypercorn has no setting for the highest TLS version, but every
+        OpenSSL context it creates starts from the system_default section.
+        """
+        if self.plaintext or self.tls_version == TLS_VERSIONS[-1]:
+            return None
+        return "\n".join([
+            "openssl_conf = curl_perf_init",
+            "[curl_perf_init]",
+            "ssl_conf = curl_perf_ssl",
+            "[curl_perf_ssl]",
+            "system_default = curl_perf_tls",
+            "[curl_perf_tls]",
+            f"MaxProtocol = TLSv{self.tls_version}",
+        ]) + "\n"
+
+
+def process_cpu_times(pid: int) -> dict[int, float]:
+    """CPU seconds (user + system) of ``pid`` and its descendants, by pid.
+
+    Read from /proc, so this is empty on systems without it.
+    """
+    ticks = os.sysconf("SC_CLK_TCK")
+    stats = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return {}
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue  # exited meanwhile
+        # The command name may contain spaces; fields resume after its ")"
+        fields = stat[stat.rindex(")") + 2:].split()
+        stats[int(entry)] = (int(fields[1]), (int(fields[11]) + int(fields[12])) / ticks)
+    times = {}
+    parents = {pid}
+    while parents:
+        times.update((p, stats[p][1]) for p in parents if p in stats)
+        parents = {p for p, (ppid, _) in stats.items() if ppid in parents and p not in times}
+    return times
+
+
 class LocalServer:
-    def __init__(self, host: str = "127.0.0.1", port: int = 8443):
+    """hypercorn serving create_app() in a child process.
+
+    With ``port=0`` (the default) the listening socket is bound to a free
+    port here and handed to hypercorn, so several servers can run side by side
+    and the port is known before the child starts. Certificates come from
+    cached_cert(); ``cert_dir`` overrides the cache location. Also usable as a
+    context manager.
+    """
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 0,
+        options: ServerOptions | None = None, cert_dir: Path | str | None = None,
+    ):
         self.host = host
         self.port = port
+        self.options = options or ServerOptions()
+        self.cert_dir = cert_dir
         self._process = None
         self._tmpdir = None
+        self._timing_offsets: dict[str, int] = {}
 
     @property
     def url(self) -> str:
-        return f"https://{self.host}:{self.port}"
+        scheme = "http" if self.options.plaintext else "https"
+        return f"{scheme}://{self.host}:{self.port}"
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def cpu_times(self) -> dict[int, float]:
+        """CPU seconds used so far by each server process (master and workers)."""
+        if self._process is None:
+            return {}
+        return process_cpu_times(self._process.pid)
 
-    def start(self) -> str:
+    def request_timings(self) -> dict[str, ServerTiming]:
+        """Timings of the tagged requests finished since the last call, by request ID."""
+        timings = {}
+        directory = self._timing_dir
+        if directory is None:
+            return timings
+        for name in os.listdir(directory):
+            offset = self._timing_offsets.get(name, 0)
+            with open(os.path.join(directory, name), "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            # A line still being written is picked up by the next call
+            complete = data[:data.rfind(b"\n") + 1]
+            self._timing_offsets[name] = offset + len(complete)
+            for line in complete.splitlines():
+                request_id, server_ms, server_total_ms = json.loads(line)
+                timings[request_id] = ServerTiming(server_ms, server_total_ms)
+        return timings
+
+    @property
+    def _timing_dir(self) -> str | None:
+        return os.path.join(self._tmpdir, "timings") if self._tmpdir else None
+
+    def start(self, timeout: float = 15.0) -> str:
+        tls_args = []
+        if not self.options.plaintext:
+            cert_path, key_path = cached_cert(self.options.key_type, self.cert_dir)
+            tls_args = ["--certfile", cert_path, "--keyfile", key_path]
         self._tmpdir = tempfile.mkdtemp()
-        cert_path, key_path = generate_self_signed_cert(self._tmpdir)
-        # Project root is 3 levels up from src/curl_perf/server.py
-        project_root = os.path.dirname(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        )
-        self._process = subprocess.Popen(
-            [
-                "python", "-m", "hypercorn",
-                "curl_perf.server:create_app()",
-                "--bind", f"{self.host}:{self.port}",
-                "--certfile", cert_path,
-                "--keyfile", key_path,
-            ],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            cwd=project_root,
-        )
-        import time
-        for _ in range(30):
-            try:
-                result = subprocess.run(
-                    ["curl", "-sk", f"{self.url}/"],
-                    capture_output=True, timeout=2,
+        self._timing_offsets = {}
+        os.mkdir(self._timing_dir)
+        config_path = os.path.join(self._tmpdir, "hypercorn.toml")
+        with open(config_path, "w") as f:
+            f.write(self.options.hypercorn_toml())
+        env = None
+        openssl_config = self.options.openssl_config()
+        if openssl_config is not None:
+            openssl_path = os.path.join(self._tmpdir, "openssl.cnf")
+            with open(openssl_path, "w") as f:
+                f.write(openssl_config)
+            env = {**os.environ, "OPENSSL_CONF": openssl_path}
+        listener = socket.create_server((self.host, self.port), backlog=1024)
+        self.port = listener.getsockname()[1]
+        sockets = [listener]
+        binds = ["--bind", f"fd://{listener.fileno()}"]
+        if self.options.http3:
+            # HTTP/3 clients reach the same https://host:port/ over UDP
+            quic = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sockets.append(quic)
+            quic.bind((self.host, self.port))
+            binds += ["--quic-bind", f"fd://{quic.fileno()}"]
+        chunk_size, content = self.options.chunk_size, self.options.content
+        log_path = os.path.join(self._tmpdir, "server.log")
+        try:
+            with open(log_path, "wb") as log:
+                self._process = subprocess.Popen(
+                    [
+                        sys.executable, "-m", "hypercorn",
+                        f"curl_perf.server:create_app({chunk_size}, {content!r}, "
+                        f"{self._timing_dir!r})",
+                        "--config", config_path,
+                        *binds,
+                        *tls_args,
+                    ],
+                    stdout=subprocess.DEVNULL,
+                    stderr=log,
+                    env=env,
+                    pass_fds=[sock.fileno() for sock in sockets],
+                    # hypercorn imports the app relative to its working directory
+                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
                 )
-                if result.returncode == 0:
-                    return self.url
-            except (subprocess.SubprocessError, FileNotFoundError):
-                pass
-            time.sleep(0.5)
-        raise RuntimeError("Server failed to start")
+        finally:
+            for sock in sockets:
+                sock.close()
+        try:
+            wait_for_server(
+                self.host, self.port, timeout, self._process, tls=not self.options.plaintext,
+            )
+        except RuntimeError as e:
+            with open(log_path, errors="replace") as f:
+                output = f.read().strip().splitlines()[-5:]
+            self.stop()
+            raise RuntimeError(f"Server failed to start: {e}\n" + "\n".join(output)) from None
+        return self.url
 
     def stop(self):
         if self._process:
             self._process.terminate()
-            self._process.wait(timeout=5)
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
             self._process = None
         if self._tmpdir:
-            import shutil
             shutil.rmtree(self._tmpdir, ignore_errors=True)
             self._tmpdir = None
+
+    def __enter__(self) -> "LocalServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
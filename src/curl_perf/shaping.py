@@ -0,0 +1,408 @@
+"""TCP proxy that shapes traffic like a WAN link, without root or tc.
+
+ShapingProxy runs this module in a child process (so it never competes
+with in-process clients for the GIL) on a listening socket bound by the
+parent. Every accepted connection is relayed to the target with the
+NetworkProfile applied in each direction:
+
+- one-way delay plus uniform jitter, pipelined so throughput is not
+  limited to one chunk per delay;
+- a bandwidth cap, by serializing chunks onto a virtual link that all
+  connections share, so the proxy emulates one link rather than a link
+  per connection;
+- packet loss, as a Gilbert-style burst model: a chunk that loses any
+  packets holds up the byte stream for one retransmission timeout, which
+  is what TCP's in-order delivery makes of a timeout (fast retransmit and
+  congestion window reductions are not modelled).
+
+The stream stays in order, so jitter never reorders bytes. The TCP
+handshake with the proxy itself happens on loopback; its round trip is
+charged to the client's first chunk instead, so totals and TTFB include
+it but tools report a near-zero connect time. With a profile that shapes
+nothing, chunks are relayed as they arrive.
+"""
+
+import argparse
+import asyncio
+import collections
+import dataclasses
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+from dataclasses import dataclass
+
+# Bytes held per direction before reading pauses (TCP backpressure)
+QUEUE_BYTES = 16 * 1024 * 1024
+# Payload bytes per packet, for the per-packet loss probability
+MSS = 1460
+# Linux's minimum retransmission timeout
+MIN_RTO_MS = 200.0
+
+
+@dataclass
+class NetworkProfile:
+    """Link characteristics applied in each direction."""
+    delay_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # Bytes per second; None is unlimited
+    bandwidth: float | None = None
+    # Probability that a packet is lost
+    loss: float = 0.0
+    # Mean number of consecutive packets lost per loss event
+    loss_burst: float = 1.0
+
+    def __post_init__(self):
+        if self.delay_ms < 0 or self.jitter_ms < 0:
+            raise ValueError("delay and jitter must not be negative")
+        if self.bandwidth is not None and self.bandwidth <= 0:
+            raise ValueError("bandwidth must be positive")
+        if not 0 <= self.loss < 1:
+            raise ValueError("loss must be in [0, 1)")
+        if self.loss_burst < 1:
+            raise ValueError("loss_burst must be at least 1")
+
+    @property
+    def shapes(self) -> bool:
+        return bool(
+            self.delay_ms or self.jitter_ms or self.bandwidth is not None or self.loss
+        )
+
+    def describe(self) -> str:
+        parts = [f"{self.delay_ms:g}ms delay"]
+        if self.jitter_ms:
+            parts[0] += f" +/- {self.jitter_ms:g}ms"
+        if self.bandwidth is not None:
+            parts.append(f"{self.bandwidth * 8 / 1e6:g} Mbit/s")
+        if self.loss:
+            burst = f" in bursts of {self.loss_burst:g}" if self.loss_burst > 1 else ""
+            parts.append(f"{self.loss:.2%} loss{burst}")
+        return ", ".join(parts) + " each way"
+
+    @property
+    def rto_ms(self) -> float:
+        """Stall charged to a chunk that lost packets."""
+        return max(MIN_RTO_MS, 4 * self.delay_ms + 4 * self.jitter_ms)
+
+
+_RATE_UNITS = {
+    "bit": 1 / 8, "kbit": 1e3 / 8, "mbit": 1e6 / 8, "gbit": 1e9 / 8,
+    "b": 1, "kb": 1e3, "mb": 1e6, "gb": 1e9,
+}
+
+
+def parse_rate(value: str) -> float:
+    """Bandwidth in bytes per second from e.g. "10mbit", "500kbit" or "2MB"."""
+    text = value.strip().lower().removesuffix("/s")
+    if text.endswith("bps"):
+        text = text[:-3] + "bit"  # Mbps is megabits
+    number = text.rstrip("abcdefghijklmnopqrstuvwxyz")
+    unit = text[len(number):] or "b"
+    if unit not in _RATE_UNITS:
+        raise ValueError(f"unknown rate unit {unit!r} (use bit, kbit, mbit, gbit, B, kB, MB, GB)")
+    return float(number) * _RATE_UNITS[unit]
+
+
+class _Loss:
+    """Two-state (good/burst) packet loss process."""
+
+    def __init__(self, profile: NetworkProfile, rng: random.Random):
+        # Entering a burst of mean length L at rate p/L keeps the overall
+        # loss rate at p
+        self.enter = profile.loss / profile.loss_burst
+        self.stay = 1 - 1 / profile.loss_burst
+        self.in_burst = False
+        self.rng = rng
+
+    def lost_packets(self, packets: int) -> int:
+        if not self.enter:
+            return 0
+        lost = 0
+        for _ in range(packets):
+            if self.in_burst:
+                self.in_burst = self.rng.random() < self.stay
+            else:
+                self.in_burst = self.rng.random() < self.enter
+            lost += self.in_burst
+        return lost
+
+
+class _Bottleneck:
+    """The bandwidth cap of one direction, shared by every connection.
+
+    Chunks are serialized in arrival order whichever connection they
+    belong to, like packets through one router queue.
+    """
+
+    def __init__(self, bandwidth: float):
+        self.bandwidth = bandwidth
+        self._free = 0.0
+
+    def sent_time(self, arrival: float, size: int) -> float:
+        """When the last byte of a chunk arriving at ``arrival`` is on the link."""
+        self._free = max(self._free, arrival) + size / self.bandwidth
+        return self._free
+
+
+class _Link:
+    """One direction of a shaped connection: when each chunk is delivered.
+
+    ``bottleneck`` is the direction's shared bandwidth cap; without one
+    the link gets a cap of its own.
+    """
+
+    def __init__(
+        self, profile: NetworkProfile, rng: random.Random, handshake: bool = False,
+        bottleneck: _Bottleneck | None = None,
+    ):
+        self.profile = profile
+        self.rng = rng
+        self.loss = _Loss(profile, rng)
+        if bottleneck is None and profile.bandwidth is not None:
+            bottleneck = _Bottleneck(profile.bandwidth)
+        self.bottleneck = bottleneck
+        self._last_delivery = 0.0
+        # The TCP handshake with the proxy completes on loopback, so the
+        # round trip it costs on a real link is added to the first chunk
+        self._handshake_ms = 2 * profile.delay_ms if handshake else 0.0
+
+    def delivery_time(self, arrival: float, size: int) -> float:
+        p = self.profile
+        sent = arrival
+        if self.bottleneck is not None:
+            sent = self.bottleneck.sent_time(arrival, size)
+        delay = p.delay_ms + self._handshake_ms
+        self._handshake_ms = 0.0
+        if p.jitter_ms:
+            delay = max(0.0, delay + self.rng.uniform(-p.jitter_ms, p.jitter_ms))
+        if self.loss.lost_packets(math.ceil(size / MSS)):
+            delay += p.rto_ms
+        # A byte stream is delivered in order whatever each chunk's delay
+        self._last_delivery = max(self._last_delivery, sent + delay / 1000)
+        return self._last_delivery
+
+
+class _Pipe(asyncio.Protocol):
+    """Receives one side of a connection and forwards it to ``peer``'s transport.
+
+    Flow control runs both ways: reading pauses while the peer's write
+    buffer or the shaping queue is full.
+    """
+
+    def __init__(
+        self, profile: NetworkProfile, rng: random.Random, peer: "_Pipe | None" = None,
+        bottleneck: _Bottleneck | None = None,
+    ):
+        self.profile = profile
+        # Accepted clients (no peer yet) send the first bytes of a connection
+        self.link = (
+            _Link(profile, rng, handshake=peer is None, bottleneck=bottleneck)
+            if profile.shapes else None
+        )
+        self.transport: asyncio.Transport | None = None
+        self.peer = peer
+        self._queue: collections.deque = collections.deque()
+        self._queued = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._peer_paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.peer is None:
+            # An accepted client: nothing is read before the target is connected
+            transport.pause_reading()
+        else:
+            self.peer.peer = self
+            self.peer.transport.resume_reading()
+
+    def data_received(self, data):
+        if self.link is None:
+            self.peer.transport.write(data)
+            return
+        loop = asyncio.get_running_loop()
+        self._queue.append((self.link.delivery_time(loop.time(), len(data)), data))
+        self._queued += len(data)
+        if self._queued >= QUEUE_BYTES:
+            self.transport.pause_reading()
+        if self._timer is None:
+            self._schedule(loop)
+
+    def eof_received(self):
+        if self.link is None:
+            self._write_eof()
+        else:
+            # None marks the end of the stream, delivered after its data
+            self._queue.append((0.0, None))
+            if self._timer is None:
+                self._schedule(asyncio.get_running_loop())
+        return True  # keep the transport open for the other direction
+
+    def _schedule(self, loop):
+        self._timer = loop.call_at(self._queue[0][0], self._deliver)
+
+    def _deliver(self):
+        self._timer = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        while self._queue and self._queue[0][0] <= now:
+            _, data = self._queue.popleft()
+            if data is None:
+                self._write_eof()
+                return
+            self._queued -= len(data)
+            self.peer.transport.write(data)
+        if self._queue:
+            self._schedule(loop)
+        if self._queued < QUEUE_BYTES and not self._peer_paused:
+            self.transport.resume_reading()
+
+    def _write_eof(self):
+        transport = self.peer.transport
+        if transport.is_closing():
+            return
+        try:
+            if transport.can_write_eof():
+                transport.write_eof()
+                return
+        except OSError:
+            pass  # the other end is gone already
+        transport.close()
+
+    # The peer's transport calls these about its write buffer
+    def pause_writing(self):
+        self.peer._peer_paused = True
+        self.peer.transport.pause_reading()
+
+    def resume_writing(self):
+        self.peer._peer_paused = False
+        if self.peer._queued < QUEUE_BYTES:
+            self.peer.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.peer is not None and self.peer.transport is not None:
+            self.peer.transport.close()
+
+
+async def serve(
+    listener: socket.socket, target: tuple[str, int], profile: NetworkProfile,
+    seed: int | None = None, ready=None,
+) -> None:
+    """Relay connections accepted on ``listener`` to ``target`` until cancelled.
+
+    ``ready`` is called once connections are being accepted.
+    """
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    # One link for the whole proxy: connections share each direction's cap
+    upstream = downstream = None
+    if profile.bandwidth is not None:
+        upstream = _Bottleneck(profile.bandwidth)
+        downstream = _Bottleneck(profile.bandwidth)
+
+    def accept() -> _Pipe:
+        client = _Pipe(profile, rng, bottleneck=upstream)
+        loop.create_task(connect(client))
+        return client
+
+    async def connect(client: _Pipe) -> None:
+        try:
+            await loop.create_connection(lambda: _Pipe(profile, rng, client, downstream), *target)
+        except OSError:
+            client.transport.close()
+
+    server = await loop.create_server(accept, sock=listener)
+    async with server:
+        if ready is not None:
+            ready()
+        await server.serve_forever()
+
+
+class ShapingProxy:
+    """The shaping proxy as a child process in front of ``target_host:target_port``."""
+
+    def __init__(
+        self, target_host: str, target_port: int, profile: NetworkProfile,
+        host: str = "127.0.0.1", port: int = 0, seed: int | None = None,
+    ):
+        self.target_host = target_host
+        self.target_port = target_port
+        self.profile = profile
+        self.host = host
+        self.port = port
+        self.seed = seed
+        self._process = None
+
+    def start(self) -> tuple[str, int]:
+        """Start relaying; returns the address clients should connect to."""
+        listener = socket.create_server((self.host, self.port), backlog=1024)
+        self.port = listener.getsockname()[1]
+        try:
+            self._process = subprocess.Popen(
+                [
+                    sys.executable, "-m", "curl_perf.shaping",
+                    "--fd", str(listener.fileno()),
+                    "--target", f"{self.target_host}:{self.target_port}",
+                    "--profile", json.dumps(dataclasses.asdict(self.profile)),
+                    *(["--seed", str(self.seed)] if self.seed is not None else []),
+                ],
+                pass_fds=(listener.fileno(),),
+                stdout=subprocess.PIPE,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            )
+        finally:
+            listener.close()  # the child owns the socket now
+        # The child prints a line once it accepts connections
+        if not self._process.stdout.readline():
+            self.stop()
+            raise RuntimeError("shaping proxy failed to start")
+        return self.host, self.port
+
+    def stop(self) -> None:
+        if self._process:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+
+    def __enter__(self) -> "ShapingProxy":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m curl_perf.shaping")
+    parser.add_argument("--fd", type=int, required=True, help="Listening socket to serve")
+    parser.add_argument("--target", required=True, help="HOST:PORT to relay to")
+    parser.add_argument("--profile", required=True, help="NetworkProfile as JSON")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    host, port = args.target.rsplit(":", 1)
+    listener = socket.socket(fileno=args.fd)
+    profile = NetworkProfile(**json.loads(args.profile))
+    try:
+        asyncio.run(serve(
+            listener, (host, int(port)), profile, args.seed,
+            ready=lambda: print("ready", flush=True),
+        ))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
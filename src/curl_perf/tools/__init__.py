@@ -3,12 +3,15 @@
 from curl_perf.tools.base import ToolAdapter
 from curl_perf.tools.curl import CurlAdapter
 from curl_perf.tools.httpie import HTTPieAdapter
+from curl_perf.tools.httpx_async import HttpxAdapter
+from curl_perf.tools.libcurl import LibcurlAdapter, LibcurlWarmAdapter
 from curl_perf.tools.py_requests import PyRequestsAdapter
 from curl_perf.tools.wget import WgetAdapter
 from curl_perf.tools.xh import XhAdapter
 
 ALL_ADAPTERS: list[type[ToolAdapter]] = [
-    CurlAdapter, HTTPieAdapter, PyRequestsAdapter, WgetAdapter, XhAdapter,
+    CurlAdapter, LibcurlAdapter, LibcurlWarmAdapter, HTTPieAdapter,
+    PyRequestsAdapter, HttpxAdapter, WgetAdapter, XhAdapter,
 ]
 
 
@@ -1,11 +1,48 @@
-"""Abstract base class for tool adapters."""
+"""Abstract base class for tool adapters and their optional capabilities."""
 
 from abc import ABC, abstractmethod
+import concurrent.futures
+import json
+import os
+import subprocess
+
 from curl_perf.results import TimingResult
 
 
+def command_version(cmd: list[str]) -> str | None:
+    """Return the first line a --version style command prints, or None."""
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    lines = (proc.stdout or proc.stderr).strip().splitlines()
+    return lines[0] if lines else None
+
+
+def new_request_id() -> str:
+    return os.urandom(8).hex()
+
+
+def upload_received(tool: str, response: str | bytes, sent: int) -> int:
+    """Body bytes the upload sink's {"received": N} response reports.
+
+    For tools that cannot report what they sent themselves. A response
+    without the count, or a count other than sent, raises RuntimeError.
+    """
+    try:
+        received = json.loads(response)["received"]
+    except (ValueError, TypeError, KeyError):
+        raise RuntimeError(f"{tool} upload: no received count in response {response[:200]!r}")
+    if received != sent:
+        raise RuntimeError(f"{tool} upload: server received {received} of {sent} bytes")
+    return received
+
+
 class ToolAdapter(ABC):
     name: str
+    # Set by the runner when it can match requests with server-side timings;
+    # adapters that can send a header per request then tag each one
+    request_ids = False
 
     @abstractmethod
     def is_available(self) -> bool:
@@ -15,6 +52,18 @@ class ToolAdapter(ABC):
     def supports_http2(self) -> bool:
         """Check if the tool supports HTTP/2."""
 
+    def supports_http3(self) -> bool:
+        """Check if the tool can make HTTP/3 (QUIC) requests."""
+        return False
+
+    def version(self) -> str | None:
+        """Return the tool's version string for result metadata, if known."""
+        return None
+
+    def _new_request_ids(self, count: int) -> list[str | None]:
+        """IDs for count requests, or None for each when requests are not tagged."""
+        return [new_request_id() if self.request_ids else None for _ in range(count)]
+
     @abstractmethod
     def run(self, url: str, http_version: str = "2") -> TimingResult:
         """Run a single request and return timing data."""
@@ -22,3 +71,93 @@ class ToolAdapter(ABC):
     @abstractmethod
     def run_concurrent(self, urls: list[str], http_version: str = "2") -> TimingResult:
         """Run concurrent requests and return aggregate timing data."""
+
+    def startup_command(self, url: str) -> list[str] | None:
+        """Return a command that starts the tool but fails fast on a closed port.
+
+        Only tools whose total_ms is wall clock around a process (and so
+        includes its startup cost) return a command; None means total_ms
+        already excludes process startup.
+        """
+        return None
+
+
+# Optional capabilities. An adapter opts into one by also deriving from its
+# class; the runner checks with isinstance and skips scenarios, or falls
+# back to one request at a time, for tools without it.
+
+class ParallelTool(ABC):
+    """Runs a parallel batch and reports one timing per request.
+
+    A batch opens at most max_connections connections at a time, like
+    curl's --parallel-max; requests beyond it wait for a free connection.
+    """
+    max_connections = 50
+
+    @abstractmethod
+    def run_parallel(self, urls: list[str], http_version: str = "2") -> list[TimingResult]:
+        """Run requests as one parallel batch and return per-request timing data."""
+
+
+class ThreadedParallelTool(ParallelTool):
+    """Runs a parallel batch as one run() per URL on a bounded thread pool.
+
+    For tools with no parallel mode of their own; each request's timing is
+    its worker thread's wall clock. The pool is created on first use and
+    reused by later batches, so a fan-out of thousands of URLs neither
+    starts a thread per URL nor runs more than max_workers requests (or
+    processes) at a time. A copy with another max_workers gets a pool of
+    its own.
+    """
+    max_workers = 64
+    _pool: concurrent.futures.ThreadPoolExecutor | None = None
+    _pool_size = 0
+
+    def run_parallel(self, urls: list[str], http_version: str = "2") -> list[TimingResult]:
+        if self._pool is None or self._pool_size != self.max_workers:
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=self.name,
+            )
+            self._pool_size = self.max_workers
+        return list(self._pool.map(lambda url: self.run(url, http_version), urls))
+
+
+class BatchTool(ABC):
+    """Takes several cold iterations in one process."""
+
+    @abstractmethod
+    def run_batch(self, url: str, http_version: str = "2", count: int = 1) -> list[TimingResult]:
+        """Run count sequential cold requests and return one timing per request."""
+
+
+class KeepaliveTool(ABC):
+    """Sends requests over one reused connection."""
+
+    @abstractmethod
+    def run_keepalive(self, urls: list[str], http_version: str = "2") -> list[TimingResult]:
+        """Run requests one after another over one connection, one timing each."""
+
+
+class UploadTool(ABC):
+    """Sends a request body streamed from a file."""
+
+    @abstractmethod
+    def run_upload(self, url: str, body_path: str, http_version: str = "2") -> TimingResult:
+        """PUT the file at body_path as the request body, streamed from disk.
+
+        bytes_transferred of the result is the number of body bytes sent.
+        """
+
+
+class HandshakeTool(ABC):
+    """Controls TLS session reuse across new connections."""
+
+    @abstractmethod
+    def run_handshakes(
+        self, url: str, http_version: str = "2", count: int = 1, resume: bool = False,
+    ) -> list[TimingResult]:
+        """Run count sequential requests in one client, each on a new connection.
+
+        With resume, a connection may resume the TLS session of an earlier
+        one; without it every connection makes a full handshake.
+        """
@@ -1,94 +1,262 @@
 """curl tool adapter."""
 
+import dataclasses
 import json
 import shutil
 import subprocess
 import time
 
-from curl_perf.results import TimingResult
-from curl_perf.tools.base import ToolAdapter
+from curl_perf.results import REQUEST_ID_HEADER, TimingResult, batch_timing
+from curl_perf.tools.base import (
+    BatchTool, HandshakeTool, KeepaliveTool, ParallelTool, ToolAdapter, UploadTool,
+    command_version,
+)
 
 WRITE_OUT_FORMAT = json.dumps({
     "time_namelookup": "%{time_namelookup}",
     "time_connect": "%{time_connect}",
     "time_appconnect": "%{time_appconnect}",
+    "time_pretransfer": "%{time_pretransfer}",
     "time_starttransfer": "%{time_starttransfer}",
     "time_total": "%{time_total}",
     "size_download": "%{size_download}",
+    "size_upload": "%{size_upload}",
     "http_version": "%{http_version}",
+    # Position of the transfer in the config, as --parallel writes out in
+    # completion order
+    "urlnum": "%{urlnum}",
 }) + "\n"
 
+# Command line option (without the leading dashes) selecting each HTTP
+# version. HTTP/3 uses --http3-only, so a row labelled HTTP/3 never
+# silently falls back to TCP.
+HTTP_VERSION_OPTIONS = {"1.1": "http1.1", "2": "http2", "3": "http3-only"}
 
-class CurlAdapter(ToolAdapter):
+
+def _version_option(url: str, http_version: str) -> str:
+    if http_version == "2" and url.startswith("http://"):
+        # Cleartext HTTP/2 (h2c) straight away, rather than an Upgrade request
+        return "http2-prior-knowledge"
+    return HTTP_VERSION_OPTIONS[http_version]
+
+# The curl CLI always reuses connections between transfers of one process.
+# Giving each batched transfer its own local port range start makes curl
+# treat it as a different connection, so every transfer connects cold.
+BATCH_PORT_BASE = 20000
+BATCH_PORT_SLOTS = 10000
+BATCH_PORT_RANGE = 1000
+
+
+def _config_quote(value: str) -> str:
+    """Quote a value for a curl config file."""
+    escaped = (
+        value.replace("\\", "\\\\").replace('"', '\\"')
+        .replace("\n", "\\n").replace("\t", "\\t")
+    )
+    return f'"{escaped}"'
+
+
+class CurlAdapter(ToolAdapter, ParallelTool, BatchTool, KeepaliveTool, UploadTool, HandshakeTool):
     name = "curl"
 
     def is_available(self) -> bool:
         return shutil.which("curl") is not None
 
-    def supports_http2(self) -> bool:
+    def version(self) -> str | None:
+        return command_version(["curl", "--version"])
+
+    def _features(self) -> list[str]:
+        """The Features: line of curl --version."""
         try:
             result = subprocess.run(
                 ["curl", "--version"],
                 capture_output=True, text=True, timeout=5,
             )
-            return "HTTP2" in result.stdout or "nghttp2" in result.stdout
         except (subprocess.SubprocessError, FileNotFoundError):
-            return False
+            return []
+        for line in result.stdout.splitlines():
+            if line.startswith("Features:"):
+                return line.split()[1:]
+        return []
 
-    def _build_command(self, url: str, http_version: str) -> list[str]:
+    def supports_http2(self) -> bool:
+        return "HTTP2" in self._features()
+
+    def supports_http3(self) -> bool:
+        return "HTTP3" in self._features()
+
+    def _build_command(
+        self, url: str, http_version: str, request_id: str | None = None,
+    ) -> list[str]:
         cmd = ["curl", "-s", "-o", "/dev/null", "-w", WRITE_OUT_FORMAT]
-        if http_version == "2":
-            cmd.append("--http2")
-        else:
-            cmd.append("--http1.1")
+        cmd.append(f"--{_version_option(url, http_version)}")
+        if request_id is not None:
+            cmd.extend(["-H", f"{REQUEST_ID_HEADER}: {request_id}"])
         cmd.extend(["-k", url])
         return cmd
 
-    def _parse_output(self, output: str) -> TimingResult:
-        data = json.loads(output)
+    def _parse_output(self, output: str, upload: bool = False) -> TimingResult:
+        return self._timing(json.loads(output), upload)
+
+    def _timing(self, data: dict, upload: bool = False) -> TimingResult:
         return TimingResult(
             dns_ms=float(data["time_namelookup"]) * 1000,
             connect_ms=float(data["time_connect"]) * 1000,
             tls_ms=float(data["time_appconnect"]) * 1000,
             ttfb_ms=float(data["time_starttransfer"]) * 1000,
+            pretransfer_ms=(
+                float(data["time_pretransfer"]) * 1000 if "time_pretransfer" in data else None
+            ),
             total_ms=float(data["time_total"]) * 1000,
-            bytes_transferred=int(float(data["size_download"])),
+            bytes_transferred=int(float(data["size_upload" if upload else "size_download"])),
             http_version_used=str(data["http_version"]),
         )
 
     def run(self, url: str, http_version: str = "2") -> TimingResult:
-        cmd = self._build_command(url, http_version)
+        [request_id] = self._new_request_ids(1)
+        cmd = self._build_command(url, http_version, request_id)
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
         if result.returncode != 0:
             raise RuntimeError(f"curl failed: {result.stderr}")
-        return self._parse_output(result.stdout)
-
-    def _build_concurrent_command(self, urls: list[str], http_version: str) -> list[str]:
-        cmd = ["curl", "-s", "--parallel", "-w", WRITE_OUT_FORMAT]
-        if http_version == "2":
-            cmd.append("--http2")
-        else:
-            cmd.append("--http1.1")
-        cmd.append("-k")
-        # Each URL needs its own -o /dev/null to suppress response body output
-        for url in urls:
-            cmd.extend(["-o", "/dev/null", url])
+        return dataclasses.replace(self._parse_output(result.stdout), request_id=request_id)
+
+    def _build_upload_command(
+        self, url: str, body_path: str, http_version: str, request_id: str | None = None,
+    ) -> list[str]:
+        cmd = self._build_command(url, http_version, request_id)
+        cmd[-1:-1] = [
+            # -T streams the file as a PUT body; --data-binary would read it into memory
+            "-T", body_path,
+            # No waiting for a 100 Continue before sending the body
+            "-H", "Expect:",
+            # Give up on a stalled transfer rather than on a long one
+            "--speed-limit", "1", "--speed-time", "30",
+        ]
         return cmd
 
+    def run_upload(self, url: str, body_path: str, http_version: str = "2") -> TimingResult:
+        [request_id] = self._new_request_ids(1)
+        cmd = self._build_upload_command(url, body_path, http_version, request_id)
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"curl upload failed: {result.stderr}")
+        return dataclasses.replace(
+            self._parse_output(result.stdout, upload=True), request_id=request_id,
+        )
+
+    def _build_batch_config(
+        self, url: str, http_version: str, count: int, resume: bool = False,
+        request_ids: list[str | None] | None = None,
+    ) -> str:
+        blocks = []
+        for i in range(count):
+            port = BATCH_PORT_BASE + i % BATCH_PORT_SLOTS
+            request_id = request_ids[i] if request_ids else None
+            blocks.append("\n".join([
+                "silent",
+                "insecure",
+                # Transfers of one process share a TLS session cache
+                *([] if resume else ["no-sessionid"]),
+                _version_option(url, http_version),
+                *(
+                    [f"header = {_config_quote(f'{REQUEST_ID_HEADER}: {request_id}')}"]
+                    if request_id is not None else []
+                ),
+                f"write-out = {_config_quote(WRITE_OUT_FORMAT)}",
+                f"local-port = {port}-{port + BATCH_PORT_RANGE}",
+                f"output = {_config_quote('/dev/null')}",
+                f"url = {_config_quote(url)}",
+            ]))
+        return "\nnext\n".join(blocks) + "\n"
+
+    def _run_config(
+        self, config: str, request_ids: list[str | None], timeout: float | None = None,
+    ) -> list[TimingResult]:
+        """Run a -K config; one timing per transfer, in config order."""
+        result = subprocess.run(
+            ["curl", "-K", "-"], input=config, capture_output=True, text=True,
+            timeout=timeout if timeout is not None else 30 * len(request_ids),
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"curl failed: {result.stderr}")
+        outputs = [json.loads(l) for l in result.stdout.splitlines() if l.strip()]
+        outputs.sort(key=lambda d: int(d["urlnum"]))
+        return [
+            dataclasses.replace(self._timing(data), request_id=request_id)
+            for data, request_id in zip(outputs, request_ids)
+        ]
+
+    def run_batch(self, url: str, http_version: str = "2", count: int = 1) -> list[TimingResult]:
+        request_ids = self._new_request_ids(count)
+        config = self._build_batch_config(url, http_version, count, request_ids=request_ids)
+        return self._run_config(config, request_ids)
+
+    def run_handshakes(
+        self, url: str, http_version: str = "2", count: int = 1, resume: bool = False,
+    ) -> list[TimingResult]:
+        # Batched transfers already connect cold; only session reuse differs
+        request_ids = self._new_request_ids(count)
+        config = self._build_batch_config(
+            url, http_version, count, resume=resume, request_ids=request_ids,
+        )
+        return self._run_config(config, request_ids)
+
+    def run_keepalive(self, urls: list[str], http_version: str = "2") -> list[TimingResult]:
+        # Transfers of one invocation run in order and reuse the connection
+        request_ids = self._new_request_ids(len(urls))
+        config = self._build_multi_config(urls, http_version, False, request_ids)
+        return self._run_config(config, request_ids)
+
+    def _build_multi_config(
+        self, urls: list[str], http_version: str, parallel: bool,
+        request_ids: list[str | None] | None = None,
+    ) -> str:
+        """A -K config for many transfers in one process, fed through stdin.
+
+        Nothing goes on the command line, so there is no argv limit. Untagged
+        transfers share one block of url/output pairs, which costs curl far
+        less memory per transfer than a block each; a tagged transfer needs
+        a block of its own for its header.
+        """
+        lines = []
+        if parallel:
+            # parallel-max bounds transfers, which over HTTP/1.1 are connections;
+            # HTTP/2 and 3 multiplex them all onto one. curl caps it at its own
+            # maximum.
+            limit = len(urls)
+            if http_version == "1.1":
+                limit = min(limit, self.max_connections)
+            lines += ["parallel", f"parallel-max = {limit}"]
+        options = [
+            "silent",
+            "insecure",
+            _version_option(urls[0], http_version),
+            f"write-out = {_config_quote(WRITE_OUT_FORMAT)}",
+        ]
+        output = f"output = {_config_quote('/dev/null')}"
+        if not any(request_ids or []):
+            lines += options
+            for url in urls:
+                lines += [output, f"url = {_config_quote(url)}"]
+            return "\n".join(lines) + "\n"
+        blocks = [
+            "\n".join([
+                *options,
+                f"header = {_config_quote(f'{REQUEST_ID_HEADER}: {request_id}')}",
+                output,
+                f"url = {_config_quote(url)}",
+            ])
+            for url, request_id in zip(urls, request_ids)
+        ]
+        return "\n".join(lines + ["\nnext\n".join(blocks)]) + "\n"
+
+    def run_parallel(self, urls: list[str], http_version: str = "2") -> list[TimingResult]:
+        request_ids = self._new_request_ids(len(urls))
+        config = self._build_multi_config(urls, http_version, True, request_ids)
+        return self._run_config(config, request_ids, timeout=60 + len(urls) / 100)
+
     def run_concurrent(self, urls: list[str], http_version: str = "2") -> TimingResult:
-        cmd = self._build_concurrent_command(urls, http_version)
         start = time.perf_counter()
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        streams = self.run_parallel(urls, http_version)
         elapsed_ms = (time.perf_counter() - start) * 1000
-        if result.returncode != 0:
-            raise RuntimeError(f"curl concurrent failed: {result.stderr}")
-        # Each -w output is followed by a newline, so split on newlines
-        json_lines = [l for l in result.stdout.strip().splitlines() if l.strip()]
-        last = self._parse_output(json_lines[-1])
-        return TimingResult(
-            dns_ms=last.dns_ms, connect_ms=last.connect_ms,
-            tls_ms=last.tls_ms, ttfb_ms=last.ttfb_ms,
-            total_ms=elapsed_ms,
-            bytes_transferred=last.bytes_transferred * len(urls),
-            http_version_used=last.http_version_used,
-        )
+        return batch_timing(streams, elapsed_ms)
@@ -1,20 +1,25 @@
 """HTTPie tool adapter."""
 
-import concurrent.futures
+import os
 import shutil
 import subprocess
 import time
 
-from curl_perf.results import TimingResult
-from curl_perf.tools.base import ToolAdapter
+from curl_perf.results import TimingResult, batch_timing
+from curl_perf.tools.base import (
+    ThreadedParallelTool, ToolAdapter, UploadTool, command_version, upload_received,
+)
 
 
-class HTTPieAdapter(ToolAdapter):
+class HTTPieAdapter(ToolAdapter, ThreadedParallelTool, UploadTool):
     name = "httpie"
 
     def is_available(self) -> bool:
         return shutil.which("http") is not None
 
+    def version(self) -> str | None:
+        return command_version(["http", "--version"])
+
     def supports_http2(self) -> bool:
         return False
 
@@ -25,6 +30,9 @@ class HTTPieAdapter(ToolAdapter):
         cmd.append(url)
         return cmd
 
+    def startup_command(self, url: str) -> list[str] | None:
+        return self._build_command(url, "1.1")
+
     def run(self, url: str, http_version: str = "2") -> TimingResult:
         cmd = self._build_command(url, http_version)
         start = time.perf_counter()
@@ -37,20 +45,25 @@ class HTTPieAdapter(ToolAdapter):
             http_version_used="1.1",
         )
 
-    def _run_single(self, url: str, http_version: str) -> None:
+    def run_upload(self, url: str, body_path: str, http_version: str = "2") -> TimingResult:
+        # "@file" sends the file as the raw request body; --timeout is per read,
+        # so no overall limit is needed for large bodies. The response body is
+        # the sink's count of what arrived.
         cmd = self._build_command(url, http_version)
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        cmd[1] = "--print=b"
+        cmd[-1:] = ["PUT", url, f"@{body_path}"]
+        start = time.perf_counter()
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        elapsed_ms = (time.perf_counter() - start) * 1000
         if result.returncode != 0:
             raise RuntimeError(f"httpie failed (exit {result.returncode}): {result.stderr}")
+        received = upload_received(self.name, result.stdout, os.path.getsize(body_path))
+        return TimingResult(
+            total_ms=elapsed_ms, bytes_transferred=received, http_version_used="1.1",
+        )
 
     def run_concurrent(self, urls: list[str], http_version: str = "2") -> TimingResult:
         start = time.perf_counter()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(urls)) as pool:
-            futures = [pool.submit(self._run_single, url, http_version) for url in urls]
-            for f in concurrent.futures.as_completed(futures):
-                f.result()
+        streams = self.run_parallel(urls, http_version)
         elapsed_ms = (time.perf_counter() - start) * 1000
-        return TimingResult(
-            total_ms=elapsed_ms, bytes_transferred=0,
-            http_version_used="1.1",
-        )
+        return batch_timing(streams, elapsed_ms)
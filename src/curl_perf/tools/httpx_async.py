@@ -0,0 +1,130 @@
+"""httpx asyncio tool adapter (in-process HTTP/2 multiplexing)."""
+
+import asyncio
+import os
+import time
+
+from curl_perf.results import REQUEST_ID_HEADER, TimingResult, batch_timing
+from curl_perf.tools.base import KeepaliveTool, ParallelTool, ToolAdapter, UploadTool
+
+# Bytes read from disk per chunk of a streamed request body
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class HttpxAdapter(ToolAdapter, ParallelTool, KeepaliveTool, UploadTool):
+    """Async httpx client; over HTTP/2 all URLs share one connection as streams."""
+    name = "httpx"
+
+    def is_available(self) -> bool:
+        try:
+            import httpx  # noqa: F401
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def version(self) -> str | None:
+        import httpx
+
+        return f"httpx {httpx.__version__}"
+
+    def supports_http2(self) -> bool:
+        return self.is_available()
+
+    def _client(self, http_version: str, concurrency: int):
+        import httpx
+
+        http2 = http_version == "2"
+        # One connection for HTTP/2 so every request is a multiplexed stream;
+        # HTTP/1.1 needs a connection per in-flight request, up to the cap.
+        connections = 1 if http2 else min(concurrency, self.max_connections)
+        limits = httpx.Limits(
+            max_connections=connections, max_keepalive_connections=connections,
+        )
+        return httpx.AsyncClient(
+            http1=not http2, http2=http2, verify=False, timeout=30, limits=limits,
+        )
+
+    async def _fetch(self, client, url: str) -> TimingResult:
+        [request_id] = self._new_request_ids(1)
+        headers = {REQUEST_ID_HEADER: request_id} if request_id is not None else None
+        start = time.perf_counter()
+        async with client.stream("GET", url, headers=headers) as resp:
+            headers_at = time.perf_counter()
+            size = 0
+            async for chunk in resp.aiter_raw():
+                size += len(chunk)
+        end = time.perf_counter()
+        return TimingResult(
+            total_ms=(end - start) * 1000,
+            ttfb_ms=(headers_at - start) * 1000,
+            bytes_transferred=size,
+            http_version_used=resp.http_version.removeprefix("HTTP/"),
+            request_id=request_id,
+        )
+
+    async def _fetch_all(self, urls: list[str], http_version: str) -> list[TimingResult]:
+        async with self._client(http_version, len(urls)) as client:
+            return await asyncio.gather(*(self._fetch(client, url) for url in urls))
+
+    async def _fetch_sequence(self, urls: list[str], http_version: str) -> list[TimingResult]:
+        async with self._client(http_version, 1) as client:
+            return [await self._fetch(client, url) for url in urls]
+
+    def run(self, url: str, http_version: str = "2") -> TimingResult:
+        return self.run_parallel([url], http_version)[0]
+
+    def run_parallel(self, urls: list[str], http_version: str = "2") -> list[TimingResult]:
+        import httpx
+
+        try:
+            return asyncio.run(self._fetch_all(urls, http_version))
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"httpx failed: {e}") from e
+
+    def run_keepalive(self, urls: list[str], http_version: str = "2") -> list[TimingResult]:
+        import httpx
+
+        try:
+            return asyncio.run(self._fetch_sequence(urls, http_version))
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"httpx failed: {e}") from e
+
+    async def _upload(self, url: str, body_path: str, http_version: str) -> TimingResult:
+        [request_id] = self._new_request_ids(1)
+        size = os.path.getsize(body_path)
+        headers = {"content-length": str(size)}
+        if request_id is not None:
+            headers[REQUEST_ID_HEADER] = request_id
+        async with self._client(http_version, 1) as client:
+            with open(body_path, "rb") as body:
+                async def chunks():
+                    while chunk := body.read(UPLOAD_CHUNK_SIZE):
+                        yield chunk
+
+                start = time.perf_counter()
+                async with client.stream("PUT", url, headers=headers, content=chunks()) as resp:
+                    headers_at = time.perf_counter()
+                    await resp.aread()
+                end = time.perf_counter()
+        return TimingResult(
+            total_ms=(end - start) * 1000,
+            ttfb_ms=(headers_at - start) * 1000,
+            bytes_transferred=size,
+            http_version_used=resp.http_version.removeprefix("HTTP/"),
+            request_id=request_id,
+        )
+
+    def run_upload(self, url: str, body_path: str, http_version: str = "2") -> TimingResult:
+        import httpx
+
+        try:
+            return asyncio.run(self._upload(url, body_path, http_version))
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"httpx failed: {e}") from e
+
+    def run_concurrent(self, urls: list[str], http_version: str = "2") -> TimingResult:
+        start = time.perf_counter()
+        streams = self.run_parallel(urls, http_version)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return batch_timing(streams, elapsed_ms)
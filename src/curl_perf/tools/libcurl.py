@@ -0,0 +1,302 @@
+"""In-process libcurl tool adapter (pycurl, multi interface)."""
+
+import os
+import threading
+import time
+
+from curl_perf.results import REQUEST_ID_HEADER, TimingResult, batch_timing
+from curl_perf.tools.base import (
+    HandshakeTool, KeepaliveTool, ParallelTool, ToolAdapter, UploadTool,
+)
+
+# CURLINFO_HTTP_VERSION values -> labels used elsewhere in curl-perf
+_HTTP_VERSION_NAMES = {1: "1", 2: "1.1", 3: "2", 30: "3"}
+# libcurl's largest upload buffer (CURLOPT_UPLOAD_BUFFERSIZE); fewer, larger
+# read callbacks into Python
+UPLOAD_BUFFER_SIZE = 2 * 1024 * 1024
+
+
+class LibcurlAdapter(ToolAdapter, ParallelTool, KeepaliveTool, UploadTool, HandshakeTool):
+    """Drives libcurl through a CurlMulti handle inside this process.
+
+    The cold variant uses a fresh multi handle and fresh easy handles for
+    every run, so nothing (connections, DNS, TLS sessions) is reused between
+    runs; the transfers of one run_parallel batch still share a multi handle,
+    so HTTP/2 requests multiplex over one connection.
+
+    Multi, share and easy handles must not be used from two threads at
+    once, and the rate scenario calls run_parallel from a thread pool, so
+    every thread keeps handles of its own (the warm caches are per thread).
+    """
+    name = "libcurl"
+    warm = False
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _state(self) -> threading.local:
+        """This thread's multi handle, share handle and idle easy handles."""
+        state = self._local
+        if not hasattr(state, "idle_handles"):
+            state.multi = None
+            state.share = None
+            state.idle_handles = []
+        return state
+
+    def is_available(self) -> bool:
+        try:
+            import pycurl  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def version(self) -> str | None:
+        import pycurl
+
+        return pycurl.version
+
+    def supports_http2(self) -> bool:
+        try:
+            import pycurl
+        except ImportError:
+            return False
+        return bool(pycurl.version_info()[4] & pycurl.VERSION_HTTP2)
+
+    def supports_http3(self) -> bool:
+        try:
+            import pycurl
+        except ImportError:
+            return False
+        return bool(pycurl.version_info()[4] & pycurl.VERSION_HTTP3)
+
+    def _get_multi(self):
+        import pycurl
+
+        state = self._state()
+        if state.multi is None or not self.warm:
+            state.multi = pycurl.CurlMulti()
+            state.multi.setopt(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX)
+            if self.warm:
+                # Easy handles in one multi already share its connection and
+                # DNS caches; the share handle adds TLS session reuse.
+                state.share = pycurl.CurlShare()
+                state.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+                state.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+        # Set on every use: a warm multi outlives copies with other limits
+        state.multi.setopt(pycurl.M_MAX_TOTAL_CONNECTIONS, self.max_connections)
+        state.multi.setopt(pycurl.M_MAX_HOST_CONNECTIONS, self.max_connections)
+        return state.multi
+
+    def _get_handle(self, url: str, http_version: str):
+        import pycurl
+
+        state = self._state()
+        if self.warm and state.idle_handles:
+            handle = state.idle_handles.pop()
+        else:
+            handle = pycurl.Curl()
+            if self.warm:
+                handle.setopt(pycurl.SHARE, state.share)
+        self._configure(handle, url, http_version)
+        return handle
+
+    def _tag(self, handle) -> None:
+        """Give the handle's next request a new ID, if requests are tagged."""
+        import pycurl
+
+        [handle.request_id] = self._new_request_ids(1)
+        if handle.request_id is not None:
+            handle.setopt(pycurl.HTTPHEADER, [f"{REQUEST_ID_HEADER}: {handle.request_id}"])
+
+    def _configure(self, handle, url: str, http_version: str) -> None:
+        import pycurl
+
+        self._tag(handle)
+        handle.setopt(pycurl.URL, url)
+        handle.setopt(pycurl.WRITEFUNCTION, lambda data: None)
+        handle.setopt(pycurl.SSL_VERIFYPEER, 0)
+        handle.setopt(pycurl.SSL_VERIFYHOST, 0)
+        handle.setopt(pycurl.TIMEOUT, 30)
+        if http_version == "3":
+            # No fallback to TCP, like curl --http3-only
+            handle.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_3ONLY)
+            handle.setopt(pycurl.PIPEWAIT, 1)
+        elif http_version == "2" and url.startswith("http://"):
+            # Cleartext HTTP/2 (h2c) straight away, rather than an Upgrade request
+            handle.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE)
+            handle.setopt(pycurl.PIPEWAIT, 1)
+        elif http_version == "2":
+            handle.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2_0)
+            # Wait for a connection that can multiplex rather than opening more
+            handle.setopt(pycurl.PIPEWAIT, 1)
+        else:
+            handle.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_1_1)
+
+    def _release(self, handles: list) -> None:
+        if self.warm:
+            self._state().idle_handles.extend(handles)
+        else:
+            for handle in handles:
+                handle.close()
+
+    def _perform(self, multi, handles: list) -> None:
+        import pycurl
+
+        for handle in handles:
+            multi.add_handle(handle)
+        try:
+            remaining = len(handles)
+            errors = []
+            while remaining:
+                while True:
+                    ret, _ = multi.perform()
+                    if ret != pycurl.E_CALL_MULTI_PERFORM:
+                        break
+                while True:
+                    queued, ok, failed = multi.info_read()
+                    remaining -= len(ok) + len(failed)
+                    errors.extend(msg for _, _, msg in failed)
+                    if not queued:
+                        break
+                if remaining:
+                    # Honour libcurl's own timers (connect retries, etc.)
+                    wait_ms = multi.timeout()
+                    multi.select(1.0 if wait_ms < 0 else min(wait_ms, 1000) / 1000)
+        finally:
+            for handle in handles:
+                multi.remove_handle(handle)
+        if errors:
+            raise RuntimeError(f"libcurl failed: {errors[0]}")
+
+    def _timing(self, handle, upload: bool = False) -> TimingResult:
+        import pycurl
+
+        # *_TIME_T values are integer microseconds
+        return TimingResult(
+            dns_ms=handle.getinfo(pycurl.NAMELOOKUP_TIME_T) / 1000,
+            connect_ms=handle.getinfo(pycurl.CONNECT_TIME_T) / 1000,
+            tls_ms=handle.getinfo(pycurl.APPCONNECT_TIME_T) / 1000,
+            ttfb_ms=handle.getinfo(pycurl.STARTTRANSFER_TIME_T) / 1000,
+            pretransfer_ms=handle.getinfo(pycurl.PRETRANSFER_TIME_T) / 1000,
+            total_ms=handle.getinfo(pycurl.TOTAL_TIME_T) / 1000,
+            bytes_transferred=int(handle.getinfo(
+                pycurl.SIZE_UPLOAD_T if upload else pycurl.SIZE_DOWNLOAD_T
+            )),
+            http_version_used=_HTTP_VERSION_NAMES.get(
+                handle.getinfo(pycurl.INFO_HTTP_VERSION), "unknown",
+            ),
+            request_id=handle.request_id,
+        )
+
+    def run(self, url: str, http_version: str = "2") -> TimingResult:
+        return self.run_parallel([url], http_version)[0]
+
+    def run_parallel(self, urls: list[str], http_version: str = "2") -> list[TimingResult]:
+        multi = self._get_multi()
+        handles = [self._get_handle(url, http_version) for url in urls]
+        try:
+            self._perform(multi, handles)
+            return [self._timing(handle) for handle in handles]
+        finally:
+            self._release(handles)
+            if not self.warm:
+                multi.close()
+
+    def run_keepalive(self, urls: list[str], http_version: str = "2") -> list[TimingResult]:
+        import pycurl
+
+        multi = self._get_multi()
+        handle = self._get_handle(urls[0], http_version)
+        timings = []
+        try:
+            for url in urls:
+                self._tag(handle)
+                handle.setopt(pycurl.URL, url)
+                self._perform(multi, [handle])
+                timings.append(self._timing(handle))
+            return timings
+        finally:
+            self._release([handle])
+            if not self.warm:
+                multi.close()
+
+    def run_upload(self, url: str, body_path: str, http_version: str = "2") -> TimingResult:
+        import pycurl
+
+        multi = self._get_multi()
+        # A handle of its own, so no upload options linger on reused handles;
+        # the warm variant still reuses the multi handle's connections
+        handle = pycurl.Curl()
+        try:
+            if self.warm:
+                handle.setopt(pycurl.SHARE, self._state().share)
+            self._configure(handle, url, http_version)
+            headers = ["Expect:"]
+            if handle.request_id is not None:
+                headers.append(f"{REQUEST_ID_HEADER}: {handle.request_id}")
+            handle.setopt(pycurl.HTTPHEADER, headers)
+            # No overall limit for multi-GB bodies, only for a stalled transfer
+            handle.setopt(pycurl.TIMEOUT, 0)
+            handle.setopt(pycurl.LOW_SPEED_LIMIT, 1)
+            handle.setopt(pycurl.LOW_SPEED_TIME, 30)
+            with open(body_path, "rb") as body:
+                handle.setopt(pycurl.UPLOAD, 1)
+                handle.setopt(pycurl.READDATA, body)
+                handle.setopt(pycurl.INFILESIZE_LARGE, os.fstat(body.fileno()).st_size)
+                handle.setopt(pycurl.UPLOAD_BUFFERSIZE, UPLOAD_BUFFER_SIZE)
+                self._perform(multi, [handle])
+            return self._timing(handle, upload=True)
+        finally:
+            handle.close()
+            if not self.warm:
+                multi.close()
+
+    def run_handshakes(
+        self, url: str, http_version: str = "2", count: int = 1, resume: bool = False,
+    ) -> list[TimingResult]:
+        """New connections from one multi handle, with or without session reuse.
+
+        The warm variant behaves the same here: connections are never
+        reused, and resumption is governed by ``resume`` alone.
+        """
+        import pycurl
+
+        multi = pycurl.CurlMulti()
+        share = pycurl.CurlShare()
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+        timings = []
+        try:
+            for _ in range(count):
+                handle = pycurl.Curl()
+                try:
+                    self._configure(handle, url, http_version)
+                    handle.setopt(pycurl.FRESH_CONNECT, 1)
+                    handle.setopt(pycurl.FORBID_REUSE, 1)
+                    if resume:
+                        handle.setopt(pycurl.SHARE, share)
+                    else:
+                        handle.setopt(pycurl.SSL_SESSIONID_CACHE, 0)
+                    self._perform(multi, [handle])
+                    timings.append(self._timing(handle))
+                finally:
+                    handle.close()
+            return timings
+        finally:
+            multi.close()
+            share.close()
+
+    def run_concurrent(self, urls: list[str], http_version: str = "2") -> TimingResult:
+        start = time.perf_counter()
+        streams = self.run_parallel(urls, http_version)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return batch_timing(streams, elapsed_ms)
+
+
+class LibcurlWarmAdapter(LibcurlAdapter):
+    """libcurl with one long-lived multi handle and reused easy handles.
+
+    Connections, DNS results and TLS sessions are cached across iterations,
+    which is how services embedding libcurl usually run.
+    """
+    name = "libcurl-warm"
+    warm = True
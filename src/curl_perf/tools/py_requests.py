@@ -1,17 +1,19 @@
 """Python requests tool adapter."""
 
-import concurrent.futures
+import os
 import time
 import urllib3
 
-from curl_perf.results import TimingResult
-from curl_perf.tools.base import ToolAdapter
+from curl_perf.results import TimingResult, batch_timing
+from curl_perf.tools.base import (
+    KeepaliveTool, ThreadedParallelTool, ToolAdapter, UploadTool, upload_received,
+)
 
 # Suppress insecure request warnings for --verify=False
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
-class PyRequestsAdapter(ToolAdapter):
+class PyRequestsAdapter(ToolAdapter, ThreadedParallelTool, KeepaliveTool, UploadTool):
     name = "py-requests"
 
     def is_available(self) -> bool:
@@ -21,6 +23,11 @@ class PyRequestsAdapter(ToolAdapter):
         except ImportError:
             return False
 
+    def version(self) -> str | None:
+        import requests
+
+        return f"requests {requests.__version__}"
+
     def supports_http2(self) -> bool:
         return False
 
@@ -36,22 +43,50 @@ class PyRequestsAdapter(ToolAdapter):
             http_version_used="1.1",
         )
 
-    def _run_single(self, url: str) -> int:
+    def run_upload(self, url: str, body_path: str, http_version: str = "2") -> TimingResult:
         import requests
 
-        resp = requests.get(url, verify=False, timeout=30)
-        return len(resp.content)
-
-    def run_concurrent(self, urls: list[str], http_version: str = "2") -> TimingResult:
-        start = time.perf_counter()
-        total_bytes = 0
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(urls)) as pool:
-            futures = [pool.submit(self._run_single, url) for url in urls]
-            for f in concurrent.futures.as_completed(futures):
-                total_bytes += f.result()
-        elapsed_ms = (time.perf_counter() - start) * 1000
+        with open(body_path, "rb") as body:
+            # A file object is streamed with a Content-Length, not read into memory
+            start = time.perf_counter()
+            resp = requests.put(url, data=body, verify=False, timeout=30, stream=True)
+            headers_at = time.perf_counter()
+            response = resp.content
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            size = os.fstat(body.fileno()).st_size
+        try:
+            resp.raise_for_status()
+        except requests.HTTPError as e:
+            raise RuntimeError(f"{self.name} failed: {e}") from e
+        upload_received(self.name, response, size)
         return TimingResult(
             total_ms=elapsed_ms,
-            bytes_transferred=total_bytes,
+            ttfb_ms=(headers_at - start) * 1000,
+            bytes_transferred=size,
             http_version_used="1.1",
         )
+
+    def run_keepalive(self, urls: list[str], http_version: str = "2") -> list[TimingResult]:
+        import requests
+
+        timings = []
+        with requests.Session() as session:
+            for url in urls:
+                start = time.perf_counter()
+                resp = session.get(url, verify=False, timeout=30, stream=True)
+                headers_at = time.perf_counter()
+                size = len(resp.content)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                timings.append(TimingResult(
+                    total_ms=elapsed_ms,
+                    ttfb_ms=(headers_at - start) * 1000,
+                    bytes_transferred=size,
+                    http_version_used="1.1",
+                ))
+        return timings
+
+    def run_concurrent(self, urls: list[str], http_version: str = "2") -> TimingResult:
+        start = time.perf_counter()
+        streams = self.run_parallel(urls, http_version)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return batch_timing(streams, elapsed_ms)
@@ -1,14 +1,18 @@
 """wget2 tool adapter."""
 
+import os
 import shutil
 import subprocess
 import time
 
 from curl_perf.results import TimingResult
-from curl_perf.tools.base import ToolAdapter
+from curl_perf.tools.base import ToolAdapter, UploadTool, command_version, upload_received
 
 
-class WgetAdapter(ToolAdapter):
+class WgetAdapter(ToolAdapter, UploadTool):
+    # No keepalive scenario: wget2 has no per-request timing, and spreading
+    # the wall time of a K-URL run evenly over its requests would report
+    # K-1 identical samples as a distribution.
     name = "wget2"
 
     def is_available(self) -> bool:
@@ -19,6 +23,9 @@ class WgetAdapter(ToolAdapter):
             return "wget2"
         return "wget"
 
+    def version(self) -> str | None:
+        return command_version([self._wget_cmd(), "--version"])
+
     def supports_http2(self) -> bool:
         try:
             result = subprocess.run(
@@ -36,6 +43,11 @@ class WgetAdapter(ToolAdapter):
         cmd.append(url)
         return cmd
 
+    def startup_command(self, url: str) -> list[str] | None:
+        cmd = self._build_command(url, "1.1")
+        cmd.insert(-1, "--tries=1")
+        return cmd
+
     def run(self, url: str, http_version: str = "2") -> TimingResult:
         cmd = self._build_command(url, http_version)
         start = time.perf_counter()
@@ -47,13 +59,40 @@ class WgetAdapter(ToolAdapter):
             total_ms=elapsed_ms, bytes_transferred=0, http_version_used=http_version,
         )
 
-    def run_concurrent(self, urls: list[str], http_version: str = "2") -> TimingResult:
+    def run_upload(self, url: str, body_path: str, http_version: str = "2") -> TimingResult:
+        # The response body, the sink's count of what arrived, goes to stdout
+        cmd = self._build_command(url, http_version)
+        cmd[cmd.index("-O") + 1] = "-"
+        cmd[-1:-1] = ["--method=PUT", f"--body-file={body_path}"]
+        start = time.perf_counter()
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            raise RuntimeError(f"wget upload failed (exit {result.returncode}): {result.stderr}")
+        received = upload_received(self.name, result.stdout, os.path.getsize(body_path))
+        return TimingResult(
+            total_ms=elapsed_ms, bytes_transferred=received, http_version_used=http_version,
+        )
+
+    def _build_concurrent_command(self, http_version: str) -> list[str]:
+        """Command fetching the URLs written to its stdin, one per line.
+
+        URLs never go on the command line, so their number is not limited
+        by the argv size.
+        """
         cmd = [self._wget_cmd(), "-q", "-O", "/dev/null", "--no-check-certificate"]
         if http_version == "1.1":
             cmd.append("--no-http2")
-        cmd.extend(urls)
+        cmd.append("--input-file=-")
+        return cmd
+
+    def run_concurrent(self, urls: list[str], http_version: str = "2") -> TimingResult:
+        cmd = self._build_concurrent_command(http_version)
         start = time.perf_counter()
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        result = subprocess.run(
+            cmd, input="\n".join(urls) + "\n", capture_output=True, text=True,
+            timeout=60 + len(urls) / 100,
+        )
         elapsed_ms = (time.perf_counter() - start) * 1000
         if result.returncode != 0:
             raise RuntimeError(f"wget concurrent failed (exit {result.returncode}): {result.stderr}")
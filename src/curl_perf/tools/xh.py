@@ -1,32 +1,42 @@
 """xh tool adapter (Rust-based httpie alternative)."""
 
-import concurrent.futures
+import os
 import shutil
 import subprocess
 import time
 
-from curl_perf.results import TimingResult
-from curl_perf.tools.base import ToolAdapter
+from curl_perf.results import TimingResult, batch_timing
+from curl_perf.tools.base import (
+    ThreadedParallelTool, ToolAdapter, UploadTool, command_version, upload_received,
+)
 
 
-class XhAdapter(ToolAdapter):
+class XhAdapter(ToolAdapter, ThreadedParallelTool, UploadTool):
     name = "xh"
 
     def is_available(self) -> bool:
         return shutil.which("xh") is not None
 
+    def version(self) -> str | None:
+        return command_version(["xh", "--version"])
+
     def supports_http2(self) -> bool:
         return True
 
     def _build_command(self, url: str, http_version: str) -> list[str]:
         cmd = ["xh", "--print=h", "--verify=no", "--timeout=30"]
-        if http_version == "2":
+        if http_version == "2" and url.startswith("http://"):
+            cmd.append("--http-version=2-prior-knowledge")
+        elif http_version == "2":
             cmd.append("--https")
         else:
             cmd.append("--http-version=1.1")
         cmd.append(url)
         return cmd
 
+    def startup_command(self, url: str) -> list[str] | None:
+        return self._build_command(url, "1.1")
+
     def run(self, url: str, http_version: str = "2") -> TimingResult:
         cmd = self._build_command(url, http_version)
         start = time.perf_counter()
@@ -39,20 +49,27 @@ class XhAdapter(ToolAdapter):
             http_version_used=http_version,
         )
 
-    def _run_single(self, url: str, http_version: str) -> None:
+    def run_upload(self, url: str, body_path: str, http_version: str = "2") -> TimingResult:
+        # Redirected stdin becomes the raw request body; the response body is
+        # the sink's count of what arrived
         cmd = self._build_command(url, http_version)
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        cmd[1] = "--print=b"
+        cmd[-1:] = ["PUT", url]
+        with open(body_path, "rb") as body:
+            start = time.perf_counter()
+            result = subprocess.run(cmd, stdin=body, capture_output=True)
+            elapsed_ms = (time.perf_counter() - start) * 1000
         if result.returncode != 0:
-            raise RuntimeError(f"xh failed (exit {result.returncode}): {result.stderr}")
+            raise RuntimeError(
+                f"xh failed (exit {result.returncode}): {result.stderr.decode(errors='replace')}"
+            )
+        received = upload_received(self.name, result.stdout, os.path.getsize(body_path))
+        return TimingResult(
+            total_ms=elapsed_ms, bytes_transferred=received, http_version_used=http_version,
+        )
 
     def run_concurrent(self, urls: list[str], http_version: str = "2") -> TimingResult:
         start = time.perf_counter()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(urls)) as pool:
-            futures = [pool.submit(self._run_single, url, http_version) for url in urls]
-            for f in concurrent.futures.as_completed(futures):
-                f.result()
+        streams = self.run_parallel(urls, http_version)
         elapsed_ms = (time.perf_counter() - start) * 1000
-        return TimingResult(
-            total_ms=elapsed_ms, bytes_transferred=0,
-            http_version_used=http_version,
-        )
+        return batch_timing(streams, elapsed_ms)
@@ -0,0 +1,22 @@
+import importlib.util
+import os
+
+import pytest
+
+from curl_perf.server import LocalServer
+
+
+def _server_available() -> bool:
+    return (
+        importlib.util.find_spec("hypercorn") is not None
+        and os.access("/usr/bin/openssl", os.X_OK)
+    )
+
+
+@pytest.fixture(scope="session")
+def local_server(tmp_path_factory):
+    """One local server shared by every test that needs a live endpoint."""
+    if not _server_available():
+        pytest.skip("hypercorn or openssl not available")
+    with LocalServer(cert_dir=tmp_path_factory.mktemp("certs")) as server:
+        yield server
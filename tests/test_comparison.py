@@ -0,0 +1,254 @@
+import json
+import random
+
+import pytest
+
+from curl_perf.cli import main
+from curl_perf.comparison import (
+    compare_histograms, compare_rows, diff_results, rank_test, verdict_between,
+)
+from curl_perf.output import (
+    format_compare_table, format_keepalive_table, format_multiplex_table, format_table,
+    format_throughput_table,
+)
+from curl_perf.results import (
+    Histogram, KeepaliveResult, MultiplexResult, TimingResult, aggregate,
+)
+import curl_perf.results as results_module
+
+
+def _hist(values):
+    hist = Histogram()
+    hist.record_many(values)
+    return hist
+
+
+def _agg(values, precision=3):
+    return aggregate([
+        TimingResult(total_ms=v, bytes_transferred=0, http_version_used="2") for v in values
+    ], precision)
+
+
+def _normal(mean, n=200, seed=1):
+    rng = random.Random(seed)
+    return [max(0.0, rng.gauss(mean, 0.5)) for _ in range(n)]
+
+
+@pytest.fixture(params=["numpy", "pure-python"])
+def numpy_mode(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(results_module, "np", None)
+        monkeypatch.setattr("curl_perf.comparison.np", None)
+    return request.param
+
+
+def test_rank_test_identical_is_not_significant():
+    values = _normal(5.0)
+    assert rank_test(_hist(values), _hist(values)) > 0.9
+
+
+def test_rank_test_shift_is_significant():
+    assert rank_test(_hist(_normal(5.0)), _hist(_normal(6.0, seed=2))) < 1e-6
+
+
+def test_rank_test_all_tied():
+    assert rank_test(_hist([1.0] * 10), _hist([1.0] * 10)) == 1.0
+
+
+def test_compare_detects_slower_candidate(numpy_mode):
+    c = compare_histograms(_hist(_normal(5.0)), _hist(_normal(6.0, seed=2)), rounds=500)
+    assert c.verdict == "slower"
+    assert 0 < c.ci_low_ms <= c.difference_ms <= c.ci_high_ms
+    assert c.difference_ms == pytest.approx(1.0, abs=0.2)
+
+
+def test_compare_same_distribution_is_indistinguishable(numpy_mode):
+    c = compare_histograms(_hist(_normal(5.0)), _hist(_normal(5.0, seed=2)), rounds=500)
+    assert c.verdict == "indistinguishable"
+    assert c.ci_low_ms <= 0 <= c.ci_high_ms
+
+
+def test_compare_rows_pairs_and_verdicts():
+    rows = [
+        ("curl", "HTTP/1.1", _agg(_normal(3.0))),
+        ("curl", "HTTP/2", _agg(_normal(4.0, seed=2))),
+        ("xh", "HTTP/2", _agg(_normal(4.0, seed=3))),
+    ]
+    comparisons = compare_rows(rows, rounds=300)
+    assert len(comparisons) == 6
+    assert verdict_between(comparisons, "curl HTTP/2", "curl HTTP/1.1") == "slower"
+    assert verdict_between(comparisons, "curl HTTP/1.1", "curl HTTP/2") == "faster"
+    assert verdict_between(comparisons, "xh HTTP/2", "curl HTTP/2") == "indistinguishable"
+
+
+def test_format_table_shows_verdicts():
+    rows = [
+        ("curl", "HTTP/1.1", _agg(_normal(3.0))),
+        ("curl", "HTTP/2", _agg(_normal(4.0, seed=2))),
+    ]
+    output = format_table("Latency", rows, 200, comparisons=compare_rows(rows, rounds=300))
+    assert "vs best" in output
+    lines = output.splitlines()
+    assert next(line for line in lines if "HTTP/1.1" in line).endswith("best")
+    assert next(line for line in lines if "HTTP/2" in line).endswith("slower")
+    assert "curl HTTP/2 vs curl HTTP/1.1" in output
+
+
+def _as(cls, agg):
+    return cls(**{name: getattr(agg, name) for name in agg.__dataclass_fields__})
+
+
+@pytest.mark.parametrize("format_rows", [
+    lambda rows, c: format_throughput_table(rows, 200, comparisons=c),
+    lambda rows, c: format_multiplex_table(
+        [(t, p, _as(MultiplexResult, agg)) for t, p, agg in rows], 200, 10, comparisons=c,
+    ),
+    lambda rows, c: format_keepalive_table(
+        [(t, p, _as(KeepaliveResult, agg)) for t, p, agg in rows], 200, 10, comparisons=c,
+    ),
+], ids=["throughput", "multiplex", "keepalive"])
+def test_scenario_tables_show_verdicts(format_rows):
+    rows = [
+        ("curl", "HTTP/1.1", _agg(_normal(3.0))),
+        ("curl", "HTTP/2", _agg(_normal(4.0, seed=2))),
+    ]
+    output = format_rows(rows, compare_rows(rows, rounds=300))
+    assert "vs best" in output
+    lines = output.splitlines()
+    assert next(line for line in lines if "HTTP/1.1" in line).endswith("best")
+    assert next(line for line in lines if "HTTP/2" in line).endswith("slower")
+    assert "vs best" not in format_rows(rows, None)
+
+
+def _results_file(precision=3, **cells):
+    """Minimal results JSON; cells map 'tool protocol' to total_ms samples."""
+    rows = []
+    for name, values in cells.items():
+        tool, protocol = name.split()
+        agg = _agg(values, precision)
+        rows.append({
+            "tool": tool,
+            "protocol": protocol,
+            "median_total_ms": agg.median.total_ms,
+            "histograms": {k: h.to_dict() for k, h in agg.histograms.items()},
+        })
+    return {"scenarios": {"latency": rows}}
+
+
+def test_diff_results_flags_regression():
+    baseline = _results_file(**{"curl HTTP/2": _normal(5.0), "xh HTTP/2": _normal(9.0)})
+    candidate = _results_file(**{
+        "curl HTTP/2": _normal(6.0, seed=2), "xh HTTP/2": _normal(9.0, seed=3),
+    })
+    diffs, missing, added = diff_results(
+        baseline, candidate, ["total_ms"], {"*": 0.05}, rounds=300,
+    )
+    status = {d.tool: d.status for d in diffs}
+    assert status == {"curl": "regression", "xh": "unchanged"}
+    assert missing == added == []
+    assert "1 regression(s) in 2" in format_compare_table(diffs, missing, added, "median")
+
+
+def test_diff_results_threshold_and_improvement():
+    baseline = _results_file(**{"curl HTTP/2": _normal(6.0)})
+    candidate = _results_file(**{"curl HTTP/2": _normal(5.0, seed=2)})
+    diffs, _, _ = diff_results(baseline, candidate, ["total_ms"], {"*": 0.05}, rounds=300)
+    assert diffs[0].status == "improvement"
+    diffs, _, _ = diff_results(candidate, baseline, ["total_ms"], {"total_ms": 0.5}, rounds=300)
+    assert diffs[0].status == "unchanged"
+
+
+def test_diff_results_without_histograms_uses_aggregates():
+    baseline = {"scenarios": {"latency": [
+        {"tool": "curl", "protocol": "HTTP/2", "median_total_ms": 10.0},
+        {"tool": "wget2", "protocol": "HTTP/2", "median_total_ms": 10.0},
+    ]}}
+    candidate = {"scenarios": {"latency": [
+        {"tool": "curl", "protocol": "HTTP/2", "median_total_ms": 12.0},
+        {"tool": "xh", "protocol": "HTTP/2", "median_total_ms": 12.0},
+    ]}}
+    diffs, missing, added = diff_results(
+        baseline, candidate, ["total_ms", "ttfb_ms"], {"*": 0.05},
+    )
+    assert [(d.metric, d.status, d.comparison) for d in diffs] == [
+        ("total_ms", "regression", None),
+    ]
+    assert missing == ["latency wget2 HTTP/2"]
+    assert added == ["latency xh HTTP/2"]
+
+
+def test_compare_subcommand_exit_codes(tmp_path, capsys):
+    base = tmp_path / "base.json"
+    cand = tmp_path / "cand.json"
+    base.write_text(json.dumps(_results_file(**{"curl HTTP/2": _normal(5.0)})))
+    cand.write_text(json.dumps(_results_file(**{"curl HTTP/2": _normal(6.0, seed=2)})))
+    assert main(["compare", str(base), str(base), "--bootstrap-rounds", "200"]) == 0
+    assert main(["compare", str(base), str(cand), "--bootstrap-rounds", "200"]) == 1
+    assert main([
+        "compare", str(base), str(cand), "--threshold", "total_ms=50%",
+        "--bootstrap-rounds", "200",
+    ]) == 0
+    assert main(["compare", str(base), str(tmp_path / "missing.json")]) == 2
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_compare_subcommand_fails_on_missing_or_uncompared_rows(tmp_path, capsys):
+    base = tmp_path / "base.json"
+    cand = tmp_path / "cand.json"
+    base.write_text(json.dumps(_results_file(**{
+        "curl HTTP/2": _normal(5.0), "xh HTTP/2": _normal(9.0),
+    })))
+    cand.write_text(json.dumps(_results_file(**{"curl HTTP/2": _normal(5.0, seed=2)})))
+    assert main(["compare", str(base), str(cand), "--bootstrap-rounds", "200"]) == 1
+    assert "missing from" in capsys.readouterr().err
+    # Extra candidate rows are reported but do not fail the gate
+    assert main(["compare", str(cand), str(base), "--bootstrap-rounds", "200"]) == 0
+    assert "Only in candidate: latency xh HTTP/2" in capsys.readouterr().out
+    # Neither file has TLS timings, so nothing is compared
+    assert main(["compare", str(base), str(base), "--metrics", "tls_ms"]) == 1
+    assert "no rows with tls_ms" in capsys.readouterr().err
+
+
+def test_compare_subcommand_rejects_unknown_metrics(tmp_path, capsys):
+    base = tmp_path / "base.json"
+    base.write_text(json.dumps(_results_file(**{"curl HTTP/2": _normal(5.0)})))
+    with pytest.raises(SystemExit) as exc:
+        main(["compare", str(base), str(base), "--metrics", "total_ms,ttfb"])
+    assert exc.value.code == 2
+    assert "unknown metric(s) ttfb" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("threshold, message", [
+    ("5 percent", "invalid threshold: '5 percent'"),
+    ("ttfb_ms=fast", "invalid threshold: 'ttfb_ms=fast'"),
+    ("-5%", "must not be negative"),
+    ("ttfb=10%", "unknown threshold metric 'ttfb'"),
+])
+def test_compare_subcommand_rejects_bad_thresholds(tmp_path, capsys, threshold, message):
+    base = tmp_path / "base.json"
+    base.write_text(json.dumps(_results_file(**{"curl HTTP/2": _normal(5.0)})))
+    with pytest.raises(SystemExit):
+        main(["compare", str(base), str(base), f"--threshold={threshold}"])
+    err = capsys.readouterr().err
+    assert message in err
+    assert "CI target" not in err
+
+
+def test_diff_results_across_histogram_precisions_skips_the_significance_test():
+    baseline = _results_file(precision=2, **{"curl HTTP/2": _normal(5.0)})
+    candidate = _results_file(precision=3, **{"curl HTTP/2": _normal(6.0, seed=2)})
+    diffs, _, _ = diff_results(baseline, candidate, ["total_ms"], {"*": 0.05}, rounds=300)
+    [diff] = diffs
+    assert diff.comparison is None
+    assert diff.status == "regression"
+
+
+def test_compare_subcommand_rejects_zero_bootstrap_rounds(tmp_path, capsys):
+    base = tmp_path / "base.json"
+    base.write_text(json.dumps(_results_file(**{"curl HTTP/2": _normal(5.0)})))
+    with pytest.raises(SystemExit) as exc:
+        main(["compare", str(base), str(base), "--bootstrap-rounds", "0"])
+    assert exc.value.code == 2
+    assert "must be at least 1" in capsys.readouterr().err
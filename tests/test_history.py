@@ -0,0 +1,84 @@
+import pytest
+
+from curl_perf import history
+from curl_perf.cli import main
+from curl_perf.results import TimingResult, aggregate
+
+
+def _results(total_ms, scenario="multiplex", tool="curl", protocol="HTTP/2"):
+    agg = aggregate([
+        TimingResult(total_ms=total_ms + i * 0.1, bytes_transferred=100,
+                     http_version_used="2", ttfb_ms=total_ms / 2)
+        for i in range(5)
+    ])
+    return {scenario: {tool: [(protocol, agg)]}}
+
+
+def _db(tmp_path, medians_by_version):
+    conn = history.connect(str(tmp_path / "history.db"))
+    day = 1
+    for version, medians in medians_by_version:
+        for median in medians:
+            history.record_run(
+                conn, {"url": "https://example.com"}, {"hostname": "bench"},
+                _results(median), {"curl": version},
+                timestamp=f"2026-01-{day:02d}T00:00:00+00:00",
+            )
+            day += 1
+    return conn
+
+
+def test_record_and_trend(tmp_path):
+    conn = _db(tmp_path, [("curl 8.0", [10.0, 11.0]), ("curl 8.1", [9.0, 12.0])])
+    rows = history.trend(conn, "multiplex", "curl", "HTTP/2", limit=3)
+    assert [r.run_id for r in rows] == [2, 3, 4]
+    assert [r.tool_version for r in rows] == ["curl 8.0", "curl 8.1", "curl 8.1"]
+    assert rows[0].value_ms == pytest.approx(11.2)
+    assert rows[0].count == 5
+    rows = history.trend(conn, "multiplex", "curl", "HTTP/2", tool_version="curl 8.0")
+    assert [r.run_id for r in rows] == [1, 2]
+    rows = history.trend(conn, "multiplex", "curl", "HTTP/2", metric="ttfb")
+    assert rows[0].value_ms == pytest.approx(5.0)
+
+
+def test_best_and_worst(tmp_path):
+    conn = _db(tmp_path, [("curl 8.0", [10.0, 11.0]), ("curl 8.1", [9.0, 12.0])])
+    best = history.extremes(conn, "multiplex", "curl", "HTTP/2", limit=1)
+    worst = history.extremes(conn, "multiplex", "curl", "HTTP/2", best=False, limit=1)
+    assert best[0].run_id == 3
+    assert worst[0].run_id == 4
+    since = history.extremes(
+        conn, "multiplex", "curl", "HTTP/2", since="2026-01-04", limit=5,
+    )
+    assert [r.run_id for r in since] == [4]
+
+
+def test_by_version(tmp_path):
+    conn = _db(tmp_path, [("curl 8.0", [10.0, 11.0]), ("curl 8.1", [9.0, 12.0])])
+    rows = history.by_version(conn, "multiplex", "curl", "HTTP/2")
+    assert [(r.tool_version, r.count) for r in rows] == [("curl 8.0", 2), ("curl 8.1", 2)]
+    assert rows[0].value_ms == pytest.approx(10.7)
+
+
+def test_queries_use_cell_indexes(tmp_path):
+    conn = _db(tmp_path, [("curl 8.0", [10.0])])
+    for sql in (
+        "SELECT * FROM cells WHERE scenario = 'a' AND tool = 'b' AND protocol = 'c' "
+        "AND tool_version = 'd' ORDER BY timestamp DESC",
+        "SELECT * FROM cells WHERE scenario = 'a' AND tool = 'b' AND protocol = 'c' "
+        "ORDER BY timestamp DESC, id DESC",
+    ):
+        plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"))
+        assert "USING INDEX" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_history_subcommand(tmp_path, capsys):
+    _db(tmp_path, [("curl 8.0", [10.0]), ("curl 8.1", [9.0])]).close()
+    db = str(tmp_path / "history.db")
+    assert main(["history", db, "versions", "-s", "multiplex"]) == 0
+    out = capsys.readouterr().out
+    assert "curl 8.0" in out and "curl 8.1" in out
+    assert main(["history", db, "best", "-s", "latency"]) == 0
+    assert "no matching runs" in capsys.readouterr().out
+    assert main(["history", str(tmp_path / "missing.db"), "trend"]) == 1
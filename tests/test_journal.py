@@ -0,0 +1,158 @@
+import dataclasses
+
+import pytest
+
+from curl_perf.journal import (
+    Journal, incompatible_settings, load_journal, rebuild_results,
+)
+from curl_perf.results import (
+    HandshakeResult, KeepaliveResult, MultiplexResult, TimingResult, aggregate,
+)
+from curl_perf.runner import BenchmarkConfig, BenchmarkRunner
+from curl_perf.tools.base import HandshakeTool, KeepaliveTool, ParallelTool, ToolAdapter
+
+
+class StubAdapter(ToolAdapter, ParallelTool, KeepaliveTool, HandshakeTool):
+    name = "stub"
+
+    def __init__(self):
+        self.run_count = 0
+
+    def is_available(self):
+        return True
+
+    def supports_http2(self):
+        return True
+
+    def run(self, url, http_version="2"):
+        self.run_count += 1
+        return TimingResult(total_ms=10 + self.run_count % 7, bytes_transferred=100,
+                            http_version_used=http_version, ttfb_ms=5)
+
+    def run_concurrent(self, urls, http_version="2"):
+        raise NotImplementedError
+
+    def run_parallel(self, urls, http_version="2"):
+        return [self.run(url, http_version) for url in urls]
+
+    def run_keepalive(self, urls, http_version="2"):
+        return [self.run(url, http_version) for url in urls]
+
+    def run_handshakes(self, url, http_version="2", count=1, resume=False):
+        return [self.run(url, http_version) for _ in range(count)]
+
+
+def _config(**overrides):
+    settings = dict(
+        url="https://example.com", iterations=4, concurrency=3, keepalive_requests=3,
+        http_versions=["1.1", "2"], scenarios=["latency", "multiplex", "keepalive"],
+    )
+    return BenchmarkConfig(**(settings | overrides))
+
+
+def _run(path, config, resume=False):
+    adapter = StubAdapter()
+    completed = {}
+    if resume:
+        data = load_journal(path)
+        completed = rebuild_results(data)
+        journal = Journal.append(path, data.valid_bytes)
+    else:
+        journal = Journal.create(path, config, {"stub": "stub 1.0"})
+    runner = BenchmarkRunner(config, [adapter], journal=journal, completed=completed)
+    results = runner.run_all()
+    journal.close()
+    return runner.tools[0], results
+
+
+def test_journal_round_trip(tmp_path):
+    path = str(tmp_path / "run.ndjson")
+    _, results = _run(path, _config())
+    data = load_journal(path)
+    assert data.header["tools"] == {"stub": "stub 1.0"}
+    assert data.header["config"]["iterations"] == 4
+    rebuilt = rebuild_results(data)
+    assert len(rebuilt) == 6
+    for scenario, tools in results.items():
+        for protocol, agg in tools["stub"]:
+            again = rebuilt[(scenario, "stub", protocol)]
+            assert type(again) is type(agg)
+            assert again.median == agg.median
+            assert again.count == agg.count
+    multiplex = rebuilt[("multiplex", "stub", "HTTP/2")]
+    assert isinstance(multiplex, MultiplexResult)
+    assert [len(b) for b in multiplex.stream_samples] == [3] * 4
+    keepalive = rebuilt[("keepalive", "stub", "HTTP/2")]
+    assert isinstance(keepalive, KeepaliveResult)
+    assert keepalive.first.count == 4
+
+
+def test_journal_round_trip_keeps_connection_counts(tmp_path):
+    path = str(tmp_path / "run.ndjson")
+    _run(path, _config(scenarios=["tls"], http_versions=["2"]))
+    rebuilt = rebuild_results(load_journal(path))
+    full = rebuilt[("tls", "stub", "HTTP/2 full")]
+    resumed = rebuilt[("tls", "stub", "HTTP/2 resumed")]
+    assert isinstance(full, HandshakeResult)
+    assert (full.count, full.connections) == (4, 4)
+    assert (resumed.count, resumed.connections) == (4, 5)
+
+
+def test_journal_keeps_ttfb_breakdown_and_reads_older_samples(tmp_path):
+    path = tmp_path / "run.ndjson"
+    config = _config(scenarios=["latency"], http_versions=["2"], iterations=1)
+    timing = TimingResult(
+        total_ms=6.0, bytes_transferred=100, http_version_used="2",
+        ttfb_ms=5.0, pretransfer_ms=3.0, server_ms=0.5, wire_ms=1.5,
+    )
+    journal = Journal.create(str(path), config, {"stub": "stub 1.0"})
+    journal.write_samples("latency", "stub", "HTTP/2", [timing])
+    journal.close()
+    with open(path, "a") as f:
+        # A sample written before the breakdown fields existed
+        f.write('["latency","stub","HTTP/2",7.0,100,"2",null,null,null,4.0]\n')
+    journal = Journal.append(str(path), path.stat().st_size)
+    journal.end_cell("latency", "stub", "HTTP/2", aggregate([timing]))
+    journal.close()
+    new, old = load_journal(str(path)).samples
+    assert (new.pretransfer_ms, new.server_ms, new.wire_ms) == (3.0, 0.5, 1.5)
+    assert (old.ttfb_ms, old.server_ms) == (4.0, None)
+
+
+def test_journal_ignores_uncommitted_tail(tmp_path):
+    path = tmp_path / "run.ndjson"
+    _run(str(path), _config(scenarios=["latency"]))
+    committed = path.stat().st_size
+    with open(path, "a") as f:
+        f.write('["latency","stub","HTTP/3",1.0,0,"3",null,null,null,null]\n')
+        f.write('{"type":"cell","scen')
+    data = load_journal(str(path))
+    assert data.valid_bytes == committed
+    assert set(data.cells) == {("latency", "stub", "HTTP/1.1"), ("latency", "stub", "HTTP/2")}
+    assert len(data.samples) == 8
+
+
+def test_resume_skips_completed_cells(tmp_path):
+    path = tmp_path / "run.ndjson"
+    _run(str(path), _config(scenarios=["latency"]))
+    adapter, results = _run(str(path), _config(), resume=True)
+    # Only the multiplex and keepalive cells run: 2 x (4 x 3) + 2 x (4 x 3)
+    assert adapter.run_count == 48
+    assert [agg.count for _, agg in results["latency"]["stub"]] == [4, 4]
+    assert len(rebuild_results(load_journal(str(path)))) == 6
+
+
+def test_incompatible_settings():
+    header = {"config": dataclasses.asdict(_config())}
+    assert incompatible_settings(header, _config(scenarios=["rate"])) == []
+    assert incompatible_settings(header, _config(concurrency=5)) == ["concurrency"]
+    moved = dataclasses.replace(_config(local_server=True), url="https://127.0.0.1:9999")
+    header = {"config": dataclasses.asdict(_config(local_server=True))}
+    assert incompatible_settings(header, moved) == []
+
+
+def test_load_journal_rejects_non_journal(tmp_path):
+    path = tmp_path / "results.json"
+    path.write_text('{"config": {}}\n')
+    with pytest.raises(ValueError):
+        load_journal(str(path))
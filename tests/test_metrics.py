@@ -0,0 +1,67 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from curl_perf.metrics import CONTENT_TYPE, MetricsCollector, MetricsServer
+from curl_perf.results import TimingResult, aggregate
+from curl_perf.runner import CellFinished, SampleFailed, SamplesRecorded
+
+
+def _tr(total_ms, tls_ms=None):
+    return TimingResult(
+        total_ms=total_ms, ttfb_ms=total_ms / 2, tls_ms=tls_ms,
+        bytes_transferred=100, http_version_used="2",
+    )
+
+
+def _collector():
+    collector = MetricsCollector({"curl": "curl 8.5.0", "xh": None})
+    collector(SamplesRecorded("latency", "curl", "HTTP/2", [_tr(0.8, 0.3), _tr(3.0), _tr(40.0)]))
+    collector(SampleFailed("latency", "curl", "HTTP/2", "refused", failures=1))
+    collector(CellFinished("latency", "curl", "HTTP/2", aggregate([_tr(1.0)])))
+    collector(CellFinished("latency", "xh", "HTTP/2", aggregate([_tr(1.0)]), resumed=True))
+    return collector
+
+
+def test_collector_renders_cumulative_histograms_and_counters():
+    lines = _collector().render().splitlines()
+    labels = 'scenario="latency",tool="curl",protocol="HTTP/2"'
+    assert f'curl_perf_total_seconds_bucket{{{labels},le="0.001"}} 1' in lines
+    assert f'curl_perf_total_seconds_bucket{{{labels},le="0.005"}} 2' in lines
+    assert f'curl_perf_total_seconds_bucket{{{labels},le="0.05"}} 3' in lines
+    assert f'curl_perf_total_seconds_bucket{{{labels},le="+Inf"}} 3' in lines
+    assert f"curl_perf_total_seconds_count{{{labels}}} 3" in lines
+    sum_line = next(l for l in lines if l.startswith("curl_perf_total_seconds_sum"))
+    assert float(sum_line.split()[-1]) == pytest.approx(0.0438)
+    # Missing phases are not observed
+    assert f"curl_perf_tls_seconds_count{{{labels}}} 1" in lines
+    assert f"curl_perf_samples_total{{{labels}}} 3" in lines
+    assert f"curl_perf_failures_total{{{labels}}} 1" in lines
+    assert f"curl_perf_transferred_bytes_total{{{labels}}} 300" in lines
+    # Resumed cells were measured by an earlier run
+    assert "curl_perf_cells_total 1" in lines
+    assert 'curl_perf_tool_info{tool="curl",version="curl 8.5.0"} 1' in lines
+    assert 'curl_perf_tool_info{tool="xh",version=""} 1' in lines
+    assert lines[-1] == "# EOF"
+
+
+def test_collector_escapes_label_values():
+    collector = MetricsCollector({'odd"tool\\': "v1\nbuild 2"})
+    assert 'curl_perf_tool_info{tool="odd\\"tool\\\\",version="v1\\nbuild 2"} 1' in collector.render()
+
+
+def test_server_serves_metrics_endpoint():
+    server = MetricsServer(_collector())
+    url = server.start()
+    try:
+        assert server.port != 0
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            assert resp.headers["Content-Type"] == CONTENT_TYPE
+            body = resp.read().decode()
+        assert "curl_perf_cells_total 1" in body
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(url.replace("/metrics", "/other"), timeout=5)
+        assert excinfo.value.code == 404
+    finally:
+        server.stop()
@@ -0,0 +1,36 @@
+import pytest
+
+from curl_perf.monitor import ServerMonitor, server_load
+from curl_perf.results import TimingResult, aggregate
+from curl_perf.runner import CellFinished, CellStarted
+
+
+def test_server_load_peak_is_busiest_process():
+    load = server_load({1: 1.0, 2: 5.0}, {1: 1.5, 2: 6.9, 3: 0.2}, wall_s=2.0)
+    assert load.cpu_s == pytest.approx(2.6)
+    assert load.cores == pytest.approx(1.3)
+    assert load.peak == pytest.approx(0.95)
+    assert load.saturated
+
+
+class _FakeServer:
+    def __init__(self):
+        self.cpu = {10: 0.0}
+
+    def cpu_times(self):
+        return dict(self.cpu)
+
+
+def test_server_monitor_records_load_per_cell():
+    server = _FakeServer()
+    monitor = ServerMonitor(server)
+    monitor(CellStarted("latency", "curl", "HTTP/2"))
+    server.cpu = {10: 0.0, 11: 10.0}
+    monitor(CellFinished("latency", "curl", "HTTP/2", aggregate([
+        TimingResult(total_ms=1.0, bytes_transferred=0, http_version_used="2"),
+    ])))
+    load = monitor.cells[("latency", "curl", "HTTP/2")]
+    assert load.cpu_s == 10.0
+    assert load.saturated
+    assert [cell for cell, _ in monitor.saturated()] == [("latency", "curl", "HTTP/2")]
+    assert monitor.total().cpu_s == 10.0
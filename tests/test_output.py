@@ -1,8 +1,14 @@
 import json
 import io
 
-from curl_perf.output import format_table, write_json
-from curl_perf.results import TimingResult, AggregatedResult
+from curl_perf.output import (
+    format_keepalive_table, format_multiplex_table, format_rate_table, format_table,
+    format_throughput_table, format_tls_table, format_ttfb_breakdown_table, write_json,
+)
+from curl_perf.results import (
+    TimingResult, AggregatedResult, HandshakeResult, KeepaliveResult, MultiplexResult,
+    RateResult, StartupCost,
+)
 
 
 def _make_agg(total_mean=15.0, ttfb_mean=6.0) -> AggregatedResult:
@@ -42,6 +48,120 @@ def test_format_table_multiple_rows():
     assert "wget2" in output
 
 
+def test_format_table_startup_columns():
+    agg = _make_agg(total_mean=15.0)
+    agg.median_ci = (14.0, 16.0)
+    startup = {"wget2": StartupCost(median_ms=5.0, ci_low_ms=4.0, ci_high_ms=6.0, count=20)}
+    rows = [("curl", "HTTP/2", agg), ("wget2", "HTTP/2", agg)]
+    output = format_table("Test", rows, iterations=10, startup=startup, subtract_startup=True)
+    assert "Overhead" in output
+    assert "Net med" in output
+    assert "10.0+/-1.4ms" in output
+
+
+def test_format_multiplex_table():
+    batch = _make_agg(total_mean=40.0)
+    stream = _make_agg(total_mean=25.0, ttfb_mean=8.0)
+    agg = MultiplexResult(
+        mean=batch.mean, median=batch.median, p95=batch.p95, stddev=batch.stddev,
+        count=10, streams=stream, spread_median_ms=12.5, spread_p95_ms=20.0,
+    )
+    plain = _make_agg(total_mean=50.0)
+    rows = [("curl", "HTTP/2", agg), ("wget2", "HTTP/2", plain)]
+    output = format_multiplex_table(rows, iterations=10, concurrency=10)
+    assert "Concurrent Multiplexing (10 requests)" in output
+    assert "Spread med" in output
+    assert "12.5ms" in output
+    assert "25.0ms" in output
+    assert "8.0ms" in output
+
+
+def test_format_keepalive_table():
+    first = _make_agg(total_mean=15.0)
+    reused = _make_agg(total_mean=2.0)
+    agg = KeepaliveResult(
+        mean=reused.mean, median=reused.median, p95=reused.p95, stddev=reused.stddev,
+        count=90, first=first,
+    )
+    output = format_keepalive_table([("curl", "HTTP/2", agg)], iterations=10, requests=10)
+    assert "Connection Reuse (10 requests)" in output
+    assert "15.0ms" in output
+    assert "13.0ms" in output
+
+
+def test_format_throughput_table_shows_upload_rates():
+    download = _make_agg(total_mean=10.0)
+    download.median.bytes_transferred = 10_000_000
+    upload = _make_agg(total_mean=40.0)
+    upload.median.bytes_transferred = 10_000_000
+    output = format_throughput_table(
+        [("curl", "HTTP/2", download)], iterations=10,
+        uploads=[("curl", "HTTP/2", upload), ("curl", "HTTP/1.1", upload)],
+    )
+    assert "Upload rate" in output
+    lines = [l for l in output.splitlines() if l.startswith("curl")]
+    assert lines[0].split()[2:] == [
+        "10.0ms", "1000.0", "MB/s", "15.0ms", "1.0ms", "40.0ms", "250.0", "MB/s",
+    ]
+    # Uploads without a download row get a line of their own
+    assert lines[1].split()[1:4] == ["HTTP/1.1", "-", "-"]
+    assert "Upload" not in format_throughput_table([("curl", "HTTP/2", download)], 10)
+
+
+def test_format_rate_table():
+    agg = _make_agg(total_mean=15.0)
+    rate_agg = RateResult(
+        mean=agg.mean, median=agg.median, p95=agg.p95, stddev=agg.stddev,
+        count=agg.count, target_rps=500.0, achieved_rps=487.5,
+    )
+    output = format_rate_table([("curl", "HTTP/2", rate_agg)], rate=500.0, duration=60.0)
+    assert "500 req/s for 60s" in output
+    assert "487.5" in output
+    assert "15.0" in output
+
+
+def test_format_tls_table():
+    agg = _make_agg(total_mean=4.0)
+    median = TimingResult(
+        total_ms=4.0, bytes_transferred=100, http_version_used="2",
+        connect_ms=0.2, tls_ms=2.7, ttfb_ms=3.5,
+    )
+    full = HandshakeResult(
+        mean=agg.mean, median=median, p95=agg.p95, stddev=agg.stddev,
+        count=10, connections=10,
+    )
+    output = format_tls_table(
+        [("curl", "HTTP/2 full", full), ("curl", "HTTP/1.1 cleartext", agg)],
+        iterations=10, server_cpu_ms={("curl", "HTTP/2 full"): 3.25},
+    )
+    assert "TLS Handshakes" in output
+    full_line = next(l for l in output.splitlines() if "HTTP/2 full" in l)
+    assert "2.5ms" in full_line  # handshake: 2.7 - 0.2
+    assert "3.2ms" in full_line
+    cleartext_line = next(l for l in output.splitlines() if "cleartext" in l)
+    assert cleartext_line.split()[3] == "-"
+
+
+def test_format_ttfb_breakdown_table():
+    agg = _make_agg(total_mean=6.0, ttfb_mean=5.0)
+    assert format_ttfb_breakdown_table([("curl", "HTTP/2", agg)]) == ""
+    agg.median = TimingResult(
+        total_ms=6.0, bytes_transferred=100, http_version_used="2",
+        ttfb_ms=5.0, pretransfer_ms=3.0, server_ms=0.04, wire_ms=1.96,
+    )
+    multiplex = MultiplexResult(
+        mean=agg.mean, median=agg.mean, p95=agg.p95, stddev=agg.stddev, count=10,
+        streams=agg,
+    )
+    output = format_ttfb_breakdown_table(
+        [("curl", "HTTP/2", agg), ("httpx", "HTTP/2", multiplex), ("xh", "HTTP/2", _make_agg())],
+    )
+    assert "TTFB breakdown" in output
+    lines = [l for l in output.splitlines() if "HTTP/2" in l]
+    assert [l.split()[0] for l in lines] == ["curl", "httpx"]
+    assert lines[0].split()[2:] == ["5.0ms", "3.0ms", "2.0ms", "0.04ms"]
+
+
 def test_write_json():
     results = {"scenario": "latency", "data": [{"tool": "curl", "total_ms": 15.0}]}
     buf = io.StringIO()
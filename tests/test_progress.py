@@ -0,0 +1,56 @@
+import io
+
+from curl_perf.progress import LiveProgress
+from curl_perf.results import TimingResult, aggregate
+from curl_perf.runner import (
+    CellFailed, CellFinished, CellStarted, RunStarted, SampleFailed, SamplesRecorded,
+)
+
+
+def _tr(total_ms):
+    return TimingResult(total_ms=total_ms, bytes_transferred=0, http_version_used="2")
+
+
+def test_progress_prints_line_per_cell_when_not_a_terminal():
+    stream = io.StringIO()
+    progress = LiveProgress(stream, expected_samples=4)
+    progress(RunStarted(total_cells=2))
+    progress(CellStarted("latency", "curl", "HTTP/2"))
+    progress(SamplesRecorded("latency", "curl", "HTTP/2", [_tr(v) for v in (1, 2, 3, 100)]))
+    progress(CellFinished("latency", "curl", "HTTP/2", aggregate([_tr(1.0)])))
+    progress(CellStarted("latency", "xh", "HTTP/2"))
+    progress(SampleFailed("latency", "xh", "HTTP/2", "refused", failures=1))
+    progress(CellFailed("latency", "xh", "HTTP/2", "refused"))
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith("[1/2 cells, ETA")
+    assert "latency curl HTTP/2 n=4 med 2.5ms p95 85.4ms done" in lines[0]
+    assert lines[1].startswith("[2/2 cells")
+    assert lines[1].endswith("failures=1 failed")
+
+
+def test_progress_skips_resumed_cells():
+    stream = io.StringIO()
+    progress = LiveProgress(stream)
+    progress(RunStarted(total_cells=1))
+    progress(CellFinished("latency", "curl", "HTTP/2", aggregate([_tr(1.0)]), resumed=True))
+    assert stream.getvalue() == ""
+    assert progress.done_cells == 1
+
+
+class _Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_progress_redraws_status_line_on_terminal():
+    stream = _Terminal()
+    progress = LiveProgress(stream, interval=0)
+    progress(RunStarted(total_cells=1))
+    progress(CellStarted("multiplex", "curl", "HTTP/2"))
+    progress(SamplesRecorded("multiplex", "curl", "HTTP/2", [_tr(5.0)]))
+    progress.close()
+    output = stream.getvalue()
+    assert "\n" not in output
+    assert "\r[0/1 cells, ETA ?] multiplex curl HTTP/2 n=1 med 5.0ms" in output
+    assert output.endswith("\r")
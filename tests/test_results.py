@@ -1,4 +1,13 @@
-from curl_perf.results import TimingResult, aggregate
+import json
+import math
+
+import pytest
+
+from curl_perf.results import (
+    Histogram, SampleStore, ServerTiming, TimingResult, aggregate, batch_timing,
+    merge_aggregates, percentile, percentile_ci, startup_cost, subtract_startup, with_server_timing,
+)
+import curl_perf.results as results_module
 
 
 def test_timing_result_creation():
@@ -58,7 +67,31 @@ def test_aggregate_median_even():
 def test_aggregate_p95():
     results = [_tr(total_ms=float(i)) for i in range(1, 21)]
     agg = aggregate(results)
-    assert agg.p95.total_ms == 20.0
+    # Interpolated between the 19th and 20th samples
+    assert agg.p95.total_ms == pytest.approx(19.05, rel=1e-3)
+
+
+def test_percentile_interpolates_like_numpy():
+    values = [1.0, 2.0, 3.0, 10.0]
+    assert percentile(values, 50) == 2.5
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 100) == 10.0
+    assert percentile(values, 90) == pytest.approx(7.9)
+    assert percentile([4.0], 95) == 4.0
+
+
+def test_histogram_percentile_matches_exact_definition():
+    values = [float(v) for v in (3, 1, 4, 1, 5, 9, 2, 6, 5, 3)]
+    hist = Histogram()
+    for v in values:
+        hist.record(v)
+    for pct in (10, 25, 50, 75, 95, 99):
+        assert hist.percentile(pct) == pytest.approx(percentile(sorted(values), pct))
+    assert hist.median() == hist.percentile(50)
+    # The sorted bucket index is rebuilt after new samples
+    hist.record(100.0)
+    assert hist.percentile(100) == 100.0
+    assert hist.value_at_rank(9) == 9.0
 
 
 def test_aggregate_stddev():
@@ -83,3 +116,185 @@ def test_aggregate_none_fields_propagate():
     assert agg.median.ttfb_ms is None
     assert agg.median.dns_ms is None
     assert agg.median.total_ms == 15.0
+
+
+def test_percentile_ci_brackets_median():
+    values = [float(i) for i in range(1, 101)]
+    lo, hi = percentile_ci(values, 50)
+    assert lo < 50.5 < hi
+    assert hi - lo < 25
+
+
+def test_percentile_ci_narrows_with_more_samples():
+    small = [float(i % 10) for i in range(20)]
+    large = [float(i % 10) for i in range(2000)]
+    lo_s, hi_s = percentile_ci(sorted(small), 50)
+    lo_l, hi_l = percentile_ci(sorted(large), 50)
+    assert hi_l - lo_l <= hi_s - lo_s
+
+
+def test_startup_cost():
+    cost = startup_cost([5.0, 6.0, 4.0, 5.0, 5.0])
+    assert cost.median_ms == 5.0
+    assert cost.ci_low_ms <= 5.0 <= cost.ci_high_ms
+    assert cost.count == 5
+
+
+def test_subtract_startup():
+    agg = aggregate([_tr(total_ms=float(v)) for v in (20, 21, 22, 23, 24)])
+    cost = startup_cost([5.0] * 5)
+    net, err = subtract_startup(agg, cost)
+    assert net == 17.0
+    assert err == (agg.median_ci[1] - agg.median_ci[0]) / 2
+
+
+def test_with_server_timing_splits_ttfb():
+    result = TimingResult(
+        total_ms=6.0, ttfb_ms=5.0, pretransfer_ms=3.0, bytes_transferred=10,
+        http_version_used="2", request_id="abc",
+    )
+    joined = with_server_timing(result, ServerTiming(server_ms=0.5, server_total_ms=0.7))
+    assert (joined.server_ms, joined.wire_ms) == (0.5, 1.5)
+    assert joined.request_id == "abc"
+    # Without the client-side split only the server time is known
+    joined = with_server_timing(_tr(ttfb_ms=5.0), ServerTiming(0.5, 0.7))
+    assert (joined.server_ms, joined.wire_ms) == (0.5, None)
+
+
+def test_batch_timing():
+    streams = [
+        _tr(total_ms=12, bytes_transferred=100, ttfb_ms=5, connect_ms=2),
+        _tr(total_ms=20, bytes_transferred=100, ttfb_ms=9, connect_ms=2),
+    ]
+    batch = batch_timing(streams, elapsed_ms=25.0)
+    assert batch.total_ms == 25.0
+    assert batch.bytes_transferred == 200
+    assert batch.ttfb_ms == 5
+    assert batch.dns_ms is None
+
+
+def test_histogram_precision():
+    hist = Histogram(significant_figures=3)
+    for v in range(1, 100001):
+        hist.record(v / 10)
+    assert hist.count == 100000
+    assert hist.min == 0.1
+    assert hist.max == 10000.0
+    for pct in (50, 90, 99, 99.9):
+        exact = pct / 100 * 10000
+        assert abs(hist.percentile(pct) - exact) / exact < 0.001
+
+
+def test_histogram_memory_bounded():
+    hist = Histogram(significant_figures=2)
+    for i in range(50000):
+        hist.record(5.0 + (i % 1000) / 100)
+    assert len(hist.counts) < 1000
+
+
+def test_histogram_merge_matches_single():
+    values = [float(v % 97) + 0.5 for v in range(1000)]
+    whole = Histogram()
+    left, right = Histogram(), Histogram()
+    for i, v in enumerate(values):
+        whole.record(v)
+        (left if i % 2 else right).record(v)
+    left.merge(right)
+    assert left.counts == whole.counts
+    assert left.count == whole.count
+    assert abs(left.mean - whole.mean) < 1e-9
+    assert abs(left.stddev - whole.stddev) < 1e-9
+    assert left.percentile(99) == whole.percentile(99)
+
+
+def test_histogram_merge_rejects_different_precision():
+    with pytest.raises(ValueError):
+        Histogram(3).merge(Histogram(2))
+
+
+def test_histogram_round_trip():
+    hist = Histogram()
+    for v in (1.5, 2.5, 300.0):
+        hist.record(v)
+    restored = Histogram.from_dict(json.loads(json.dumps(hist.to_dict())))
+    assert restored.counts == hist.counts
+    assert restored.percentile(50) == hist.percentile(50)
+    assert restored.stddev == hist.stddev
+
+
+def test_aggregate_p99_and_histograms():
+    agg = aggregate([_tr(total_ms=float(v)) for v in range(1, 1001)])
+    assert agg.p99.total_ms == pytest.approx(990.01, rel=1e-3)
+    assert agg.p999.total_ms == pytest.approx(999.001, rel=1e-3)
+    assert agg.histograms["total_ms"].count == 1000
+    assert "ttfb_ms" not in agg.histograms
+
+
+def test_merge_aggregates():
+    a = aggregate([_tr(total_ms=float(v)) for v in range(1, 51)])
+    b = aggregate([_tr(total_ms=float(v)) for v in range(51, 101)])
+    merged = merge_aggregates([a, b])
+    assert merged.count == 100
+    assert merged.median.total_ms == pytest.approx(50.5, rel=1e-3)
+    assert merged.mean.total_ms == 50.5
+
+
+@pytest.fixture(params=["numpy", "pure-python"])
+def numpy_mode(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(results_module, "np", None)
+    return request.param
+
+
+def test_sample_store_round_trip(numpy_mode):
+    results = [_tr(total_ms=10.5, ttfb_ms=3.0, bytes_transferred=42), _tr(total_ms=12.0)]
+    store = SampleStore.from_results(results, tool="curl", protocol="HTTP/2")
+    assert len(store) == 2
+    assert list(store) == results
+    assert store.nbytes == 2 * (9 * 8 + 4 * 2)
+
+
+def test_sample_store_missing_values(numpy_mode):
+    store = SampleStore.from_results([_tr(ttfb_ms=3.0), _tr()])
+    assert math.isnan(store.column("ttfb_ms")[1])
+    assert list(store.filled("ttfb_ms")) == [3.0, 0.0]
+    assert store.filled("dns_ms") is None
+
+
+def test_sample_store_select(numpy_mode):
+    store = SampleStore()
+    store.extend([_tr(total_ms=1.0), _tr(total_ms=2.0)], tool="curl", protocol="HTTP/2")
+    store.extend([_tr(total_ms=3.0)], tool="xh", protocol="HTTP/2")
+    assert store.labels("tool") == ["curl", "xh"]
+    assert [r.total_ms for r in store.select(tool="xh")] == [3.0]
+    assert len(store.select(protocol="HTTP/2")) == 3
+    assert len(store.select(tool="wget")) == 0
+
+
+def test_sample_store_extend_store_recodes_labels():
+    a = SampleStore.from_results([_tr(total_ms=1.0)], tool="xh")
+    b = SampleStore.from_results([_tr(total_ms=2.0)], tool="curl")
+    b.extend_store(a)
+    assert [r.total_ms for r in b.select(tool="xh")] == [1.0]
+    assert b.labels("tool") == ["curl", "xh"]
+
+
+def test_aggregate_sample_store_matches_list(numpy_mode):
+    results = [_tr(total_ms=float(v), ttfb_ms=v / 2) for v in range(1, 501)]
+    from_list = aggregate(results)
+    from_store = aggregate(SampleStore.from_results(results))
+    assert from_store.median == from_list.median
+    assert from_store.p99 == from_list.p99
+    assert from_store.stddev.total_ms == pytest.approx(from_list.stddev.total_ms)
+
+
+def test_histogram_record_many_matches_record(numpy_mode):
+    values = [0.0, 0.0015, 1.2345, 99.9, 1234.5678, 65536.0]
+    one, many = Histogram(), Histogram()
+    for v in values:
+        one.record(v)
+    many.record_many(values)
+    assert many.counts == one.counts
+    assert many.percentile(50) == one.percentile(50)
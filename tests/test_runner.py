@@ -1,6 +1,16 @@
-from curl_perf.runner import BenchmarkRunner, BenchmarkConfig
-from curl_perf.results import TimingResult
-from curl_perf.tools.base import ToolAdapter
+import os
+import sys
+import time
+
+import pytest
+
+import curl_perf.runner as runner_module
+from curl_perf.runner import BenchmarkRunner, BenchmarkConfig, SamplesRecorded
+from curl_perf.results import ServerTiming, TimingResult
+from curl_perf.tools.base import (
+    BatchTool, HandshakeTool, KeepaliveTool, ParallelTool, ThreadedParallelTool, ToolAdapter,
+    UploadTool,
+)
 
 
 class StubAdapter(ToolAdapter):
@@ -75,3 +85,565 @@ def test_runner_run_all():
     all_results = runner.run_all()
     assert "latency" in all_results
     assert "stub" in all_results["latency"]
+
+
+def test_runner_rate_scenario():
+    adapter = StubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", http_versions=["2"], scenarios=["rate"],
+        rate=200.0, duration=0.05,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    results = runner.run_rate(adapter)
+    assert len(results) == 1
+    protocol, agg = results[0]
+    assert protocol == "HTTP/2"
+    assert agg.count == 10
+    assert agg.target_rps == 200.0
+    assert agg.achieved_rps > 0
+
+
+@pytest.mark.parametrize("option", ["--rate=0", "--duration=-1", "--rate=fast"])
+def test_cli_rejects_non_positive_rate_options(capsys, option):
+    from curl_perf.cli import main
+
+    with pytest.raises(SystemExit) as exc:
+        main(["--url", "https://example.com", "-s", "rate", option])
+    assert exc.value.code == 2
+    assert option.split("=")[0] in capsys.readouterr().err
+
+
+class SlowAdapter(StubAdapter):
+    """Takes 20ms per request but reports a total of 1ms."""
+
+    def run(self, url, http_version="2"):
+        time.sleep(0.02)
+        return TimingResult(total_ms=1.0, bytes_transferred=100,
+                            http_version_used=http_version)
+
+
+def test_runner_rate_measures_latency_on_the_harness_clock():
+    adapter = SlowAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", http_versions=["2"], scenarios=["rate"],
+        rate=100.0, duration=0.05,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    _, agg = runner.run_rate(adapter)[0]
+    # From the intended send time to the response, not the tool's own total
+    assert agg.median.total_ms >= 20
+
+
+class ParallelStubAdapter(StubAdapter, ParallelTool):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def run_parallel(self, urls, http_version="2"):
+        self.batches.append(len(urls))
+        return [self.run(url, http_version) for url in urls]
+
+
+def test_runner_rate_batches_parallel_adapter():
+    adapter = ParallelStubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", http_versions=["2"], scenarios=["rate"],
+        rate=500.0, duration=0.1, rate_batch_ms=20.0,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    results = runner.run_rate(adapter)
+    _, agg = results[0]
+    assert agg.count == 50
+    assert adapter.batches == [10] * 5
+
+
+class ConstantAdapter(StubAdapter):
+    def run(self, url, http_version="2"):
+        self.run_count += 1
+        return TimingResult(total_ms=10.0, bytes_transferred=100,
+                            http_version_used=http_version)
+
+
+@pytest.mark.parametrize("options, message", [
+    (["--min-iterations=0"], "must be at least 1"),
+    (["--max-iterations=0"], "must be at least 1"),
+    (["--min-iterations=20", "--max-iterations=10"], "below --min-iterations"),
+])
+def test_cli_rejects_inconsistent_iteration_bounds(capsys, options, message):
+    from curl_perf.cli import main
+
+    with pytest.raises(SystemExit) as exc:
+        main(["--url", "https://example.com", "--target-ci=5%", *options])
+    assert exc.value.code == 2
+    assert message in capsys.readouterr().err
+
+
+def test_runner_adaptive_stops_when_converged():
+    adapter = ConstantAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", http_versions=["2"], scenarios=["latency"],
+        target_ci=0.02, min_iterations=5, max_iterations=100,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    _, agg = runner.run_latency(adapter)[0]
+    assert agg.count == 5
+
+
+def test_runner_adaptive_caps_at_max_iterations():
+    adapter = StubAdapter()  # total_ms keeps growing, never converges tightly
+    config = BenchmarkConfig(
+        url="https://example.com", http_versions=["2"], scenarios=["latency"],
+        target_ci=0.001, min_iterations=5, max_iterations=30,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    _, agg = runner.run_latency(adapter)[0]
+    assert agg.count == 30
+
+
+class BatchStubAdapter(StubAdapter, BatchTool):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def run_batch(self, url, http_version="2", count=1):
+        self.batches.append(count)
+        return [self.run(url, http_version) for _ in range(count)]
+
+
+def test_runner_latency_uses_batch():
+    adapter = BatchStubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=7,
+        http_versions=["1.1", "2"], scenarios=["latency"],
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    results = runner.run_latency(adapter)
+    assert [agg.count for _, agg in results] == [7, 7]
+    assert adapter.batches == [7, 7]
+
+
+def test_runner_skips_http3_for_tools_without_it():
+    adapter = StubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=2,
+        http_versions=["1.1", "2", "3"], scenarios=["latency"],
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    assert [protocol for protocol, _ in runner.run_latency(adapter)] == ["HTTP/1.1", "HTTP/2"]
+    adapter.supports_http3 = lambda: True
+    assert [protocol for protocol, _ in runner.run_latency(adapter)][-1] == "HTTP/3"
+
+
+class TaggingStubAdapter(BatchStubAdapter):
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def run(self, url, http_version="2"):
+        [request_id] = self._new_request_ids(1)
+        self.sent.append(request_id)
+        result = super().run(url, http_version)
+        result.pretransfer_ms = 3
+        result.request_id = request_id
+        return result
+
+
+def test_runner_joins_server_timings(monkeypatch):
+    monkeypatch.setattr(runner_module, "SERVER_TIMING_WAIT_S", 0.05)
+    adapter = TaggingStubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=4, http_versions=["2"], scenarios=["latency"],
+    )
+    reported = set()
+
+    def server_timings():
+        # Each request is reported once; the last one never reaches the log
+        new = {i: ServerTiming(0.5, 0.75) for i in adapter.sent[:-1] if i not in reported}
+        reported.update(new)
+        return new
+
+    runner = BenchmarkRunner(config, [adapter], server_timings=server_timings)
+    recorded = []
+    runner.add_listener(
+        lambda e: recorded.extend(e.timings) if isinstance(e, SamplesRecorded) else None
+    )
+    [tool] = runner.tools
+    # Only the runner's copy tags its requests
+    assert tool.request_ids and not adapter.request_ids
+    [(_, agg)] = runner.run_latency(tool)
+    assert agg.count == 4
+    assert len(set(adapter.sent)) == 4
+    assert agg.median.server_ms == 0.5
+    # ttfb 5 - pretransfer 3 - server 0.5
+    assert agg.median.wire_ms == 1.5
+    # The unmatched sample keeps no server timing
+    assert [t.server_ms for t in recorded] == [0.5, 0.5, 0.5, None]
+    assert runner._server_records == {}
+
+
+def test_runner_leaves_requests_untagged_without_server_timings():
+    adapter = TaggingStubAdapter()
+    config = BenchmarkConfig(url="https://example.com", iterations=2, http_versions=["2"])
+    runner = BenchmarkRunner(config, [adapter])
+    [(_, agg)] = runner.run_latency(adapter)
+    assert adapter.sent == [None, None]
+    assert agg.median.server_ms is None
+
+
+class UploadStubAdapter(StubAdapter, UploadTool):
+    name = "uploader"
+
+    def __init__(self):
+        super().__init__()
+        self.uploads = []
+
+    def run_upload(self, url, body_path, http_version="2"):
+        size = os.path.getsize(body_path)
+        self.uploads.append((url, body_path, size))
+        return TimingResult(total_ms=100, bytes_transferred=size, http_version_used=http_version)
+
+
+def test_runner_upload_streams_sparse_body_to_upload_endpoint():
+    adapter = UploadStubAdapter()
+    config = BenchmarkConfig(
+        url="https://127.0.0.1:4433", iterations=2, local_server=True,
+        http_versions=["1.1", "2"], scenarios=["upload"], upload_size=5 * 2**30,
+    )
+    runner = BenchmarkRunner(config, [adapter, StubAdapter()])
+    results = runner.run_all()["upload"]
+    # Tools without upload support are skipped
+    assert results["stub"] == []
+    assert [protocol for protocol, _ in results["uploader"]] == ["HTTP/1.1", "HTTP/2"]
+    assert len(adapter.uploads) == 4
+    url, body_path, size = adapter.uploads[0]
+    assert url == "https://127.0.0.1:4433/upload"
+    assert size == 5 * 2**30
+    # The body file is gone once the scenario is done
+    assert not os.path.exists(body_path)
+    assert results["uploader"][0][1].median.transfer_rate_bps == size * 10
+
+
+class HandshakeStubAdapter(StubAdapter, HandshakeTool):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def run_handshakes(self, url, http_version="2", count=1, resume=False):
+        self.calls.append((count, resume))
+        return [self.run(url, http_version) for _ in range(count)]
+
+
+def test_runner_tls_scenario_measures_full_and_resumed_handshakes():
+    adapter = HandshakeStubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=5, http_versions=["1.1", "2"], scenarios=["tls"],
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    results = runner.run_all()["tls"]["stub"]
+    assert [protocol for protocol, _ in results] == [
+        "HTTP/1.1 full", "HTTP/2 full", "HTTP/1.1 resumed", "HTTP/2 resumed",
+    ]
+    # One client process per cell; a resuming one starts with a full handshake
+    assert adapter.calls == [(5, False), (5, False), (6, True), (6, True)]
+    assert [(agg.count, agg.connections) for _, agg in results] == [(5, 5), (5, 5), (5, 6), (5, 6)]
+    assert runner._cell_count({"tls": runner.run_tls}) == 4
+
+
+def test_runner_tls_scenario_is_cleartext_baseline_for_http_urls():
+    adapter = HandshakeStubAdapter()
+    config = BenchmarkConfig(
+        url="http://127.0.0.1:8080", iterations=3, http_versions=["2"], scenarios=["tls"],
+    )
+    results = BenchmarkRunner(config, [adapter]).run_all()["tls"]
+    assert [protocol for protocol, _ in results["stub"]] == ["HTTP/2 cleartext"]
+    assert adapter.calls == [(3, False)]
+
+
+def test_runner_tls_scenario_skips_tools_without_session_control():
+    config = BenchmarkConfig(url="https://example.com", iterations=2, scenarios=["tls"])
+    runner = BenchmarkRunner(config, [StubAdapter()])
+    assert runner.run_tls(runner.tools[0]) == []
+    assert runner._cell_count({"tls": runner.run_tls}) == 0
+
+
+class TaggingHandshakeAdapter(TaggingStubAdapter, HandshakeTool):
+    def run_handshakes(self, url, http_version="2", count=1, resume=False):
+        return [self.run(url, http_version) for _ in range(count)]
+
+
+def test_runner_drops_unclaimed_server_timings_after_each_cell():
+    adapter = TaggingHandshakeAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=3, http_versions=["2"], scenarios=["tls"],
+    )
+    reported = set()
+
+    def server_timings():
+        new = {i: ServerTiming(0.5, 0.75) for i in adapter.sent if i not in reported}
+        reported.update(new)
+        return new
+
+    runner = BenchmarkRunner(config, [adapter], server_timings=server_timings)
+    results = runner.run_all()["tls"]["stub"]
+    assert [(protocol, agg.count) for protocol, agg in results] == [
+        ("HTTP/2 full", 3), ("HTTP/2 resumed", 3),
+    ]
+    # The resumed cell's first connection was logged but never joined
+    assert len(reported) == 7
+    assert runner._server_records == {}
+
+
+class StartupStubAdapter(StubAdapter):
+    def startup_command(self, url):
+        return [sys.executable, "-c", "pass"]
+
+
+def test_runner_calibrate_startup():
+    adapter = StartupStubAdapter()
+    config = BenchmarkConfig(url="https://example.com", startup_samples=3)
+    runner = BenchmarkRunner(config, [adapter])
+    cost = runner.calibrate_startup(adapter)
+    assert cost.count == 3
+    assert cost.median_ms > 0
+
+
+def test_runner_calibrate_startup_skips_internal_timers():
+    adapter = StubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", http_versions=["2"], scenarios=["latency"],
+        iterations=1, calibrate_startup=True,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    runner.run_all()
+    assert runner.startup == {}
+
+
+class KeepaliveStubAdapter(StubAdapter, KeepaliveTool):
+    def run_keepalive(self, urls, http_version="2"):
+        first = TimingResult(total_ms=20, bytes_transferred=100, http_version_used=http_version)
+        rest = [TimingResult(total_ms=2, bytes_transferred=100, http_version_used=http_version)
+                for _ in urls[1:]]
+        return [first] + rest
+
+
+def test_runner_keepalive_scenario():
+    adapter = KeepaliveStubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=3, http_versions=["2"],
+        scenarios=["keepalive"], keepalive_requests=5,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    protocol, agg = runner.run_keepalive(adapter)[0]
+    assert protocol == "HTTP/2"
+    assert agg.first.count == 3
+    assert agg.first.median.total_ms == 20
+    assert agg.count == 12
+    assert agg.median.total_ms == 2
+
+
+def test_runner_keepalive_emits_every_recorded_sample():
+    adapter = KeepaliveStubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=3, http_versions=["2"],
+        scenarios=["keepalive"], keepalive_requests=5,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    events = _record_events(runner)
+    runner.run_all()
+    totals = [t.total_ms for e in events if isinstance(e, SamplesRecorded) for t in e.timings]
+    assert sorted(totals) == [2] * 12 + [20] * 3
+
+
+def test_runner_keepalive_skips_unsupported_tool():
+    adapter = StubAdapter()
+    config = BenchmarkConfig(url="https://example.com", scenarios=["keepalive"])
+    runner = BenchmarkRunner(config, [adapter])
+    assert runner.run_keepalive(adapter) == []
+
+
+def test_runner_multiplex_gives_local_server_requests_distinct_paths():
+    adapter = ParallelStubAdapter()
+    urls = []
+    adapter.run = lambda url, http_version="2": urls.append(url) or StubAdapter.run(adapter, url)
+    config = BenchmarkConfig(
+        url="https://127.0.0.1:8443/", iterations=2, local_server=True,
+        http_versions=["2"], concurrency=3, scenarios=["multiplex"],
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    runner.run_multiplex(runner.tools[0])
+    assert len(urls) == 6
+    assert len(set(urls)) == 6
+    assert urls[0] == "https://127.0.0.1:8443/r/0/0"
+
+
+class ThreadedStubAdapter(StubAdapter, ThreadedParallelTool):
+    pass
+
+
+def test_runner_configures_copies_of_the_callers_adapters():
+    adapter = ThreadedStubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=1, http_versions=["2"], concurrency=3,
+        max_workers=8, max_connections=4,
+    )
+    runner = BenchmarkRunner(config, [adapter], server_timings=dict)
+    [tool] = runner.tools
+    assert tool is not adapter
+    assert (tool.max_workers, tool.max_connections, tool.request_ids) == (8, 4, True)
+    assert (adapter.max_workers, adapter.max_connections, adapter.request_ids) == (64, 50, False)
+    runner.run_multiplex(tool)
+    assert tool.run_count == 3
+    assert adapter.run_count == 0
+
+
+def test_runner_multiplex_keeps_per_stream_timings():
+    adapter = ParallelStubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=2,
+        http_versions=["2"], concurrency=4, scenarios=["multiplex"],
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    _, agg = runner.run_multiplex(adapter)[0]
+    assert agg.count == 2
+    assert agg.streams.count == 8
+    assert len(agg.stream_samples) == 2
+    # Stub streams within a batch take 11..14ms then 15..18ms
+    assert agg.spread_median_ms == 3
+    assert agg.median.bytes_transferred == 400
+
+
+class FlakyAdapter(StubAdapter):
+    """Fails every fail_every-th request (every request when fail_every is 1)."""
+
+    def __init__(self, fail_every):
+        super().__init__()
+        self.fail_every = fail_every
+        self.attempts = 0
+
+    def run(self, url, http_version="2"):
+        self.attempts += 1
+        if self.attempts % self.fail_every == 0:
+            raise RuntimeError("connection refused")
+        return super().run(url, http_version)
+
+
+def _record_events(runner):
+    events = []
+    runner.add_listener(events.append)
+    return events
+
+
+def test_runner_emits_cell_and_sample_events():
+    from curl_perf.runner import CellFinished, CellStarted, RunStarted, SamplesRecorded
+
+    adapter = StubAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=3,
+        http_versions=["1.1", "2"], scenarios=["latency"],
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    events = _record_events(runner)
+    runner.run_all()
+    kinds = [type(e) for e in events]
+    cell = [CellStarted] + [SamplesRecorded] * 3 + [CellFinished]
+    assert kinds == [RunStarted] + cell + cell
+    assert events[0].total_cells == 2
+    assert (events[1].scenario, events[1].tool, events[1].protocol) == (
+        "latency", "stub", "HTTP/1.1",
+    )
+    assert events[-1].result.count == 3
+
+
+def test_runner_first_failure_aborts_cell_by_default():
+    from curl_perf.runner import CellFailed
+
+    adapter = FlakyAdapter(fail_every=2)
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=5, http_versions=["2"], scenarios=["latency"],
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    events = _record_events(runner)
+    results = runner.run_all()
+    assert results["latency"] == {}
+    assert runner.tools[0].attempts == 2
+    assert isinstance(events[-1], CellFailed)
+
+
+def test_runner_tolerates_max_failures():
+    adapter = FlakyAdapter(fail_every=3)
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=6, http_versions=["2"], scenarios=["latency"],
+        max_failures=5,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    _, agg = runner.run_latency(adapter)[0]
+    assert agg.count == 6
+    assert adapter.attempts == 8
+
+
+def test_runner_aborts_broken_cell_after_max_failures():
+    from curl_perf.runner import SampleFailed
+
+    adapter = FlakyAdapter(fail_every=1)
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=100, http_versions=["2"],
+        scenarios=["latency"], max_failures=3,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    events = _record_events(runner)
+    assert runner.run_all()["latency"] == {}
+    assert runner.tools[0].attempts == 4
+    assert [e.failures for e in events if isinstance(e, SampleFailed)] == [1, 2, 3, 4]
+
+
+def test_runner_rate_counts_failed_requests():
+    from curl_perf.runner import SampleFailed
+
+    adapter = FlakyAdapter(fail_every=2)
+    config = BenchmarkConfig(
+        url="https://example.com", http_versions=["2"], scenarios=["rate"],
+        rate=200.0, duration=0.05, max_inflight=1, max_failures=5,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    events = _record_events(runner)
+    _, agg = runner.run_rate(adapter)[0]
+    assert agg.count == 5
+    assert [e.failures for e in events if isinstance(e, SampleFailed)] == [1, 2, 3, 4, 5]
+
+
+def test_runner_rate_aborts_broken_cell_after_max_failures():
+    from curl_perf.runner import SampleFailed
+
+    adapter = FlakyAdapter(fail_every=1)
+    config = BenchmarkConfig(
+        url="https://example.com", http_versions=["2"], scenarios=["rate"],
+        rate=200.0, duration=0.05, max_failures=3,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    events = _record_events(runner)
+    assert runner.run_all()["rate"] == {}
+    assert [e.failures for e in events if isinstance(e, SampleFailed)] == [1, 2, 3, 4]
+
+
+class ShortBatchAdapter(StubAdapter, BatchTool):
+    """Returns one sample less than asked for from every batch."""
+
+    def run_batch(self, url, http_version, count):
+        return [self.run(url, http_version) for _ in range(count - 1)]
+
+
+def test_runner_counts_short_batches_as_failures():
+    from curl_perf.runner import SampleFailed
+
+    adapter = ShortBatchAdapter()
+    config = BenchmarkConfig(
+        url="https://example.com", iterations=1, http_versions=["2"],
+        scenarios=["latency"], max_failures=2,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    events = _record_events(runner)
+    # An empty batch used to make the cell ask for the same sample forever
+    assert runner.run_all()["latency"] == {}
+    failed = [e for e in events if isinstance(e, SampleFailed)]
+    assert [e.failures for e in failed] == [1, 2, 3]
+    assert failed[0].error == "expected 1 samples, got 0"
@@ -1,8 +1,18 @@
+import importlib.util
+import json
 import ssl
 import os
+import socket
 import subprocess
+import sys
+import time
+import tomllib
+import urllib.request
 import pytest
-from curl_perf.server import create_app, generate_self_signed_cert
+from curl_perf.server import (
+    LocalServer, ServerOptions, cached_cert, content_buffer, create_app,
+    generate_self_signed_cert, process_cpu_times, wait_for_server,
+)
 
 
 def _openssl_available() -> bool:
@@ -24,6 +34,36 @@ def test_generate_self_signed_cert(tmp_path):
     ctx.load_cert_chain(cert_path, key_path)
 
 
+@pytest.mark.skipif(not _openssl_available(), reason="openssl not available or broken")
+def test_cached_cert_is_generated_once_per_key_type(tmp_path):
+    rsa = cached_cert("rsa", tmp_path)
+    assert cached_cert("rsa", tmp_path) == rsa
+    mtime = os.path.getmtime(rsa[0])
+    cached_cert("rsa", tmp_path)
+    assert os.path.getmtime(rsa[0]) == mtime
+    ecdsa = cached_cert("ecdsa", tmp_path)
+    assert ecdsa != rsa
+    with open(ecdsa[1]) as f:
+        key = f.read()
+    assert "EC PRIVATE KEY" in key or "BEGIN PRIVATE KEY" in key
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(*ecdsa)
+
+
+@pytest.mark.skipif(not _openssl_available(), reason="openssl not available or broken")
+def test_cached_cert_is_replaced_when_expiring(tmp_path):
+    cert_path, key_path = cached_cert("rsa", tmp_path)
+    os.utime(cert_path, (0, 0))
+    os.utime(os.path.dirname(cert_path), (0, 0))
+    new_cert, new_key = cached_cert("rsa", tmp_path)
+    assert os.path.getmtime(new_cert) > 0
+    # The pair is swapped as a whole and the expired one removed
+    assert os.path.dirname(new_cert) == os.path.dirname(new_key) != os.path.dirname(cert_path)
+    assert not os.path.exists(cert_path)
+    ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER).load_cert_chain(new_cert, new_key)
+    assert cached_cert("rsa", tmp_path) == (new_cert, new_key)
+
+
 def test_create_app():
     app = create_app()
     assert callable(app)
@@ -58,6 +98,14 @@ async def test_app_root():
     assert b"ok" in body.lower() or len(body) > 0
 
 
+@pytest.mark.asyncio
+async def test_app_fan_out_paths():
+    app = create_app()
+    status, body = await _call_app(app, "/r/3/9999")
+    assert status == 200
+    assert body == b'{"status": "ok"}'
+
+
 @pytest.mark.asyncio
 async def test_app_large():
     app = create_app()
@@ -74,8 +122,286 @@ async def test_app_large_default_size():
     assert len(body) == 10 * 1024 * 1024
 
 
+@pytest.mark.asyncio
+async def test_app_large_streams_chunks_from_shared_buffer():
+    app = create_app(chunk_size=1000)
+    messages = []
+    scope = {
+        "type": "http", "method": "GET", "path": "/large",
+        "query_string": b"size=2500", "headers": [],
+    }
+    async def send(message):
+        messages.append(message)
+    await app(scope, None, send)
+    bodies = [m for m in messages if m["type"] == "http.response.body"]
+    assert [len(m["body"]) for m in bodies] == [1000, 1000, 500]
+    assert [m["more_body"] for m in bodies] == [True, True, False]
+    assert all(m["body"].obj is content_buffer("fill") for m in bodies)
+
+
+@pytest.mark.asyncio
+async def test_app_large_random_content_wraps_around_buffer():
+    app = create_app(chunk_size=3 * 1024 * 1024, content="random")
+    buffer = content_buffer("random")
+    size = len(buffer) + 5000
+    status, body = await _call_app(app, "/large", query_string=f"size={size}".encode())
+    assert status == 200
+    assert len(body) == size
+    assert body[:len(buffer)] == buffer
+    assert body[len(buffer):] == buffer[:5000]
+    assert content_buffer("random") is buffer
+
+
+@pytest.mark.asyncio
+async def test_app_large_empty():
+    status, body = await _call_app(create_app(), "/large", query_string=b"size=0")
+    assert status == 200
+    assert body == b""
+
+
 @pytest.mark.asyncio
 async def test_app_404():
     app = create_app()
     status, body = await _call_app(app, "/nonexistent")
     assert status == 404
+
+
+@pytest.mark.asyncio
+async def test_app_logs_tagged_requests(tmp_path):
+    app = create_app(chunk_size=1000, timing_dir=str(tmp_path))
+    messages = []
+    async def send(message):
+        messages.append(message)
+    for path, headers in [
+        ("/large", [(b"x-request-id", b"abc")]), ("/", []), ("/", [(b"x-request-id", b"def")]),
+    ]:
+        scope = {
+            "type": "http", "method": "GET", "path": path,
+            "query_string": b"size=2500", "headers": headers,
+        }
+        await app(scope, None, send)
+    [log] = tmp_path.iterdir()
+    assert log.name == f"{os.getpid()}.ndjson"
+    lines = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [line[0] for line in lines] == ["abc", "def"]
+    assert all(0 <= server_ms <= total_ms for _, server_ms, total_ms in lines)
+
+
+@pytest.mark.asyncio
+async def test_app_upload_counts_streamed_body():
+    app = create_app()
+    chunks = [b"a" * 1000, b"b" * 500, b""]
+    messages = []
+    scope = {
+        "type": "http", "method": "PUT", "path": "/upload", "query_string": b"", "headers": [],
+    }
+    async def receive():
+        body = chunks.pop(0)
+        return {"type": "http.request", "body": body, "more_body": bool(chunks)}
+    async def send(message):
+        messages.append(message)
+    await app(scope, receive, send)
+    assert messages[0]["status"] == 200
+    assert json.loads(messages[1]["body"]) == {"received": 1500}
+
+
+def test_server_options_toml_is_hypercorn_config():
+    options = ServerOptions(
+        workers=4, worker_class="uvloop", h2_max_concurrent_streams=1000,
+        h2_max_inbound_frame_size=2**20, keep_alive_timeout=30, keep_alive_max_requests=10,
+    )
+    assert tomllib.loads(options.hypercorn_toml()) == {
+        "workers": 4,
+        "worker_class": "uvloop",
+        "h2_max_concurrent_streams": 1000,
+        "h2_max_inbound_frame_size": 2**20,
+        "keep_alive_timeout": 30.0,
+        "keep_alive_max_requests": 10,
+    }
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"workers": 0}, {"worker_class": "trio"}, {"content": "zeros"}, {"chunk_size": 0},
+    {"h2_max_inbound_frame_size": 1024}, {"h2_max_inbound_frame_size": 2**24},
+    {"tls_version": "1.1"}, {"plaintext": True, "http3": True},
+])
+def test_server_options_rejects_invalid_values(kwargs):
+    with pytest.raises(ValueError):
+        ServerOptions(**kwargs)
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="needs /proc")
+def test_process_cpu_times_includes_children():
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+    try:
+        times = process_cpu_times(os.getpid())
+        assert os.getpid() in times
+        assert child.pid in times
+        assert times[os.getpid()] > 0
+    finally:
+        child.kill()
+        child.wait()
+
+
+def test_openssl_config_caps_tls_version_only_when_needed():
+    assert ServerOptions().openssl_config() is None
+    assert ServerOptions(tls_version="1.2", plaintext=True).openssl_config() is None
+    assert "MaxProtocol = TLSv1.2" in ServerOptions(tls_version="1.2").openssl_config()
+
+
+def test_single_worker_serves_from_hypercorn_main_process():
+    assert tomllib.loads(ServerOptions().hypercorn_toml())["workers"] == 0
+
+
+def test_wait_for_server_times_out_on_closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with pytest.raises(RuntimeError, match="no TLS handshake"):
+        wait_for_server("127.0.0.1", port, timeout=0.2)
+    with pytest.raises(RuntimeError, match="no response"):
+        wait_for_server("127.0.0.1", port, timeout=0.2, tls=False)
+
+
+def _get(url):
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    with urllib.request.urlopen(url, context=context, timeout=10) as resp:
+        return resp.read()
+
+
+def test_local_server_serves_on_ephemeral_port(local_server):
+    assert local_server.port != 0
+    assert local_server.running
+    assert _get(f"{local_server.url}/") == b'{"status": "ok"}'
+    assert len(_get(f"{local_server.url}/large?size=300000")) == 300000
+
+
+def test_local_server_reports_request_timings(local_server):
+    from curl_perf.tools.curl import CurlAdapter
+
+    adapter = CurlAdapter()
+    if not adapter.is_available():
+        pytest.skip("curl not available")
+    adapter.request_ids = True
+    local_server.request_timings()
+    results = adapter.run_batch(f"{local_server.url}/", "2", 3)
+    deadline = time.monotonic() + 5
+    timings = {}
+    while len(timings) < 3 and time.monotonic() < deadline:
+        timings.update(local_server.request_timings())
+    assert set(timings) == {r.request_id for r in results}
+    assert all(t.server_ms <= t.server_total_ms for t in timings.values())
+    # Every timing is reported once
+    assert local_server.request_timings() == {}
+
+
+@pytest.mark.filterwarnings("ignore:Unverified HTTPS request")
+@pytest.mark.parametrize("tool_name", ["curl", "libcurl", "libcurl-warm", "httpx", "py-requests"])
+def test_local_server_receives_uploads(local_server, tool_name, tmp_path):
+    from curl_perf.tools import get_tool
+
+    adapter = get_tool(tool_name)
+    if not adapter.is_available():
+        pytest.skip(f"{tool_name} not available")
+    body = tmp_path / "body"
+    body.write_bytes(os.urandom(3_000_000))
+    versions = ["1.1", "2"] if adapter.supports_http2() else ["1.1"]
+    for version in versions:
+        result = adapter.run_upload(f"{local_server.url}/upload", str(body), version)
+        assert result.bytes_transferred == 3_000_000
+        assert result.total_ms > 0
+
+
+@pytest.mark.filterwarnings("ignore:Unverified HTTPS request")
+def test_py_requests_upload_fails_on_an_error_status(local_server, tmp_path):
+    from curl_perf.tools import get_tool
+
+    adapter = get_tool("py-requests")
+    if not adapter.is_available():
+        pytest.skip("py-requests not available")
+    body = tmp_path / "body"
+    body.write_bytes(b"x" * 1000)
+    with pytest.raises(RuntimeError, match="py-requests failed"):
+        adapter.run_upload(f"{local_server.url}/no-such-path", str(body), "1.1")
+
+
+def test_local_servers_run_side_by_side(local_server):
+    with LocalServer(cert_dir=local_server.cert_dir) as other:
+        assert other.port != local_server.port
+        assert _get(f"{other.url}/") == _get(f"{local_server.url}/")
+    assert not other.running
+
+
+def _libcurl_http3_available() -> bool:
+    from curl_perf.tools.libcurl import LibcurlAdapter
+
+    return LibcurlAdapter().supports_http3()
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("aioquic") is None or not _libcurl_http3_available(),
+    reason="aioquic or libcurl with HTTP/3 not available",
+)
+def test_local_server_serves_http3(local_server):
+    from curl_perf.tools.libcurl import LibcurlAdapter
+
+    with LocalServer(options=ServerOptions(http3=True), cert_dir=local_server.cert_dir) as server:
+        result = LibcurlAdapter().run(f"{server.url}/large?size=100000", "3")
+    assert result.http_version_used == "3"
+    assert result.bytes_transferred == 100000
+
+
+def test_local_server_caps_tls_version(local_server):
+    options = ServerOptions(tls_version="1.2", key_type="ecdsa")
+    with LocalServer(options=options, cert_dir=local_server.cert_dir) as server:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        with socket.create_connection((server.host, server.port), timeout=5) as sock:
+            with context.wrap_socket(sock) as tls:
+                assert tls.version() == "TLSv1.2"
+
+
+def test_local_server_plaintext_serves_http1_and_h2c(local_server):
+    with LocalServer(options=ServerOptions(plaintext=True)) as server:
+        assert server.url.startswith("http://")
+        with urllib.request.urlopen(f"{server.url}/", timeout=10) as resp:
+            assert resp.read() == b'{"status": "ok"}'
+        with socket.create_connection((server.host, server.port), timeout=5) as sock:
+            # The HTTP/2 connection preface, as sent with prior knowledge
+            sock.sendall(b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n" + b"\x00\x00\x00\x04\x00\x00\x00\x00\x00")
+            # The server answers with its own SETTINGS frame (type 4)
+            assert sock.recv(9)[3] == 4
+
+
+@pytest.mark.parametrize("tool_name", ["libcurl", "libcurl-warm"])
+def test_libcurl_open_loop_batches_run_concurrently(local_server, tool_name):
+    pytest.importorskip("pycurl")
+    from curl_perf.runner import BenchmarkConfig, BenchmarkRunner
+    from curl_perf.tools import get_tool
+
+    adapter = get_tool(tool_name)
+    config = BenchmarkConfig(
+        url=local_server.url, http_versions=["2"], scenarios=["rate"],
+        rate=3000.0, duration=0.5, rate_batch_ms=5.0,
+    )
+    runner = BenchmarkRunner(config, [adapter])
+    # Batches overlap on the runner's thread pool
+    timings, achieved = runner._run_open_loop(adapter, local_server.url, "2")
+    assert len(timings) == 1500
+    assert achieved > 0
+
+
+@pytest.mark.parametrize("tool_name", ["libcurl", "libcurl-warm"])
+def test_libcurl_parallel_batch_opens_at_most_max_connections(local_server, tool_name):
+    pytest.importorskip("pycurl")
+    from curl_perf.tools import get_tool
+
+    adapter = get_tool(tool_name)
+    adapter.max_connections = 3
+    timings = adapter.run_parallel([f"{local_server.url}/r/0/{i}" for i in range(30)], "1.1")
+    assert len(timings) == 30
+    # A transfer on a reused connection reports no connect time
+    assert sum(1 for t in timings if t.connect_ms) <= 3
@@ -0,0 +1,166 @@
+import concurrent.futures
+import random
+import shutil
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from curl_perf.cli import main
+from curl_perf.shaping import (
+    MIN_RTO_MS, NetworkProfile, ShapingProxy, _Bottleneck, _Link, _Loss, parse_rate,
+)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("100mbit", 12.5e6), ("500kbit", 62.5e3), ("1gbit", 125e6), ("2MB", 2e6),
+    ("64kb", 64e3), ("1000", 1000.0), ("10Mbps", 1.25e6), ("5MB/s", 5e6),
+])
+def test_parse_rate(value, expected):
+    assert parse_rate(value) == pytest.approx(expected)
+
+
+def test_parse_rate_rejects_unknown_unit():
+    with pytest.raises(ValueError, match="unknown rate unit"):
+        parse_rate("10furlongs")
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"delay_ms": -1}, {"jitter_ms": -1}, {"bandwidth": 0}, {"loss": 1.0}, {"loss_burst": 0.5},
+])
+def test_profile_rejects_invalid_values(kwargs):
+    with pytest.raises(ValueError):
+        NetworkProfile(**kwargs)
+
+
+@pytest.mark.parametrize("value, message", [
+    ("lots", "invalid loss rate: 'lots'"), ("100%", "loss rate must be in"),
+])
+def test_cli_rejects_bad_loss_rate(capsys, value, message):
+    with pytest.raises(SystemExit):
+        main(["--url", "http://127.0.0.1:1/", f"--loss={value}"])
+    err = capsys.readouterr().err
+    assert message in err
+    assert "CI target" not in err
+
+
+@pytest.mark.skipif(shutil.which("curl") is None, reason="curl not installed")
+def test_cli_rejects_shaping_a_remote_url(capsys):
+    assert main(["--tools", "curl", "--url", "https://example.com/", "--delay", "20"]) == 1
+    assert "needs --local-server or a loopback --url" in capsys.readouterr().err
+
+
+def test_profile_describe_and_shapes():
+    assert not NetworkProfile().shapes
+    profile = NetworkProfile(
+        delay_ms=25, jitter_ms=5, bandwidth=parse_rate("100mbit"), loss=0.001, loss_burst=3,
+    )
+    assert profile.shapes
+    assert profile.describe() == (
+        "25ms delay +/- 5ms, 100 Mbit/s, 0.10% loss in bursts of 3 each way"
+    )
+    assert NetworkProfile(delay_ms=1).rto_ms == MIN_RTO_MS
+    assert NetworkProfile(delay_ms=100).rto_ms == 400
+
+
+def test_link_pipelines_delay_and_serializes_bandwidth():
+    link = _Link(NetworkProfile(delay_ms=50, bandwidth=1000), random.Random(0))
+    # 500 bytes take 0.5s on the link, then 50ms to arrive
+    assert link.delivery_time(0.0, 500) == pytest.approx(0.55)
+    # Queued behind the first chunk, not delayed by a whole extra delay
+    assert link.delivery_time(0.1, 500) == pytest.approx(1.05)
+    assert link.delivery_time(5.0, 100) == pytest.approx(5.15)
+
+
+def test_links_sharing_a_bottleneck_split_its_bandwidth():
+    profile = NetworkProfile(delay_ms=50, bandwidth=1000)
+    bottleneck = _Bottleneck(profile.bandwidth)
+    first = _Link(profile, random.Random(0), bottleneck=bottleneck)
+    second = _Link(profile, random.Random(0), bottleneck=bottleneck)
+    assert first.delivery_time(0.0, 500) == pytest.approx(0.55)
+    # Queued behind the other connection's chunk on the same link
+    assert second.delivery_time(0.0, 500) == pytest.approx(1.05)
+
+
+def test_link_charges_handshake_round_trip_to_first_chunk():
+    link = _Link(NetworkProfile(delay_ms=10), random.Random(0), handshake=True)
+    assert link.delivery_time(0.0, 100) == pytest.approx(0.03)
+    assert link.delivery_time(1.0, 100) == pytest.approx(1.01)
+
+
+def test_link_keeps_stream_in_order_under_jitter():
+    link = _Link(NetworkProfile(delay_ms=10, jitter_ms=10), random.Random(1))
+    times = [link.delivery_time(i * 0.001, 100) for i in range(200)]
+    assert times == sorted(times)
+    assert all(t - i * 0.001 <= 0.0200001 for i, t in enumerate(times))
+
+
+def test_loss_process_matches_rate_and_burst_length():
+    loss = _Loss(NetworkProfile(loss=0.02, loss_burst=4), random.Random(2))
+    states = []
+    for _ in range(200_000):
+        states.append(loss.lost_packets(1))
+    assert sum(states) / len(states) == pytest.approx(0.02, rel=0.15)
+    bursts = "".join(map(str, states)).split("0")
+    lengths = [len(b) for b in bursts if b]
+    assert sum(lengths) / len(lengths) == pytest.approx(4, rel=0.15)
+
+
+class _EchoHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while data := self.request.recv(65536):
+            self.request.sendall(data)
+
+
+@pytest.fixture
+def echo_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _EchoHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+def _echo(address, payload: bytes) -> tuple[bytes, float]:
+    start = time.perf_counter()
+    with socket.create_connection(address, timeout=10) as sock:
+        sock.sendall(payload)
+        sock.shutdown(socket.SHUT_WR)
+        received = bytearray()
+        while data := sock.recv(1 << 20):
+            received += data
+    return bytes(received), time.perf_counter() - start
+
+
+def test_proxy_relays_unshaped_traffic_intact(echo_server):
+    payload = random.Random(3).randbytes(5_000_000)
+    with ShapingProxy(*echo_server, NetworkProfile()) as proxy:
+        received, _ = _echo((proxy.host, proxy.port), payload)
+    assert received == payload
+
+
+def test_proxy_delays_each_direction(echo_server):
+    with ShapingProxy(*echo_server, NetworkProfile(delay_ms=40)) as proxy:
+        received, elapsed = _echo((proxy.host, proxy.port), b"ping")
+    assert received == b"ping"
+    # Handshake round trip plus one delay each way
+    assert elapsed >= 0.16
+    assert elapsed < 1.0
+
+
+def test_proxy_shares_bandwidth_between_connections(echo_server):
+    payload = random.Random(4).randbytes(100_000)
+    profile = NetworkProfile(bandwidth=1_000_000)
+    with ShapingProxy(*echo_server, profile) as proxy:
+        with concurrent.futures.ThreadPoolExecutor(2) as pool:
+            start = time.perf_counter()
+            futures = [pool.submit(_echo, (proxy.host, proxy.port), payload) for _ in range(2)]
+            results = [f.result() for f in futures]
+            elapsed = time.perf_counter() - start
+    assert all(received == payload for received, _ in results)
+    # Alone, each echo takes 0.1s up and 0.1s down. Sharing the link, the
+    # two uploads take 0.2s together, and the later echo comes back after
+    assert elapsed >= 0.28
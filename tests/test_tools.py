@@ -1,4 +1,6 @@
-from curl_perf.tools.base import ToolAdapter
+from curl_perf.tools.base import (
+    BatchTool, HandshakeTool, KeepaliveTool, ParallelTool, ToolAdapter, UploadTool,
+)
 from curl_perf.results import TimingResult
 
 
@@ -42,6 +44,8 @@ def test_adapter_run_concurrent():
 
 
 import json
+
+import pytest
 from curl_perf.tools.curl import CurlAdapter
 
 
@@ -71,12 +75,44 @@ def test_curl_build_command_http11():
     assert "--http2" not in cmd
 
 
+def test_curl_build_command_http3_never_falls_back():
+    adapter = CurlAdapter()
+    assert "--http3-only" in adapter._build_command("https://example.com", "3")
+    config = adapter._build_batch_config("https://example.com", "3", 2)
+    assert config.splitlines().count("http3-only") == 2
+    config = adapter._build_multi_config(["https://example.com"], "3", parallel=True)
+    assert "http3-only" in config.splitlines()
+
+
+def test_curl_protocol_support_comes_from_features_line(monkeypatch):
+    import subprocess
+
+    output = (
+        "curl 8.11.0 (x86_64-pc-linux-gnu) libcurl/8.11.0 OpenSSL/3.3.2 nghttp2/1.64.0 ngtcp2/1.9.0\n"
+        "Protocols: http https\n"
+        "Features: alt-svc HTTP2 HTTP3 HTTPS-proxy SSL\n"
+    )
+    monkeypatch.setattr(
+        subprocess, "run",
+        lambda *a, **kw: subprocess.CompletedProcess(a, 0, stdout=output, stderr=""),
+    )
+    adapter = CurlAdapter()
+    assert adapter.supports_http2()
+    assert adapter.supports_http3()
+    monkeypatch.setattr(
+        subprocess, "run",
+        lambda *a, **kw: subprocess.CompletedProcess(a, 0, stdout=output.replace(" HTTP3", ""), stderr=""),
+    )
+    assert not adapter.supports_http3()
+
+
 def test_curl_parse_output():
     adapter = CurlAdapter()
     write_out = json.dumps({
         "time_namelookup": 0.001,
         "time_connect": 0.002,
         "time_appconnect": 0.003,
+        "time_pretransfer": 0.004,
         "time_starttransfer": 0.005,
         "time_total": 0.010,
         "size_download": 1024,
@@ -87,19 +123,215 @@ def test_curl_parse_output():
     assert result.connect_ms == 2.0
     assert result.tls_ms == 3.0
     assert result.ttfb_ms == 5.0
+    assert result.pretransfer_ms == 4.0
     assert result.total_ms == 10.0
     assert result.bytes_transferred == 1024
     assert result.http_version_used == "2"
 
 
-def test_curl_build_concurrent_command():
+def test_curl_build_parallel_config():
     adapter = CurlAdapter()
-    urls = ["https://example.com/1", "https://example.com/2", "https://example.com/3"]
-    cmd = adapter._build_concurrent_command(urls, "2")
-    assert "--parallel" in cmd
-    assert "--http2" in cmd
-    for url in urls:
-        assert url in cmd
+    urls = [f"https://example.com/r/{i}" for i in range(20_000)]
+    lines = adapter._build_multi_config(urls, "2", parallel=True).splitlines()
+    assert lines[:2] == ["parallel", "parallel-max = 20000"]
+    assert lines.count("http2") == 1
+    assert "next" not in lines
+    assert [l for l in lines if l.startswith("url")] == [f'url = "{url}"' for url in urls]
+    assert lines.count('output = "/dev/null"') == 20_000
+
+
+def test_curl_parallel_config_caps_http1_connections():
+    adapter = CurlAdapter()
+    adapter.max_connections = 8
+    urls = [f"https://example.com/r/{i}" for i in range(100)]
+    assert "parallel-max = 8" in adapter._build_multi_config(urls, "1.1", parallel=True)
+    # Multiplexed transfers share one connection
+    assert "parallel-max = 100" in adapter._build_multi_config(urls, "2", parallel=True)
+
+
+def test_curl_run_parallel_restores_url_order(monkeypatch):
+    import subprocess
+
+    adapter = CurlAdapter()
+    # --parallel writes out in completion order
+    lines = [
+        json.dumps({
+            "time_namelookup": 0, "time_connect": 0, "time_appconnect": 0,
+            "time_starttransfer": 0, "time_total": total, "size_download": 0,
+            "http_version": "2", "urlnum": urlnum,
+        })
+        for urlnum, total in [(2, 0.003), (0, 0.001), (1, 0.002)]
+    ]
+    monkeypatch.setattr(
+        subprocess, "run",
+        lambda cmd, **kw: subprocess.CompletedProcess(cmd, 0, "\n".join(lines) + "\n", ""),
+    )
+    results = adapter.run_parallel([f"https://example.com/{i}" for i in range(3)], "2")
+    assert [r.total_ms for r in results] == [1.0, 2.0, 3.0]
+
+
+def test_curl_build_sequence_config_tags_each_transfer():
+    adapter = CurlAdapter()
+    urls = ["https://example.com/1", "https://example.com/2"]
+    lines = adapter._build_multi_config(urls, "1.1", False, ["id1", "id2"]).splitlines()
+    assert "parallel" not in lines
+    assert lines.count("http1.1") == 2
+    assert lines.count("next") == 1
+    assert lines.index('header = "x-request-id: id1"') < lines.index("next")
+    assert lines.index('header = "x-request-id: id2"') > lines.index("next")
+    assert isinstance(adapter, KeepaliveTool)
+
+
+def test_curl_run_config_restores_config_order(monkeypatch):
+    import subprocess
+
+    adapter = CurlAdapter()
+    # --parallel writes out in completion order
+    output = "".join(
+        json.dumps({
+            "time_namelookup": 0, "time_connect": 0, "time_appconnect": 0,
+            "time_starttransfer": 0, "time_total": total, "size_download": 1,
+            "http_version": "2", "urlnum": str(urlnum),
+        }) + "\n"
+        for urlnum, total in [(2, 0.003), (0, 0.001), (1, 0.002)]
+    )
+    monkeypatch.setattr(
+        subprocess, "run", lambda *a, **kw: subprocess.CompletedProcess(a, 0, output, ""),
+    )
+    results = adapter._run_config("", ["a", "b", "c"])
+    assert [(r.request_id, r.total_ms) for r in results] == [("a", 1.0), ("b", 2.0), ("c", 3.0)]
+
+
+def test_curl_is_batch_tool():
+    adapter = CurlAdapter()
+    assert isinstance(adapter, BatchTool)
+
+
+def test_curl_build_batch_config():
+    adapter = CurlAdapter()
+    config = adapter._build_batch_config("https://example.com/a b", "2", 3)
+    lines = config.splitlines()
+    assert lines.count("next") == 2
+    assert lines.count('url = "https://example.com/a b"') == 3
+    assert lines.count("http2") == 3
+    assert lines.count("no-sessionid") == 3
+    # A distinct local port per transfer keeps curl from reusing connections
+    ports = [l for l in lines if l.startswith("local-port")]
+    assert len(set(ports)) == 3
+    write_out = [l for l in lines if l.startswith("write-out")][0]
+    assert '\\"time_total\\"' in write_out
+    assert write_out.endswith('\\n"')
+
+
+def test_curl_build_batch_config_resume_keeps_session_cache():
+    adapter = CurlAdapter()
+    assert "no-sessionid" not in adapter._build_batch_config(
+        "https://example.com", "2", 2, resume=True,
+    )
+    assert isinstance(adapter, HandshakeTool)
+
+
+def test_curl_build_upload_command():
+    adapter = CurlAdapter()
+    cmd = adapter._build_upload_command("https://example.com/upload", "/tmp/body", "1.1")
+    assert cmd[cmd.index("-T") + 1] == "/tmp/body"
+    assert "--data-binary" not in cmd
+    assert "Expect:" in cmd
+    assert cmd[-1] == "https://example.com/upload"
+    result = adapter._parse_output(
+        json.dumps({
+            "time_namelookup": 0, "time_connect": 0, "time_appconnect": 0,
+            "time_starttransfer": 0, "time_total": 1, "size_download": 16,
+            "size_upload": 5000, "http_version": "1.1",
+        }),
+        upload=True,
+    )
+    assert result.bytes_transferred == 5000
+    assert isinstance(adapter, UploadTool)
+
+
+def test_curl_tags_requests_with_ids():
+    adapter = CurlAdapter()
+    assert "-H" not in adapter._build_command("https://example.com", "2")
+    cmd = adapter._build_command("https://example.com", "2", request_id="abc")
+    assert cmd[cmd.index("-H") + 1] == "x-request-id: abc"
+    config = adapter._build_batch_config(
+        "https://example.com", "2", 2, request_ids=["id1", "id2"],
+    )
+    headers = [l for l in config.splitlines() if l.startswith("header")]
+    assert headers == ['header = "x-request-id: id1"', 'header = "x-request-id: id2"']
+    adapter.request_ids = True
+    ids = adapter._new_request_ids(3)
+    assert len(set(ids)) == 3 and all(len(i) == 16 for i in ids)
+
+
+def test_curl_uses_prior_knowledge_for_cleartext_http2():
+    adapter = CurlAdapter()
+    assert "--http2-prior-knowledge" in adapter._build_command("http://example.com", "2")
+    assert "--http2" in adapter._build_command("https://example.com", "2")
+    config = adapter._build_batch_config("http://example.com", "2", 1)
+    assert "http2-prior-knowledge" in config.splitlines()
+
+
+def test_curl_build_batch_config_http11():
+    adapter = CurlAdapter()
+    config = adapter._build_batch_config("https://example.com", "1.1", 1)
+    assert "http1.1" in config.splitlines()
+    assert "next" not in config.splitlines()
+
+
+from curl_perf.tools import get_tool
+from curl_perf.tools.libcurl import LibcurlAdapter, LibcurlWarmAdapter
+
+
+def test_libcurl_names():
+    assert LibcurlAdapter().name == "libcurl"
+    assert LibcurlWarmAdapter().name == "libcurl-warm"
+
+
+def test_libcurl_cold_and_warm_variants():
+    assert not LibcurlAdapter().warm
+    assert LibcurlWarmAdapter().warm
+
+
+def test_libcurl_reports_per_request_timings():
+    assert isinstance(LibcurlAdapter(), ParallelTool)
+
+
+def test_libcurl_registered():
+    tool = get_tool("libcurl-warm")
+    assert tool is not None
+    assert isinstance(tool, LibcurlWarmAdapter)
+
+
+from curl_perf.tools.httpx_async import HttpxAdapter
+
+
+def test_httpx_name():
+    adapter = HttpxAdapter()
+    assert adapter.name == "httpx"
+    assert isinstance(adapter, ParallelTool)
+
+
+async def test_httpx_fetch_reports_per_stream_timing():
+    httpx = pytest.importorskip("httpx")
+    adapter = HttpxAdapter()
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=httpx.ByteStream(b"x" * 100)))
+    async with httpx.AsyncClient(transport=transport) as client:
+        result = await adapter._fetch(client, "https://example.com/")
+    assert result.bytes_transferred == 100
+    assert result.http_version_used == "1.1"
+    assert 0 <= result.ttfb_ms <= result.total_ms
+
+
+async def test_httpx_caps_http1_connections():
+    pytest.importorskip("httpx")
+    adapter = HttpxAdapter()
+    adapter.max_connections = 4
+    async with adapter._client("1.1", 100) as client:
+        assert client._transport._pool._max_connections == 4
+    async with adapter._client("1.1", 2) as client:
+        assert client._transport._pool._max_connections == 2
 
 
 from curl_perf.tools.wget import WgetAdapter
@@ -123,14 +355,95 @@ def test_wget_build_command_http11():
     assert "--no-http2" in cmd
 
 
+def test_wget_concurrent_command_reads_urls_from_stdin(monkeypatch):
+    import subprocess
+
+    adapter = WgetAdapter()
+    calls = []
+    monkeypatch.setattr(
+        subprocess, "run",
+        lambda cmd, **kw: calls.append((cmd, kw)) or subprocess.CompletedProcess(cmd, 0, "", ""),
+    )
+    urls = [f"https://example.com/r/0/{i}" for i in range(10_000)]
+    adapter.run_concurrent(urls, "2")
+    [(cmd, kw)] = calls
+    assert cmd[-1] == "--input-file=-"
+    assert not any(arg.startswith("https://") for arg in cmd)
+    assert kw["input"].splitlines() == urls
+
+
+def test_wget_upload_command(monkeypatch):
+    import os
+    import subprocess
+
+    adapter = WgetAdapter()
+    commands = []
+    sink = json.dumps({"received": os.path.getsize(__file__)})
+    monkeypatch.setattr(
+        subprocess, "run",
+        lambda cmd, **kw: commands.append(cmd) or subprocess.CompletedProcess(cmd, 0, sink, ""),
+    )
+    result = adapter.run_upload("https://example.com/upload", __file__, "1.1")
+    [cmd] = commands
+    assert cmd[cmd.index("-O") + 1] == "-"
+    assert cmd[-3:] == ["--method=PUT", f"--body-file={__file__}", "https://example.com/upload"]
+    assert result.bytes_transferred == os.path.getsize(__file__)
+
+
 def test_wget_name():
     adapter = WgetAdapter()
     assert adapter.name == "wget2"
 
 
+def test_wget_has_no_keepalive_scenario():
+    # wget2 cannot time the requests of one run individually
+    assert not isinstance(WgetAdapter(), KeepaliveTool)
+
+
 from curl_perf.tools.httpie import HTTPieAdapter
 
 
+def test_thread_fan_out_reuses_bounded_pool(monkeypatch):
+    import threading
+    import time
+
+    adapter = HTTPieAdapter()
+    adapter.max_workers = 4
+    lock = threading.Lock()
+    active, peak, threads = 0, 0, set()
+
+    def run(url, http_version="2"):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+            threads.add(threading.get_ident())
+        time.sleep(0.002)
+        with lock:
+            active -= 1
+        return TimingResult(total_ms=1, bytes_transferred=0, http_version_used=http_version)
+
+    monkeypatch.setattr(adapter, "run", run)
+    urls = [f"https://example.com/r/0/{i}" for i in range(100)]
+    first = adapter.run_parallel(urls, "2")
+    pool = adapter._pool
+    adapter.run_parallel(urls, "2")
+    assert len(first) == 100
+    assert adapter._pool is pool
+    assert peak <= 4
+    assert len(threads) <= 4
+
+
+def test_thread_fan_out_tools_share_one_run_parallel():
+    from curl_perf.tools.base import ThreadedParallelTool
+    from curl_perf.tools.py_requests import PyRequestsAdapter
+    from curl_perf.tools.xh import XhAdapter
+
+    for cls in (HTTPieAdapter, XhAdapter, PyRequestsAdapter):
+        assert issubclass(cls, ThreadedParallelTool)
+        assert "run_parallel" not in vars(cls)
+
+
 def test_httpie_build_command():
     adapter = HTTPieAdapter()
     cmd = adapter._build_command("https://example.com", "2")
@@ -173,6 +486,12 @@ def test_xh_build_command_http2():
     assert "https://example.com" in cmd
 
 
+def test_xh_build_command_cleartext_http2():
+    cmd = XhAdapter()._build_command("http://example.com", "2")
+    assert "--http-version=2-prior-knowledge" in cmd
+    assert "--https" not in cmd
+
+
 def test_xh_build_command_http11():
     adapter = XhAdapter()
     cmd = adapter._build_command("https://example.com", "1.1")
@@ -216,3 +535,34 @@ def test_get_tool_by_name():
 def test_get_tool_unknown():
     tool = get_tool("nonexistent")
     assert tool is None
+
+
+def test_command_version_missing_binary():
+    from curl_perf.tools.base import command_version
+    assert command_version(["curl-perf-no-such-binary", "--version"]) is None
+
+
+def test_curl_version():
+    adapter = CurlAdapter()
+    if not adapter.is_available():
+        pytest.skip("curl not installed")
+    assert adapter.version().startswith("curl ")
+
+
+@pytest.mark.parametrize("adapter_class", [HTTPieAdapter, XhAdapter, WgetAdapter])
+@pytest.mark.parametrize("response, error", [
+    ('{"received": 10}', "server received 10 of"),
+    ("<html>Method Not Allowed</html>", "no received count"),
+])
+def test_subprocess_uploads_check_the_sinks_count(monkeypatch, adapter_class, response, error):
+    import subprocess
+
+    adapter = adapter_class()
+    monkeypatch.setattr(
+        subprocess, "run",
+        lambda cmd, **kw: subprocess.CompletedProcess(
+            cmd, 0, response if kw.get("text") else response.encode(), "",
+        ),
+    )
+    with pytest.raises(RuntimeError, match=error):
+        adapter.run_upload("https://example.com/upload", __file__, "1.1")